@@ -55,6 +55,14 @@ function renderActionButtons(appointment) {
   return wrapper;
 }
 
+function anomalyBadge(anomalies) {
+  if (!Array.isArray(anomalies) || anomalies.length === 0) return "";
+  const detail = anomalies
+    .map((entry) => `${entry.metric} ${entry.value} (usual ${entry.baseline})`)
+    .join(", ");
+  return `<span class="badge danger" title="${detail}">Vitals alert</span>`;
+}
+
 function renderAppointmentCard(appointment, includeActions = false) {
   const card = document.createElement("article");
   card.className = "list-card";
@@ -66,6 +74,7 @@ function renderAppointmentCard(appointment, includeActions = false) {
   header.innerHTML = `
     <h3>${appointment.patientEmail || appointment.patientId}</h3>
     ${statusBadge(appointment.status)}
+    ${anomalyBadge(appointment.anomalies)}
   `;
   card.appendChild(header);
 
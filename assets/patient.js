@@ -320,15 +320,16 @@ async function searchDoctors() {
 
   const btn = document.querySelector("#findDoctorsBtn");
   try {
-    const response = await disableWhilePending(btn, fetchJSON("/doctors"));
+    // Ranked by earliest free slot and pending queue, so bookings spread out.
+    // The API filters by location before ranking, so the top 50 are all in it.
+    const query = new URLSearchParams({ sort: "rank", k: "50", specialty });
+    if (location) query.set("location", location);
+    const response = await disableWhilePending(btn, fetchJSON(`/doctors?${query}`));
     let doctors = response.items || [];
     doctors = doctors.filter((doc) => {
       const docSpecialty = doc.doctorProfile?.specialty;
       return docSpecialty === specialty;
     });
-    if (location) {
-      doctors = doctors.filter((doc) => doc.doctorProfile?.city === location);
-    }
     state.doctors = doctors;
     renderDoctors(doctors);
     
@@ -645,6 +646,8 @@ async function bookAppointment(doctor, slotISO, button) {
     vitals,
     // Provide a default reason code for backend compatibility
     reasonCode: "GENERAL",
+    // Free text; the backend derives recommendedSpecialty from it.
+    complaint: document.querySelector("#complaintInput")?.value.trim() || undefined,
   };
   try {
     // Log payload for debugging server-side issues
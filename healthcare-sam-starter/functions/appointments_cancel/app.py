@@ -11,7 +11,18 @@ PARENT_DIR = os.path.abspath(os.path.join(CURRENT_DIR, os.pardir))
 if PARENT_DIR not in sys.path:
     sys.path.append(PARENT_DIR)
 
-from common import appointments_table, emit_event, get_claim, json_response, require_role, health_index_table  # noqa: E402
+from common import (  # noqa: E402
+    LATEST_RECORD_ID,
+    appointments_table,
+    discard_vitals_series,
+    emit_event,
+    get_claim,
+    health_index_table,
+    json_response,
+    refresh_latest_health_record,
+    require_role,
+    withdraw_vitals_reading,
+)
 
 
 LOGGER = logging.getLogger(__name__)
@@ -50,30 +61,25 @@ def lambda_handler(event: Dict[str, Any], _context: Any):
 
     # Best-effort cleanup of patient health index: remove the per-appointment record
     try:
-        health_index_table.delete_item(Key={"patientId": patient_id, "recordId": appointment_id})
+        removed = health_index_table.delete_item(
+            Key={"patientId": patient_id, "recordId": appointment_id}, ReturnValues="ALL_OLD"
+        ).get("Attributes")
         # If "latest" pointed to this appointment, recompute it from remaining records
-        latest = health_index_table.get_item(Key={"patientId": patient_id, "recordId": "latest"}).get("Item")
-        if latest and latest.get("updatedAt") == record.get("createdAt"):
-            # Load all records for this patient (excluding 'latest') and find most recent by updatedAt
-            from boto3.dynamodb.conditions import Key as DdbKey  # local import to avoid global dependency
-
-            resp = health_index_table.query(KeyConditionExpression=DdbKey("patientId").eq(patient_id))
-            candidates = [it for it in resp.get("Items", []) if it.get("recordId") not in ("latest", appointment_id)]
-            if candidates:
-                candidates.sort(key=lambda r: r.get("updatedAt") or "")
-                newest = candidates[-1]
-                health_index_table.put_item(
-                    Item={
-                        "patientId": patient_id,
-                        "recordId": "latest",
-                        "updatedAt": newest.get("updatedAt"),
-                        "reasonCode": newest.get("reasonCode"),
-                        "metrics": newest.get("metrics") or newest.get("summary") or {},
-                    }
-                )
-            else:
-                # No remaining records: clear the 'latest' pointer
-                health_index_table.delete_item(Key={"patientId": patient_id, "recordId": "latest"})
+        latest = health_index_table.get_item(Key={"patientId": patient_id, "recordId": LATEST_RECORD_ID}).get("Item")
+        if latest and (
+            latest.get("sourceRecordId") == appointment_id
+            # Pointers written before sourceRecordId existed
+            or (not latest.get("sourceRecordId") and latest.get("updatedAt") == record.get("createdAt"))
+        ):
+            refresh_latest_health_record(patient_id)
+        # The trend and anomaly baselines must no longer count the cancelled reading.
+        if removed:
+            metrics = removed.get("metrics") or removed.get("summary") or {}
+            withdraw_vitals_reading(patient_id, appointment_id, removed.get("updatedAt"), metrics)
+        # Chunks are read whatever VITALS_SERIES_ENABLED says now, so clean up
+        # even when writing them is off.
+        if record.get("createdAt"):
+            discard_vitals_series(patient_id, datetime.fromisoformat(record["createdAt"]))
     except Exception:
         LOGGER.exception("health index cleanup failed for cancellation")
 
@@ -4,9 +4,7 @@ import json
 import logging
 import os
 import sys
-import time
 from datetime import datetime, timezone
-from decimal import Decimal
 from typing import Any, Dict
 
 from boto3.dynamodb.conditions import Key
@@ -17,41 +15,34 @@ if PARENT_DIR not in sys.path:
     sys.path.append(PARENT_DIR)
 
 from common import (  # noqa: E402
+    append_vitals_series,
     appointments_table,
     emit_event,
+    generate_ulid,
     get_claim,
     health_index_table,
     json_response,
+    latest_health_item,
     require_role,
+    to_dynamo,
+    update_vitals_rollup,
     users_table,
     is_demo_mode,
+    vitals_series_enabled,
 )
+from specialty_recommender import MAX_COMPLAINT_LENGTH, load_recommender  # noqa: E402
+from vitals_schema import compile_vitals_schema  # noqa: E402
 
 
 LOGGER = logging.getLogger(__name__)
 
-ULID_ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
-MANDATORY_VITAL_FIELDS = {
-    "heightCm",
-    "weightKg",
-    "temperatureC",
-}
+validate_vitals = compile_vitals_schema()
+RECOMMENDER = load_recommender()
+
 # The simplified application always stores appointments with the "GENERAL"
 # reason code. Patients no longer specify problem codes in the UI.
 
 
-def generate_ulid() -> str:
-    millis = int(time.time() * 1000)
-    time_bytes = millis.to_bytes(6, byteorder="big", signed=False)
-    random_bytes = os.urandom(10)
-    value = int.from_bytes(time_bytes + random_bytes, "big")
-    chars = []
-    for _ in range(26):
-        value, idx = divmod(value, 32)
-        chars.append(ULID_ALPHABET[idx])
-    return "".join(reversed(chars))
-
-
 def parse_slot_iso(slot: str) -> datetime:
     try:
         parsed = datetime.fromisoformat(slot.replace("Z", "+00:00"))
@@ -62,47 +53,6 @@ def parse_slot_iso(slot: str) -> datetime:
     return parsed.astimezone(timezone.utc)
 
 
-def compute_bmi(height_cm: float, weight_kg: float) -> float | None:
-    try:
-        meters = float(height_cm) / 100
-        weight = float(weight_kg)
-        if meters <= 0:
-            return None
-        return round(weight / (meters * meters), 1)
-    except (TypeError, ValueError, ZeroDivisionError):
-        return None
-
-
-def sanitize_vitals(vitals: Dict[str, Any]) -> Dict[str, Any]:
-    if not isinstance(vitals, dict):
-        raise ValueError("vitals must be an object")
-    summary: Dict[str, Any] = {}
-    for field in MANDATORY_VITAL_FIELDS:
-        value = vitals.get(field)
-        if value is None:
-            raise ValueError(f"Missing vital: {field}")
-        try:
-            summary[field] = float(value)
-        except (TypeError, ValueError) as exc:
-            raise ValueError(f"Invalid numeric value for {field}") from exc
-
-    for key, value in vitals.items():
-        if key in summary:
-            continue
-        if isinstance(value, (int, float)):
-            summary[key] = float(value)
-        elif isinstance(value, str):
-            summary[key] = value[:120]
-
-    bmi = summary.get("bmi")
-    if bmi is None:
-        computed = compute_bmi(summary["heightCm"], summary["weightKg"])
-        if computed is not None:
-            summary["bmi"] = computed
-
-    return summary
-
-
 def lambda_handler(event: Dict[str, Any], _context: Any):
     forbidden = require_role(event, ["PATIENT"])
     if forbidden:
@@ -118,9 +68,9 @@ def lambda_handler(event: Dict[str, Any], _context: Any):
     doctor_id = body.get("doctorId")
     slot_iso = body.get("slotISO")
     # In the simplified flow, we ignore any reason code sent by the front‑end and
-    # default to "GENERAL". The recommendedSpecialty field is no longer used.
+    # default to "GENERAL".
     reason_code = body.get("reasonCode") or "GENERAL"
-    recommended_specialty = None
+    complaint = body.get("complaint")
     vitals = body.get("vitals")
 
     LOGGER.info(
@@ -137,12 +87,14 @@ def lambda_handler(event: Dict[str, Any], _context: Any):
         return json_response({"message": "doctorId and slotISO are required"}, 400)
     # If reason_code is falsy, use the default. We no longer enforce a
     # particular reason code.
+    if complaint is not None and not isinstance(complaint, str):
+        return json_response({"message": "complaint must be a string"}, 400)
+    complaint = (complaint or "").strip()[:MAX_COMPLAINT_LENGTH]
+    recommended_specialty = RECOMMENDER.recommend_one(complaint)
 
     try:
-        summary_vitals = sanitize_vitals(vitals or {})
-        # Convert floats to Decimal for DynamoDB
-        summary_vitals_decimal = {k: Decimal(str(v)) if isinstance(v, (int, float)) else v 
-                                  for k, v in summary_vitals.items()}
+        # One pass: range checks, unit conversion, derived BMI and Decimals.
+        summary_vitals, summary_vitals_decimal = validate_vitals(vitals or {})
     except ValueError as exc:
         return json_response({"message": str(exc)}, 400)
 
@@ -194,11 +146,15 @@ def lambda_handler(event: Dict[str, Any], _context: Any):
         "updatedAt": created_at,
         # Always store the generic reason code. The front‑end no longer sends specific problem codes.
         "reasonCode": reason_code or "GENERAL",
-        # recommendedSpecialty is unused in the simplified model
         "vitalsSummary": summary_vitals_decimal,
         "vitals": summary_vitals_decimal,
     }
 
+    if complaint:
+        item["complaint"] = complaint
+    if recommended_specialty:
+        item["recommendedSpecialty"] = recommended_specialty
+
     try:
         appointments_table.put_item(Item=item)
     except Exception:  # pylint: disable=broad-except
@@ -213,21 +169,41 @@ def lambda_handler(event: Dict[str, Any], _context: Any):
         "reasonCode": reason_code or "GENERAL",
         "metrics": summary_vitals_decimal,
     }
+    # City of the booked doctor: the cohort used for percentile ranks.
+    city = profile.get("city") or profile.get("location")
+    if city:
+        health_record["city"] = city
     try:
         health_index_table.put_item(Item=health_record)
-        health_index_table.put_item(
-            Item={
-                "patientId": patient_id,
-                "recordId": "latest",
-                "updatedAt": created_at,
-                "reasonCode": reason_code,
-                "metrics": summary_vitals_decimal,
-            }
-        )
+        health_index_table.put_item(Item=latest_health_item(patient_id, health_record))
     except Exception:  # pylint: disable=broad-except
         LOGGER.exception("failed to persist health index")
         return json_response({"message": "unable to store vitals"}, 500)
 
+    try:
+        anomalies = update_vitals_rollup(patient_id, [(appointment_id, created_at, summary_vitals)])
+    except Exception:  # pylint: disable=broad-except
+        # The rollup is derived data; the booking itself has been stored.
+        LOGGER.exception("failed to update vitals rollup")
+        anomalies = []
+    if anomalies:
+        item["anomalies"] = to_dynamo(anomalies)
+        LOGGER.info("vitals anomaly flagged", extra={"appointmentId": appointment_id, "anomalies": anomalies})
+        try:
+            appointments_table.update_item(
+                Key={"appointmentId": appointment_id},
+                UpdateExpression="SET anomalies = :anomalies",
+                ExpressionAttributeValues={":anomalies": item["anomalies"]},
+            )
+        except Exception:  # pylint: disable=broad-except
+            LOGGER.exception("failed to flag appointment anomalies")
+
+    if vitals_series_enabled():
+        try:
+            append_vitals_series(patient_id, datetime.fromisoformat(created_at), summary_vitals)
+        except Exception:  # pylint: disable=broad-except
+            LOGGER.exception("failed to append packed vitals series")
+
     # Attach a minimal doctor profile to the event. Languages are no longer included.
     item["doctorProfile"] = {
         "specialty": profile.get("specialty"),
@@ -255,4 +231,6 @@ def lambda_handler(event: Dict[str, Any], _context: Any):
     except Exception:
         LOGGER.exception("cleanup old appointments failed")
 
-    return json_response({"appointmentId": appointment_id, "status": "PENDING"}, 201)
+    return json_response(
+        {"appointmentId": appointment_id, "status": "PENDING", "recommendedSpecialty": recommended_specialty}, 201
+    )
@@ -0,0 +1,110 @@
+"""Circuit breaker and deadline helpers for calls to the remote model.
+
+When the model endpoint degrades, waiting out every request's timeout ties up
+Lambda invocations and keeps load on the endpoint. The breaker watches the
+outcomes of recent calls within a sliding window of ``window`` seconds:
+
+* closed - calls go through. Once the window holds at least ``min_calls``
+  and the share of failures or of slow calls (slower than ``slow_call``
+  seconds) reaches its threshold, the breaker opens;
+* open - calls are refused immediately for ``open_seconds``;
+* half-open - after that, ``half_open_probes`` calls may go through. A
+  success closes the breaker with a fresh window. A failure opens it again.
+
+State is per container, like the connection pool it protects.
+
+:func:`remaining_seconds` turns the Lambda context into a time budget, so a
+remote call never outlives the invocation that makes it.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Optional, Tuple
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+# Time kept back from the Lambda deadline to build and return a response.
+DEADLINE_MARGIN_SECONDS = 0.5
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        window: float = 30.0,
+        min_calls: int = 10,
+        failure_rate: float = 0.5,
+        slow_call: float = 2.0,
+        slow_call_rate: float = 0.8,
+        open_seconds: float = 15.0,
+        half_open_probes: int = 1,
+        clock: Any = time.monotonic,
+    ) -> None:
+        self.window = window
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call = slow_call
+        self.slow_call_rate = slow_call_rate
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+        self.clock = clock
+        self.state = CLOSED
+        self._opened_at = 0.0
+        self._probes = 0
+        # (time, failed, slow) per completed call inside the window.
+        self._calls: Deque[Tuple[float, bool, bool]] = deque()
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Whether a call may be made now; each allowed call must be recorded."""
+        with self._lock:
+            if self.state == OPEN:
+                if self.clock() - self._opened_at < self.open_seconds:
+                    return False
+                self.state = HALF_OPEN
+                self._probes = 0
+            if self.state == HALF_OPEN:
+                if self._probes >= self.half_open_probes:
+                    return False
+                self._probes += 1
+            return True
+
+    def record(self, success: bool, latency: float) -> None:
+        now = self.clock()
+        with self._lock:
+            if self.state == HALF_OPEN:
+                if success and latency < self.slow_call:
+                    self.state = CLOSED
+                    self._calls.clear()
+                else:
+                    self._open(now)
+                return
+            if self.state == OPEN:
+                # A call that started before the breaker opened.
+                return
+            self._calls.append((now, not success, latency >= self.slow_call))
+            while self._calls and self._calls[0][0] < now - self.window:
+                self._calls.popleft()
+            total = len(self._calls)
+            if total < self.min_calls:
+                return
+            failed = sum(1 for _, failure, _ in self._calls if failure)
+            slow = sum(1 for _, _, is_slow in self._calls if is_slow)
+            if failed / total >= self.failure_rate or slow / total >= self.slow_call_rate:
+                self._open(now)
+
+    def _open(self, now: float) -> None:
+        self.state = OPEN
+        self._opened_at = now
+        self._calls.clear()
+
+
+def remaining_seconds(context: Any, margin: float = DEADLINE_MARGIN_SECONDS) -> Optional[float]:
+    """Seconds left in the invocation minus ``margin``; None without a Lambda context."""
+    get_remaining = getattr(context, "get_remaining_time_in_millis", None)
+    if get_remaining is None:
+        return None
+    return get_remaining() / 1000.0 - margin
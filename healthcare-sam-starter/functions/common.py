@@ -2,13 +2,23 @@ from __future__ import annotations
 
 import json
 import logging
+import math
 import os
-from datetime import datetime
+import random
+import time
+from datetime import datetime, timezone
 from decimal import Decimal
-from typing import Any, Dict, Iterable, Optional, Set
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
 import base64
+import struct
+from array import array
 
 import boto3
+from boto3.dynamodb.conditions import Attr, Key
+from botocore.exceptions import ClientError
+
+from event_codec import build_detail
+from vitals_stats import fold_readings, numeric_metrics, welford_remove
 
 
 LOGGER = logging.getLogger("health-app")
@@ -20,6 +30,29 @@ appointments_table = dynamodb.Table(os.environ["APPOINTMENTS_TABLE_NAME"])
 health_index_table = dynamodb.Table(os.environ["PATIENT_HEALTH_INDEX_TABLE_NAME"])
 events_client = boto3.client("events")
 
+ULID_ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+# Health-index history records are keyed by ULID, so they sort by creation
+# time. ULIDs only use digits and upper-case letters, which sort before the
+# lower-case bookkeeping items of the partition ("latest", ...); bounding the
+# sort key below HISTORY_RECORD_ID_LIMIT selects history records only.
+LATEST_RECORD_ID = "latest"
+ROLLUP_RECORD_ID = "rollup"
+HISTORY_RECORD_ID_LIMIT = "a"
+ROLLUP_UPDATE_ATTEMPTS = 4
+# Record ids of the most recently folded readings, kept on the rollup so a
+# resent request (up to one full batch) is not counted twice.
+ROLLUP_FOLDED_IDS = 500
+BATCH_WRITE_LIMIT = 25
+BATCH_WRITE_ATTEMPTS = 8
+
+# Packed vitals history: one item per patient and month ("series#YYYY-MM")
+# holding the readings as fixed-schema float32 columns. NaN marks a metric
+# that was not measured.
+SERIES_RECORD_PREFIX = "series#"
+SERIES_FIELDS = ("heightCm", "weightKg", "temperatureC", "bmi")
+SERIES_FORMAT_VERSION = 1
+_SERIES_HEADER = struct.Struct("<BBI")
+
 
 class DecimalEncoder(json.JSONEncoder):
     """Custom JSON encoder to handle Decimal types from DynamoDB"""
@@ -130,23 +163,13 @@ def emit_event(event_type: str, appointment: Dict[str, Any]) -> None:
     if not bus_name:
         LOGGER.warning("APPOINTMENT_EVENT_BUS_NAME missing; skipping event emit")
         return
-    detail = {
-        "eventType": event_type,
-        "appointmentId": appointment.get("appointmentId"),
-        "patientId": appointment.get("patientId"),
-        "doctorId": appointment.get("doctorId"),
-        "slotISO": appointment.get("slotISO"),
-        "status": appointment.get("status"),
-        "reasonCode": appointment.get("reasonCode"),
-        "recommendedSpecialty": appointment.get("recommendedSpecialty"),
-        "ts": datetime.utcnow().isoformat(),
-    }
+    detail = build_detail(event_type, appointment, datetime.utcnow().isoformat())
     events_client.put_events(
         Entries=[
             {
                 "Source": "health.appointments",
                 "DetailType": event_type,
-                "Detail": json.dumps(detail),
+                "Detail": json.dumps(detail, cls=DecimalEncoder),
                 "EventBusName": bus_name,
             }
         ]
@@ -168,3 +191,396 @@ def normalize_languages(raw: Any) -> list[str]:
         if value_str:
             cleaned.append(value_str)
     return cleaned
+
+
+def generate_ulid(millis: Optional[int] = None, entropy: Optional[bytes] = None) -> str:
+    """ULID for ``millis``; passing ``entropy`` (10+ bytes) makes it deterministic."""
+    if millis is None:
+        millis = int(time.time() * 1000)
+    time_bytes = millis.to_bytes(6, byteorder="big", signed=False)
+    random_bytes = entropy[:10] if entropy is not None else os.urandom(10)
+    value = int.from_bytes(time_bytes + random_bytes, "big")
+    chars = []
+    for _ in range(26):
+        value, idx = divmod(value, 32)
+        chars.append(ULID_ALPHABET[idx])
+    return "".join(reversed(chars))
+
+
+def ulid_bound(moment: datetime, upper: bool = False) -> str:
+    """Smallest (or largest) ULID that can be generated at ``moment``.
+
+    Used to turn a time range into a sort-key range over history records.
+    """
+    millis = max(0, int(moment.timestamp() * 1000))
+    chars = []
+    for _ in range(10):
+        millis, idx = divmod(millis, 32)
+        chars.append(ULID_ALPHABET[idx])
+    fill = ULID_ALPHABET[-1] if upper else ULID_ALPHABET[0]
+    return "".join(reversed(chars)) + fill * 16
+
+
+def history_key_condition(patient_id: str):
+    return Key("patientId").eq(patient_id) & Key("recordId").lt(HISTORY_RECORD_ID_LIMIT)
+
+
+def latest_health_item(patient_id: str, record: Dict[str, Any]) -> Dict[str, Any]:
+    """Build the "latest" pointer item mirroring a history record."""
+    item = {
+        "patientId": patient_id,
+        "recordId": LATEST_RECORD_ID,
+        "sourceRecordId": record.get("recordId"),
+        "updatedAt": record.get("updatedAt"),
+        "reasonCode": record.get("reasonCode"),
+        "metrics": record.get("metrics") or record.get("summary") or {},
+    }
+    if record.get("city"):
+        item["city"] = record["city"]
+    return item
+
+
+def refresh_latest_health_record(patient_id: str) -> Optional[Dict[str, Any]]:
+    """Point "latest" at the newest remaining history record, or delete it.
+
+    A reverse, consistent Query limited to one item reads only the newest
+    record, so the cost does not grow with the patient's history.
+    """
+    newest = health_index_table.query(
+        KeyConditionExpression=history_key_condition(patient_id),
+        ScanIndexForward=False,
+        Limit=1,
+        ConsistentRead=True,
+    ).get("Items", [])
+    if not newest:
+        health_index_table.delete_item(Key={"patientId": patient_id, "recordId": LATEST_RECORD_ID})
+        return None
+    latest = latest_health_item(patient_id, newest[0])
+    health_index_table.put_item(Item=latest)
+    return latest
+
+
+def advance_latest_health_record(patient_id: str, record: Dict[str, Any]) -> bool:
+    """Point "latest" at ``record`` unless it already points at something newer."""
+    try:
+        health_index_table.put_item(
+            Item=latest_health_item(patient_id, record),
+            ConditionExpression=Attr("recordId").not_exists() | Attr("updatedAt").lt(record["updatedAt"]),
+        )
+        return True
+    except ClientError as exc:
+        if exc.response.get("Error", {}).get("Code") != "ConditionalCheckFailedException":
+            raise
+        return False
+
+
+def to_dynamo(value: Any) -> Any:
+    """Recursively convert floats to Decimal; non-finite floats become None."""
+    if isinstance(value, bool) or value is None:
+        return value
+    if isinstance(value, float):
+        return Decimal(str(value)) if math.isfinite(value) else None
+    if isinstance(value, dict):
+        return {key: to_dynamo(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_dynamo(item) for item in value]
+    return value
+
+
+def update_vitals_rollup(
+    patient_id: str, readings: List[Tuple[str, Optional[str], Dict[str, Any]]]
+) -> List[Dict[str, Any]]:
+    """Fold new ``(recordId, timestamp, metrics)`` readings, oldest first, into the "rollup" item.
+
+    The rollup holds running statistics per metric (see ``vitals_stats``), so
+    summary and trend reads are a single GetItem. Concurrent writers are
+    serialised with an optimistic ``version`` check. Returns the anomalies
+    the new readings raised against the patient's baseline.
+
+    Every reading enters the count, mean, variance and range, so the result
+    matches :func:`rebuild_vitals_rollup`. Readings timestamped at or before
+    the rollup's ``updatedAt`` are backfill and stay out of ``recent``, the
+    EWMA and anomaly scoring. Readings whose record id is among the last
+    ``ROLLUP_FOLDED_IDS`` folded are resends and are skipped.
+    """
+    key = {"patientId": patient_id, "recordId": ROLLUP_RECORD_ID}
+    for _attempt in range(ROLLUP_UPDATE_ATTEMPTS):
+        current = health_index_table.get_item(Key=key, ConsistentRead=True).get("Item")
+        version = int(current.get("version", 0)) if current else 0
+        last_at = (current or {}).get("updatedAt")
+        folded = list((current or {}).get("folded") or [])
+        seen = set(folded)
+        fresh = []
+        for record_id, at, metrics in readings:
+            if record_id not in seen:
+                seen.add(record_id)
+                fresh.append((record_id, at, metrics))
+        if not fresh:
+            return []
+        metrics, anomalies = fold_readings(
+            (current or {}).get("metrics"), [(at, reading) for _, at, reading in fresh], after=last_at
+        )
+        stamps = [at for at in [last_at] + [at for _, at, _ in fresh] if at]
+        item = {
+            **key,
+            "version": version + 1,
+            "updatedAt": max(stamps, default=None),
+            "metrics": to_dynamo(metrics),
+            "folded": (folded + [record_id for record_id, _, _ in fresh])[-ROLLUP_FOLDED_IDS:],
+        }
+        condition = Attr("version").eq(version) if current else Attr("recordId").not_exists()
+        try:
+            health_index_table.put_item(Item=item, ConditionExpression=condition)
+            return anomalies
+        except ClientError as exc:
+            if exc.response.get("Error", {}).get("Code") != "ConditionalCheckFailedException":
+                raise
+    raise RuntimeError("vitals rollup update kept conflicting")
+
+
+def withdraw_vitals_reading(patient_id: str, record_id: str, at: Optional[str], metrics: Dict[str, Any]) -> None:
+    """Take one deleted history reading back out of the "rollup" item.
+
+    The count, mean and variance are reversed in place (``welford_remove``).
+    The range, ``recent`` and the EWMA cannot be reversed, so when the
+    reading was a metric's min or max, or is still in its ``recent`` list,
+    the rollup is rebuilt from the remaining history instead.
+    """
+    key = {"patientId": patient_id, "recordId": ROLLUP_RECORD_ID}
+    values = numeric_metrics(metrics)
+    for _attempt in range(ROLLUP_UPDATE_ATTEMPTS):
+        current = health_index_table.get_item(Key=key, ConsistentRead=True).get("Item")
+        if not current:
+            return
+        version = int(current.get("version", 0))
+        rollup = dict(current.get("metrics") or {})
+        for name, value in values.items():
+            stats = rollup.get(name)
+            if not stats:
+                continue
+            low, high = float(stats["min"]), float(stats["max"])
+            # A range of one value survives while other readings remain.
+            shapes_range = not low < value < high and not (low == high and int(stats.get("n", 0)) > 1)
+            if shapes_range or any(entry.get("t") == at for entry in stats.get("recent") or []):
+                rebuild_vitals_rollup(patient_id)
+                return
+            rollup[name] = welford_remove(stats, value)
+        item = {
+            **current,
+            "version": version + 1,
+            "metrics": to_dynamo({name: stats for name, stats in rollup.items() if stats}),
+            "folded": [folded_id for folded_id in current.get("folded") or [] if folded_id != record_id],
+        }
+        try:
+            health_index_table.put_item(Item=item, ConditionExpression=Attr("version").eq(version))
+            return
+        except ClientError as exc:
+            if exc.response.get("Error", {}).get("Code") != "ConditionalCheckFailedException":
+                raise
+    raise RuntimeError("vitals rollup update kept conflicting")
+
+
+def rebuild_vitals_rollup(patient_id: str) -> Optional[Dict[str, Any]]:
+    """Recompute the "rollup" item from the patient's remaining history.
+
+    Refolds every remaining record oldest first, so the cost grows with the
+    patient's history; :func:`withdraw_vitals_reading` only falls back to it
+    when a withdrawn reading shaped the range, ``recent`` or the EWMA. The
+    rollup is deleted when no history is left.
+    """
+    key = {"patientId": patient_id, "recordId": ROLLUP_RECORD_ID}
+    for _attempt in range(ROLLUP_UPDATE_ATTEMPTS):
+        current = health_index_table.get_item(Key=key, ConsistentRead=True).get("Item")
+        version = int(current.get("version", 0)) if current else 0
+        history: List[Tuple[str, Optional[str], Dict[str, Any]]] = []
+        kwargs: Dict[str, Any] = {
+            "KeyConditionExpression": history_key_condition(patient_id),
+            "ProjectionExpression": "recordId, updatedAt, #metrics",
+            "ExpressionAttributeNames": {"#metrics": "metrics"},
+            "ConsistentRead": True,
+        }
+        while True:
+            response = health_index_table.query(**kwargs)
+            history.extend(
+                (item["recordId"], item.get("updatedAt"), item.get("metrics") or {})
+                for item in response.get("Items", [])
+            )
+            if not response.get("LastEvaluatedKey"):
+                break
+            kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+        history.sort(key=lambda reading: reading[1] or "")
+        condition = Attr("version").eq(version) if current else Attr("recordId").not_exists()
+        try:
+            if not history:
+                if current:
+                    health_index_table.delete_item(Key=key, ConditionExpression=condition)
+                return None
+            item = {
+                **key,
+                "version": version + 1,
+                "updatedAt": history[-1][1],
+                "metrics": to_dynamo(fold_readings(None, [(at, metrics) for _, at, metrics in history])[0]),
+                "folded": [record_id for record_id, _, _ in history[-ROLLUP_FOLDED_IDS:]],
+            }
+            health_index_table.put_item(Item=item, ConditionExpression=condition)
+            return item
+        except ClientError as exc:
+            if exc.response.get("Error", {}).get("Code") != "ConditionalCheckFailedException":
+                raise
+    raise RuntimeError("vitals rollup rebuild kept conflicting")
+
+
+def vitals_series_enabled() -> bool:
+    return os.getenv("VITALS_SERIES_ENABLED", "false").lower() == "true"
+
+
+def series_record_id(moment: datetime) -> str:
+    return f"{SERIES_RECORD_PREFIX}{moment:%Y-%m}"
+
+
+def pack_vitals_series(readings: List[Tuple[int, Dict[str, Any]]]) -> bytes:
+    """Pack ``(epoch millis, metrics)`` readings into a series chunk.
+
+    Layout (little-endian): header ``version | field count | reading count``,
+    then an int64 timestamp column, then one float32 column per field in
+    ``SERIES_FIELDS`` order. Readings are stored sorted by time.
+    """
+    readings = sorted(readings, key=lambda reading: reading[0])
+    stamps = array("q", [int(millis) for millis, _metrics in readings])
+    columns = array("f")
+    for field in SERIES_FIELDS:
+        for _millis, metrics in readings:
+            value = metrics.get(field)
+            columns.append(float("nan") if value is None or isinstance(value, (bool, str)) else float(value))
+    header = _SERIES_HEADER.pack(SERIES_FORMAT_VERSION, len(SERIES_FIELDS), len(readings))
+    return header + stamps.tobytes() + columns.tobytes()
+
+
+def unpack_vitals_series(data: bytes) -> Tuple[array, Dict[str, array]]:
+    """Inverse of :func:`pack_vitals_series`: the timestamp and field columns."""
+    data = bytes(data)
+    version, field_count, count = _SERIES_HEADER.unpack_from(data)
+    if version != SERIES_FORMAT_VERSION or field_count > len(SERIES_FIELDS):
+        raise ValueError(f"unsupported vitals series chunk (version {version})")
+    offset = _SERIES_HEADER.size
+    stamps = array("q")
+    stamps.frombytes(data[offset:offset + 8 * count])
+    offset += 8 * count
+    columns: Dict[str, array] = {}
+    for field in SERIES_FIELDS[:field_count]:
+        column = array("f")
+        column.frombytes(data[offset:offset + 4 * count])
+        columns[field] = column
+        offset += 4 * count
+    return stamps, columns
+
+
+def series_readings(data: bytes) -> List[Tuple[int, Dict[str, float]]]:
+    """Decode a chunk into ``(epoch millis, metrics)`` pairs, dropping NaNs."""
+    stamps, columns = unpack_vitals_series(data)
+    readings = []
+    for index, millis in enumerate(stamps):
+        metrics = {}
+        for field, column in columns.items():
+            value = column[index]
+            if not math.isnan(value):
+                metrics[field] = value
+        readings.append((millis, metrics))
+    return readings
+
+
+def append_vitals_series(patient_id: str, moment: datetime, metrics: Dict[str, Any]) -> Dict[str, Any]:
+    """Add one reading to the patient's chunk for ``moment``'s month."""
+    return extend_vitals_series(patient_id, [(moment, metrics)])[-1]
+
+
+def extend_vitals_series(patient_id: str, readings: List[Tuple[datetime, Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """Add readings to the patient's monthly chunks, one write per month touched.
+
+    Uses the same optimistic ``version`` check as the rollup item.
+    """
+    by_month: Dict[str, List[Tuple[int, Dict[str, Any]]]] = {}
+    for moment, metrics in readings:
+        by_month.setdefault(series_record_id(moment), []).append((_series_millis(moment), metrics))
+    return [
+        _update_series_chunk(patient_id, record_id, lambda current, chunk=chunk: _add_readings(current, chunk))
+        for record_id, chunk in sorted(by_month.items())
+    ]
+
+
+def discard_vitals_series(patient_id: str, moment: datetime) -> Optional[Dict[str, Any]]:
+    """Remove the reading taken at ``moment`` from its monthly chunk.
+
+    The chunk is deleted when it becomes empty. Returns the chunk as stored
+    afterwards (None once deleted).
+    """
+    millis = _series_millis(moment)
+    return _update_series_chunk(
+        patient_id,
+        series_record_id(moment),
+        lambda current: [reading for reading in current if reading[0] != millis],
+    )
+
+
+def _series_millis(moment: datetime) -> int:
+    return int(moment.replace(tzinfo=moment.tzinfo or timezone.utc).timestamp() * 1000)
+
+
+def _add_readings(
+    current: List[Tuple[int, Dict[str, Any]]], new_readings: List[Tuple[int, Dict[str, Any]]]
+) -> List[Tuple[int, Dict[str, Any]]]:
+    # A reading already in the chunk (same millisecond) is a resend, not a new value.
+    seen = {millis for millis, _metrics in current}
+    added = []
+    for reading in new_readings:
+        if reading[0] not in seen:
+            seen.add(reading[0])
+            added.append(reading)
+    return current + added
+
+
+def _update_series_chunk(
+    patient_id: str,
+    record_id: str,
+    change: Callable[[List[Tuple[int, Dict[str, Any]]]], List[Tuple[int, Dict[str, Any]]]],
+) -> Optional[Dict[str, Any]]:
+    """Apply ``change`` to a chunk's readings under the optimistic ``version`` check."""
+    key = {"patientId": patient_id, "recordId": record_id}
+    for _attempt in range(ROLLUP_UPDATE_ATTEMPTS):
+        current = health_index_table.get_item(Key=key, ConsistentRead=True).get("Item")
+        version = int(current.get("version", 0)) if current else 0
+        readings = series_readings(getattr(current["data"], "value", current["data"])) if current else []
+        changed = change(readings)
+        if len(changed) == len(readings):
+            return current
+        condition = Attr("version").eq(version) if current else Attr("recordId").not_exists()
+        try:
+            if not changed:
+                health_index_table.delete_item(Key=key, ConditionExpression=condition)
+                return None
+            item = {
+                **key,
+                "version": version + 1,
+                "count": len(changed),
+                "data": pack_vitals_series(changed),
+            }
+            health_index_table.put_item(Item=item, ConditionExpression=condition)
+            return item
+        except ClientError as exc:
+            if exc.response.get("Error", {}).get("Code") != "ConditionalCheckFailedException":
+                raise
+    raise RuntimeError("vitals series update kept conflicting")
+
+
+def batch_put_items(table, items: List[Dict[str, Any]]) -> None:
+    """BatchWriteItem in chunks of 25, retrying unprocessed items with backoff."""
+    for offset in range(0, len(items), BATCH_WRITE_LIMIT):
+        pending = [{"PutRequest": {"Item": item}} for item in items[offset:offset + BATCH_WRITE_LIMIT]]
+        for attempt in range(BATCH_WRITE_ATTEMPTS):
+            response = dynamodb.batch_write_item(RequestItems={table.name: pending})
+            pending = (response.get("UnprocessedItems") or {}).get(table.name) or []
+            if not pending:
+                break
+            time.sleep(min(2.0, 0.05 * 2 ** attempt) * random.uniform(0.5, 1.0))
+        else:
+            raise RuntimeError(f"{len(pending)} items still unprocessed after {BATCH_WRITE_ATTEMPTS} attempts")
@@ -0,0 +1,102 @@
+"""In-process diabetes-risk model: logistic regression evaluated with NumPy.
+
+Coefficients live in ``models/diabetes_logreg.json`` next to this module,
+so they ship with the function code and can be refitted without touching
+Python (``scripts/train_diabetes_model.py``). Each feature in the file gives
+its position in the input vector and the range it is clipped to. The
+predictor form sends exactly these features.
+
+:func:`LogisticModel.predict` scores a whole ``(n, features)`` matrix with
+one matrix-vector product, so single requests and batches share the same
+code path. ``test_diabetes_model.py`` checks parity with outputs recorded
+from the remote model.
+"""
+from __future__ import annotations
+
+import json
+import math
+import os
+from functools import lru_cache
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "models", "diabetes_logreg.json")
+# PatientHealthIndex item holding the nightly score (scripts/score_patient_risk.py).
+RISK_RECORD_ID = "risk"
+# A stored score may fill at most this many model features with defaults.
+# With more, the score mostly reflects the defaults, so it is neither stored
+# nor served.
+MAX_IMPUTED_FEATURES = 2
+
+
+class LogisticModel:
+    def __init__(self, spec: Mapping[str, Any]) -> None:
+        features = spec["features"]
+        self.version = str(spec.get("version", "unknown"))
+        self.names: Tuple[str, ...] = tuple(feature["name"] for feature in features)
+        self.low = np.array([feature["min"] for feature in features], dtype=np.float64)
+        self.high = np.array([feature["max"] for feature in features], dtype=np.float64)
+        self.coefficients = np.array([feature["coefficient"] for feature in features], dtype=np.float64)
+        self.intercept = float(spec["intercept"])
+
+    def row(self, features: Mapping[str, Any]) -> List[float]:
+        """One input row in model order; raises ValueError on missing or bad values."""
+        if not isinstance(features, Mapping):
+            raise ValueError("features must be an object")
+        row = []
+        for name in self.names:
+            value = features.get(name)
+            if value is None or isinstance(value, bool):
+                raise ValueError(f"Missing feature: {name}")
+            try:
+                number = float(value)
+            except (TypeError, ValueError) as exc:
+                raise ValueError(f"Invalid numeric value for {name}") from exc
+            if not math.isfinite(number):
+                raise ValueError(f"Invalid numeric value for {name}")
+            row.append(number)
+        return row
+
+    def matrix(self, rows: Sequence[Mapping[str, Any]]) -> np.ndarray:
+        return np.array([self.row(features) for features in rows], dtype=np.float64).reshape(len(rows), len(self.names))
+
+    def predict(self, matrix: np.ndarray) -> np.ndarray:
+        """Probability of diabetes for every row of ``matrix``."""
+        logits = np.clip(matrix, self.low, self.high) @ self.coefficients + self.intercept
+        return 1.0 / (1.0 + np.exp(-logits))
+
+    def predict_one(self, features: Mapping[str, Any]) -> float:
+        return float(self.predict(self.matrix([features]))[0])
+
+
+@lru_cache(maxsize=4)
+def load_model(path: str = MODEL_PATH) -> LogisticModel:
+    with open(path, encoding="utf-8") as handle:
+        return LogisticModel(json.load(handle))
+
+
+def remote_probability(parsed: Any) -> Optional[float]:
+    """Probability (0-1) from a remote model response, in the formats patient.js accepts."""
+    if not isinstance(parsed, dict):
+        return None
+    value: Any = None
+    if parsed.get("probability") is not None:
+        value = parsed["probability"]
+    elif isinstance(parsed.get("probabilities"), list) and parsed["probabilities"]:
+        probabilities = parsed["probabilities"]
+        value = probabilities[1] if len(probabilities) > 1 else probabilities[0]
+    elif parsed.get("score") is not None:
+        value = parsed["score"]
+    elif parsed.get("prediction") is not None:
+        value = parsed["prediction"]
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    # Some endpoints answer in percent.
+    return number / 100.0 if number > 1 else number
+
+
+def local_response(model: LogisticModel, probability: float) -> Dict[str, Any]:
+    return {"probability": round(probability, 4), "source": "local", "modelVersion": model.version}
@@ -0,0 +1,129 @@
+"""Rank candidate doctors so patient demand spreads across them.
+
+Each candidate gets a score in [0, 1] from three terms, weighted by
+``WEIGHTS``:
+
+* ``slot``: how soon the earliest free published slot is. It falls linearly
+  from 1 (now) to 0 at ``SLOT_HORIZON_HOURS``. A slot is free when it is in
+  the future and no appointment, of any status, holds it. That is the same
+  rule ``POST /appointments`` uses to answer 409. Doctors who publish no slots
+  accept any time, so they get ``UNPUBLISHED_SLOT_SCORE``. Doctors whose
+  published slots are all taken score 0 and are ranked after every bookable
+  doctor. Slots that do not parse as ISO-8601 times are ignored.
+* ``queue``: ``1 / (1 + pending)``, where ``pending`` counts the doctor's
+  upcoming PENDING appointments.
+* ``city``: 1 when the doctor is in the preferred city.
+
+All published slots of all candidates are flattened into one array. Their
+times, held flags (an integer :func:`numpy.isin` on doctor and time) and the
+per-doctor minimum are then computed in a single vectorized pass. :func:`heapq.nlargest` picks the top ``k`` without sorting
+every candidate.
+"""
+from __future__ import annotations
+
+import heapq
+from typing import Any, Collection, Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+WEIGHTS = {"slot": 0.5, "queue": 0.3, "city": 0.2}
+SLOT_HORIZON_HOURS = 7 * 24
+UNPUBLISHED_SLOT_SCORE = 0.5
+
+
+INVALID_SLOT = np.iinfo(np.int64).min
+
+
+def _parse_slot(slot: Any) -> np.datetime64:
+    try:
+        return np.datetime64(slot[:19], "s")
+    except (TypeError, ValueError):
+        return np.datetime64("NaT")
+
+
+def _epoch_seconds(slots: Sequence[str]) -> np.ndarray:
+    """Epoch seconds per slot; ``INVALID_SLOT`` where a slot does not parse."""
+    # Slots are stored as "YYYY-MM-DDTHH:MM:SSZ"; numpy parses the naive UTC part.
+    try:
+        parsed = np.array([slot[:19] for slot in slots], dtype="datetime64[s]")
+    except (TypeError, ValueError):
+        # Profiles are edited by hand, so one bad slot must not fail the request.
+        parsed = np.array([_parse_slot(slot) for slot in slots], dtype="datetime64[s]")
+    # NaT is stored as the smallest int64, which is INVALID_SLOT.
+    return parsed.astype(np.int64).reshape(len(slots))
+
+
+def rank_doctors(
+    doctors: Sequence[Mapping[str, Any]],
+    bookings: Mapping[str, Tuple[Collection[str], int]],
+    now_epoch: float,
+    city: Optional[str] = None,
+    k: int = 10,
+) -> List[Dict[str, Any]]:
+    """Top ``k`` doctors, best first, each with a ``ranking`` breakdown.
+
+    ``bookings`` maps a doctorId to (slots held by its upcoming appointments,
+    number of those that are PENDING). Missing doctors have none.
+    """
+    count = len(doctors)
+    if not count or k <= 0:
+        return []
+    published = np.zeros(count, dtype=np.intp)
+    taken_counts = np.zeros(count, dtype=np.intp)
+    pending = np.zeros(count, dtype=np.float64)
+    slots: List[str] = []
+    taken_slots: List[str] = []
+    for index, doctor in enumerate(doctors):
+        taken, pending[index] = bookings.get(doctor.get("userId"), ((), 0))
+        avail = (doctor.get("doctorProfile") or {}).get("availSlots") or []
+        published[index] = len(avail)
+        taken_counts[index] = len(taken)
+        slots.extend(avail)
+        taken_slots.extend(taken)
+
+    earliest = np.full(count, np.inf)
+    if slots:
+        owners = np.repeat(np.arange(count, dtype=np.int64), published)
+        times = _epoch_seconds(slots)
+        valid = times != INVALID_SLOT
+        owners, times = owners[valid], times[valid]
+        published = np.bincount(owners, minlength=count)
+        # A slot is held when the same doctor has an appointment at the same second.
+        held = np.isin(
+            (owners << 40) + times,
+            (np.repeat(np.arange(count, dtype=np.int64), taken_counts) << 40) + _epoch_seconds(taken_slots),
+        )
+        free = (times > now_epoch) & ~held
+        np.minimum.at(earliest, owners[free], times[free].astype(np.float64))
+    published = published > 0
+    hours = (earliest - now_epoch) / 3600.0
+    slot_score = np.where(
+        published, np.clip(1.0 - hours / SLOT_HORIZON_HOURS, 0.0, 1.0), UNPUBLISHED_SLOT_SCORE
+    )
+    queue_score = 1.0 / (1.0 + pending)
+    preferred = (city or "").strip().casefold()
+    city_match = np.array(
+        [bool(preferred) and ((doctor.get("doctorProfile") or {}).get("city") or "").strip().casefold() == preferred
+         for doctor in doctors],
+        dtype=np.float64,
+    )
+    scores = WEIGHTS["slot"] * slot_score + WEIGHTS["queue"] * queue_score + WEIGHTS["city"] * city_match
+    bookable = ~published | np.isfinite(earliest)
+
+    # Scores are in [0, 1], so the offset puts every bookable doctor first.
+    order = scores + 2.0 * bookable
+
+    best = heapq.nlargest(k, range(count), key=order.__getitem__)
+    ranked = []
+    for index in best:
+        doctor = dict(doctors[index])
+        doctor["ranking"] = {
+            "score": round(float(scores[index]), 4),
+            "earliestFreeSlot": (
+                np.datetime64(int(earliest[index]), "s").astype(str) + "Z" if np.isfinite(earliest[index]) else None
+            ),
+            "pendingCount": int(pending[index]),
+            "cityMatch": bool(city_match[index]),
+        }
+        ranked.append(doctor)
+    return ranked
@@ -1,20 +1,34 @@
 import logging
 import os
 import sys
-from typing import Any, Dict, List
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Set, Tuple
 
-from boto3.dynamodb.conditions import Attr
+from boto3.dynamodb.conditions import Attr, Key
 
 CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
 PARENT_DIR = os.path.abspath(os.path.join(CURRENT_DIR, os.pardir))
 if PARENT_DIR not in sys.path:
     sys.path.append(PARENT_DIR)
 
-from common import json_response, require_role, users_table  # noqa: E402
+from common import appointments_table, json_response, require_role, users_table  # noqa: E402
+from doctor_ranking import rank_doctors  # noqa: E402
 
 
 LOGGER = logging.getLogger(__name__)
 
+# In rank mode the doctor directory, and each candidate's booking summary,
+# is read at most once per TTL per container. The plain listing is not cached.
+DIRECTORY_TTL_SECONDS = float(os.getenv("DOCTOR_DIRECTORY_TTL_SECONDS", "60"))
+DEFAULT_RANK_K = 10
+MAX_RANK_K = 50
+BOOKINGS_CONCURRENCY = 8
+_DIRECTORY: Dict[str, Any] = {"items": None, "loadedAt": 0.0}
+# doctorId -> (loadedAt, (taken slots, pending count))
+_BOOKINGS: Dict[str, Tuple[float, Tuple[Set[str], int]]] = {}
+
 
 def normalise_doctor(item: Dict[str, Any]) -> Dict[str, Any]:
     """Convert the raw DynamoDB item into a doctor dictionary.
@@ -52,6 +66,83 @@ def normalise_doctor(item: Dict[str, Any]) -> Dict[str, Any]:
         "doctorProfile": profile,
     }
     return result
+
+
+def scan_directory() -> List[Dict[str, Any]]:
+    """All doctors, normalised, in city then last-name order."""
+    items: List[Dict[str, Any]] = []
+    kwargs: Dict[str, Any] = {"FilterExpression": Attr("role").eq("DOCTOR")}
+    while True:
+        response = users_table.scan(**kwargs)
+        items.extend(normalise_doctor(item) for item in response.get("Items", []))
+        if not response.get("LastEvaluatedKey"):
+            break
+        kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+    items.sort(key=lambda item: (item["doctorProfile"].get("city") or "", item.get("lastName") or ""))
+    return items
+
+
+def load_directory() -> List[Dict[str, Any]]:
+    """``scan_directory()``, cached for ``DIRECTORY_TTL_SECONDS``."""
+    now = time.monotonic()
+    if _DIRECTORY["items"] is None or now - _DIRECTORY["loadedAt"] >= DIRECTORY_TTL_SECONDS:
+        _DIRECTORY.update(items=scan_directory(), loadedAt=now)
+    return _DIRECTORY["items"]
+
+
+def upcoming_bookings(doctor_id: str, now_iso: str) -> Tuple[Set[str], int]:
+    """Slots held by the doctor's upcoming appointments, and how many are PENDING."""
+    taken: Set[str] = set()
+    pending = 0
+    kwargs: Dict[str, Any] = {
+        "IndexName": "GSI1",
+        "KeyConditionExpression": Key("doctorId").eq(doctor_id) & Key("slotISO").gte(now_iso),
+        "ProjectionExpression": "slotISO, #status",
+        "ExpressionAttributeNames": {"#status": "status"},
+    }
+    while True:
+        response = appointments_table.query(**kwargs)
+        for item in response.get("Items", []):
+            taken.add(item.get("slotISO"))
+            pending += item.get("status") == "PENDING"
+        if not response.get("LastEvaluatedKey"):
+            return taken, pending
+        kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+
+def load_bookings(doctor_ids: List[str], now_iso: str) -> Dict[str, Tuple[Set[str], int]]:
+    """Booking summaries for ``doctor_ids``; only missing or expired ones are queried.
+
+    ``doctor_ids`` are the candidates left after the specialty and location
+    filters, so a cold container queries GSI1 once per candidate, never once
+    per doctor in the directory.
+    """
+    now = time.monotonic()
+    stale = [
+        doctor_id for doctor_id in doctor_ids
+        if doctor_id not in _BOOKINGS or now - _BOOKINGS[doctor_id][0] >= DIRECTORY_TTL_SECONDS
+    ]
+    if stale:
+        # Expired summaries of doctors outside this search are dropped, so the
+        # cache only holds doctors searched for within the last TTL.
+        for doctor_id in [key for key, (loaded_at, _) in _BOOKINGS.items() if now - loaded_at >= DIRECTORY_TTL_SECONDS]:
+            del _BOOKINGS[doctor_id]
+        with ThreadPoolExecutor(max_workers=BOOKINGS_CONCURRENCY) as pool:
+            for doctor_id, summary in zip(stale, pool.map(lambda doctor_id: upcoming_bookings(doctor_id, now_iso), stale)):
+                _BOOKINGS[doctor_id] = (now, summary)
+    return {doctor_id: _BOOKINGS[doctor_id][1] for doctor_id in doctor_ids}
+
+
+def parse_k(value: Any) -> int:
+    try:
+        k = int(value) if value not in (None, "") else DEFAULT_RANK_K
+    except (TypeError, ValueError) as exc:
+        raise ValueError("k must be an integer") from exc
+    if not 1 <= k <= MAX_RANK_K:
+        raise ValueError(f"k must be between 1 and {MAX_RANK_K}")
+    return k
+
+
 def lambda_handler(event: Dict[str, Any], _context: Any):
     forbidden = require_role(event, ["PATIENT", "DOCTOR"])
     if forbidden:
@@ -78,15 +169,21 @@ def lambda_handler(event: Dict[str, Any], _context: Any):
         },
     )
 
+    rank_mode = (params.get("sort") or "").strip().lower() == "rank"
+    if rank_mode:
+        try:
+            k = parse_k(params.get("k"))
+        except ValueError as exc:
+            return json_response({"message": str(exc)}, 400)
+
     try:
-        response = users_table.scan(FilterExpression=Attr("role").eq("DOCTOR"))
+        directory = load_directory() if rank_mode else scan_directory()
     except Exception as exc:  # pylint: disable=broad-except
         LOGGER.exception("users table scan failed")
         return json_response({"message": "unable to load doctors"}, 500)
 
     normalised: List[Dict[str, Any]] = []
-    for item in response.get("Items", []):
-        doctor = normalise_doctor(item)
+    for doctor in directory:
         profile = doctor["doctorProfile"]
         if specialty_filter and (profile.get("specialty") or "").strip().casefold() != specialty_filter.strip().casefold():
             continue
@@ -94,7 +191,18 @@ def lambda_handler(event: Dict[str, Any], _context: Any):
             continue
         # language_filter is always empty because languages have been removed
         normalised.append(doctor)
-    normalised.sort(key=lambda item: (item["doctorProfile"].get("city") or "", item.get("lastName") or ""))
 
-    LOGGER.info("doctors loaded", extra={"count": len(normalised)})
+    if rank_mode:
+        now = datetime.now(timezone.utc)
+        now_iso = now.replace(microsecond=0).isoformat().replace("+00:00", "Z")
+        try:
+            # A cached summary may hold slots that are now past; rank_doctors
+            # only counts slots after now, so that does not skew the ranking.
+            bookings = load_bookings([doctor["userId"] for doctor in normalised], now_iso)
+        except Exception:  # pylint: disable=broad-except
+            LOGGER.exception("doctor bookings lookup failed")
+            return json_response({"message": "unable to rank doctors"}, 500)
+        normalised = rank_doctors(normalised, bookings, now.timestamp(), city=location_filter, k=k)
+
+    LOGGER.info("doctors loaded", extra={"count": len(normalised), "ranked": rank_mode})
     return json_response({"items": normalised}, 200)
@@ -0,0 +1,268 @@
+"""Versioned schema and codecs for appointment events.
+
+The bus keeps receiving JSON (EventBridge rules match on it), tagged with a
+schema version ``v``. The lake can additionally store events in a compact
+binary form: field names are replaced by their position in the registered
+schema, enums by a one-byte code and timestamps by a varint of microseconds
+since the epoch, in the spirit of MessagePack. A timestamp is packed only when
+it is already in the form decoding produces, so every value round-trips
+exactly. Everything that reads the lake goes through :func:`decode_any`,
+which accepts both forms.
+
+Binary layout::
+
+    MAGIC (2 bytes) | version (1 byte) | presence bitmap (varint)
+    | one tagged value per present field, in schema order
+    | optional trailing JSON object for fields unknown to the schema
+
+This module only uses the standard library.
+"""
+from __future__ import annotations
+
+import json
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional, Tuple
+
+MAGIC = b"\xa7E"
+SCHEMA_VERSION = 3
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_NAIVE_EPOCH = datetime(1970, 1, 1)
+
+# (name, kind, enum values). Kinds: "str", "enum", "json", "ts" (naive UTC
+# ISO, as written by emit_event) and "slot" (ISO with a trailing Z).
+EVENT_TYPES = ("BOOKED", "CONFIRMED", "DECLINED", "CANCELLED")
+STATUSES = ("PENDING", "CONFIRMED", "DECLINED", "CANCELLED", "DELETED")
+SCHEMAS: Dict[int, Tuple[Tuple[str, str, Tuple[str, ...]], ...]] = {
+    # v1: the original unversioned JSON detail.
+    1: (
+        ("eventType", "enum", EVENT_TYPES),
+        ("appointmentId", "str", ()),
+        ("patientId", "str", ()),
+        ("doctorId", "str", ()),
+        ("slotISO", "slot", ()),
+        ("status", "enum", STATUSES),
+        ("reasonCode", "str", ()),
+        ("recommendedSpecialty", "str", ()),
+        ("ts", "ts", ()),
+    ),
+    # v2: adds the denormalised doctor specialty and city.
+    2: (
+        ("eventType", "enum", EVENT_TYPES),
+        ("appointmentId", "str", ()),
+        ("patientId", "str", ()),
+        ("doctorId", "str", ()),
+        ("slotISO", "slot", ()),
+        ("status", "enum", STATUSES),
+        ("reasonCode", "str", ()),
+        ("recommendedSpecialty", "str", ()),
+        ("specialty", "str", ()),
+        ("city", "str", ()),
+        ("ts", "ts", ()),
+    ),
+    # v3: adds vitals anomalies flagged at booking (a list, stored as JSON).
+    3: (
+        ("eventType", "enum", EVENT_TYPES),
+        ("appointmentId", "str", ()),
+        ("patientId", "str", ()),
+        ("doctorId", "str", ()),
+        ("slotISO", "slot", ()),
+        ("status", "enum", STATUSES),
+        ("reasonCode", "str", ()),
+        ("recommendedSpecialty", "str", ()),
+        ("specialty", "str", ()),
+        ("city", "str", ()),
+        ("ts", "ts", ()),
+        ("anomalies", "json", ()),
+    ),
+}
+
+# Value tags.
+_T_STR = 0
+_T_ENUM = 1
+_T_TIME = 2
+_T_INT = 3
+_T_FLOAT = 4
+_T_TRUE = 5
+_T_FALSE = 6
+_T_JSON = 7
+
+
+def build_detail(event_type: str, appointment: Dict[str, Any], ts: str) -> Dict[str, Any]:
+    """Assemble the current-version event detail from an appointment item."""
+    profile = appointment.get("doctorProfile") or {}
+    if not isinstance(profile, dict):
+        profile = {}
+    return {
+        "v": SCHEMA_VERSION,
+        "eventType": event_type,
+        "appointmentId": appointment.get("appointmentId"),
+        "patientId": appointment.get("patientId"),
+        "doctorId": appointment.get("doctorId"),
+        "slotISO": appointment.get("slotISO"),
+        "status": appointment.get("status"),
+        "reasonCode": appointment.get("reasonCode"),
+        "recommendedSpecialty": appointment.get("recommendedSpecialty"),
+        # Denormalised so lake queries can group by specialty/city without a
+        # join against the Users table. Only BOOKED events carry a profile.
+        "specialty": profile.get("specialty"),
+        "city": profile.get("city"),
+        "ts": ts,
+        "anomalies": appointment.get("anomalies") or None,
+    }
+
+
+def _write_varint(out: bytearray, value: int) -> None:
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(data: bytes, pos: int) -> Tuple[int, int]:
+    result = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+
+
+def _zigzag(value: int) -> int:
+    return (value << 1) ^ (value >> 63)
+
+
+def _unzigzag(value: int) -> int:
+    return (value >> 1) ^ -(value & 1)
+
+
+def _time_micros(value: str) -> Optional[int]:
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    delta = parsed - _EPOCH
+    return (delta.days * 86_400 + delta.seconds) * 1_000_000 + delta.microseconds
+
+
+def _format_time(micros: int, kind: str) -> str:
+    text = (_NAIVE_EPOCH + timedelta(microseconds=micros)).isoformat()
+    return text + "Z" if kind == "slot" else text
+
+
+def _write_str(out: bytearray, tag: int, value: str) -> None:
+    raw = value.encode("utf-8")
+    out.append(tag)
+    _write_varint(out, len(raw))
+    out += raw
+
+
+def _encode_value(out: bytearray, value: Any, kind: str, choices: Tuple[str, ...]) -> None:
+    if value is True or value is False:
+        out.append(_T_TRUE if value else _T_FALSE)
+    elif isinstance(value, int):
+        out.append(_T_INT)
+        _write_varint(out, _zigzag(value))
+    elif isinstance(value, float):
+        _write_str(out, _T_FLOAT, repr(value))
+    elif isinstance(value, str):
+        if kind == "enum" and value in choices:
+            out.append(_T_ENUM)
+            out.append(choices.index(value))
+            return
+        if kind in ("ts", "slot"):
+            micros = _time_micros(value)
+            # Only the canonical form is packed; anything else (".000Z",
+            # offsets, a "Z" on a ts) is kept as written so decode returns it unchanged.
+            if micros is not None and _format_time(micros, kind) == value:
+                out.append(_T_TIME)
+                _write_varint(out, _zigzag(micros))
+                return
+        _write_str(out, _T_STR, value)
+    else:
+        _write_str(out, _T_JSON, json.dumps(value, default=str))
+
+
+def encode(detail: Dict[str, Any], version: int = SCHEMA_VERSION) -> bytes:
+    """Encode an event detail as a binary record of the given schema version."""
+    schema = SCHEMAS[version]
+    out = bytearray(MAGIC)
+    out.append(version)
+    bitmap = 0
+    body = bytearray()
+    for index, (name, kind, choices) in enumerate(schema):
+        value = detail.get(name)
+        if value is None:
+            continue
+        bitmap |= 1 << index
+        _encode_value(body, value, kind, choices)
+    _write_varint(out, bitmap)
+    out += body
+    known = {name for name, _kind, _choices in schema}
+    extras = {key: value for key, value in detail.items() if key not in known and key != "v"}
+    if extras:
+        _write_str(out, _T_JSON, json.dumps(extras, default=str, separators=(",", ":")))
+    return bytes(out)
+
+
+def decode(data: bytes) -> Dict[str, Any]:
+    """Decode a binary record produced by :func:`encode`."""
+    if data[:2] != MAGIC:
+        raise ValueError("not a binary appointment event")
+    version = data[2]
+    schema = SCHEMAS.get(version)
+    if schema is None:
+        raise ValueError(f"unknown event schema version {version}")
+    bitmap, pos = _read_varint(data, 3)
+    detail: Dict[str, Any] = {"v": version}
+    for name, kind, choices in schema:
+        if not bitmap & 1:
+            detail[name] = None
+            bitmap >>= 1
+            continue
+        bitmap >>= 1
+        tag = data[pos]
+        pos += 1
+        if tag == _T_ENUM:
+            detail[name] = choices[data[pos]]
+            pos += 1
+        elif tag == _T_TIME:
+            micros, pos = _read_varint(data, pos)
+            detail[name] = _format_time(_unzigzag(micros), kind)
+        elif tag == _T_INT:
+            raw, pos = _read_varint(data, pos)
+            detail[name] = _unzigzag(raw)
+        elif tag == _T_TRUE or tag == _T_FALSE:
+            detail[name] = tag == _T_TRUE
+        else:
+            length, pos = _read_varint(data, pos)
+            text = data[pos:pos + length].decode("utf-8")
+            pos += length
+            if tag == _T_FLOAT:
+                detail[name] = float(text)
+            elif tag == _T_JSON:
+                detail[name] = json.loads(text)
+            else:
+                detail[name] = text
+    if pos < len(data) and data[pos] == _T_JSON:
+        length, pos = _read_varint(data, pos + 1)
+        detail.update(json.loads(data[pos:pos + length]))
+    return detail
+
+
+def encode_json(detail: Dict[str, Any]) -> bytes:
+    return json.dumps(detail, separators=(",", ":")).encode("utf-8")
+
+
+def decode_any(data: bytes) -> Dict[str, Any]:
+    """Decode a lake object in either encoding; legacy JSON without ``v`` is v1."""
+    if data[:2] == MAGIC:
+        return decode(data)
+    detail = json.loads(data)
+    detail.setdefault("v", 1)
+    return detail
@@ -0,0 +1,91 @@
+"""Key layout for the appointments event lake.
+
+Shared by the S3 writer Lambda and the offline lake tools in ``scripts/`` so
+both sides agree on where an event lives. This module only uses the standard
+library so it can be imported without AWS credentials or table names.
+"""
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+DOMAIN_PREFIX = "domain=appointments/"
+INDEX_NAME = "_partitions.json"
+GRANULARITIES = ("day", "hour")
+
+
+def parse_event_time(value: Any) -> Optional[datetime]:
+    """Parse an ISO timestamp; naive values (``datetime.utcnow()``) are UTC."""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc)
+
+
+def event_time(detail: Dict[str, Any], envelope_time: Any = None) -> datetime:
+    """Event time of an appointment event.
+
+    Prefers ``detail.ts`` (set by ``emit_event``), then the EventBridge envelope
+    ``time``, and only falls back to the wall clock when neither parses.
+    """
+    return (
+        parse_event_time(detail.get("ts"))
+        or parse_event_time(envelope_time)
+        or datetime.now(timezone.utc)
+    )
+
+
+def day_prefix(day: str) -> str:
+    return f"{DOMAIN_PREFIX}dt={day}/"
+
+
+def hour_prefix(day: str, hour: int) -> str:
+    return f"{day_prefix(day)}hr={hour:02d}/"
+
+
+def partition_prefix(moment: datetime, granularity: str = "hour") -> str:
+    day = moment.strftime("%Y-%m-%d")
+    if granularity == "day":
+        return day_prefix(day)
+    return hour_prefix(day, moment.hour)
+
+
+def index_key(day: str) -> str:
+    return day_prefix(day) + INDEX_NAME
+
+
+def parse_partition(key: str) -> Tuple[Optional[str], Optional[int]]:
+    """Return ``(day, hour)`` for an object key; hour is None for day partitions."""
+    day: Optional[str] = None
+    hour: Optional[int] = None
+    for segment in key.split("/"):
+        if segment.startswith("dt="):
+            day = segment[3:]
+        elif segment.startswith("hr="):
+            try:
+                hour = int(segment[3:])
+            except ValueError:
+                hour = None
+    return day, hour
+
+
+def iter_hours(start: datetime, end: datetime) -> Iterator[Tuple[str, int]]:
+    """Yield ``(day, hour)`` for every hour overlapping ``[start, end]``."""
+    current = start.astimezone(timezone.utc).replace(minute=0, second=0, microsecond=0)
+    last = end.astimezone(timezone.utc)
+    while current <= last:
+        yield current.strftime("%Y-%m-%d"), current.hour
+        current += timedelta(hours=1)
+
+
+def iter_days(start: datetime, end: datetime) -> Iterator[str]:
+    current = start.astimezone(timezone.utc).date()
+    last = end.astimezone(timezone.utc).date()
+    while current <= last:
+        yield current.isoformat()
+        current += timedelta(days=1)
@@ -1,28 +1,103 @@
 from __future__ import annotations
 
 import json
+import logging
 import os
+import sys
 import uuid
-from datetime import datetime, timezone
-from typing import Any, Dict
+from typing import Any, Dict, Optional, Set, Tuple
 
 import boto3
+from botocore.exceptions import ClientError
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PARENT_DIR = os.path.abspath(os.path.join(CURRENT_DIR, os.pardir))
+if PARENT_DIR not in sys.path:
+    sys.path.append(PARENT_DIR)
+
+from event_codec import encode, encode_json  # noqa: E402
+from event_lake import GRANULARITIES, event_time, index_key, partition_prefix  # noqa: E402
+
+LOGGER = logging.getLogger(__name__)
 
 s3_client = boto3.client("s3")
 BUCKET_NAME = os.environ["CURATED_BUCKET_NAME"]
+PARTITION_GRANULARITY = os.environ.get("LAKE_PARTITION_GRANULARITY", "hour")
+if PARTITION_GRANULARITY not in GRANULARITIES:
+    PARTITION_GRANULARITY = "hour"
+# "binary" stores the compact event_codec encoding; readers accept both.
+LAKE_ENCODING = os.environ.get("LAKE_ENCODING", "json")
+
+# Partitions this container has already recorded in the per-day index, so a
+# warm container only touches the index the first time it sees an hour.
+_INDEXED_PARTITIONS: Set[Tuple[str, int]] = set()
+INDEX_UPDATE_ATTEMPTS = 5
+
+
+def _read_index(day: str) -> Tuple[Dict[str, Any], Optional[str]]:
+    try:
+        response = s3_client.get_object(Bucket=BUCKET_NAME, Key=index_key(day))
+    except ClientError as exc:
+        if exc.response.get("Error", {}).get("Code") in ("NoSuchKey", "404"):
+            return {"day": day, "hours": []}, None
+        raise
+    return json.loads(response["Body"].read()), response.get("ETag")
+
+
+def record_partition(day: str, hour: int) -> None:
+    """Add ``hour`` to the day's partition index using a conditional write.
+
+    Concurrent writers race on the same object, so the update is an
+    optimistic read-modify-write guarded by ``If-Match`` / ``If-None-Match``.
+    """
+    if (day, hour) in _INDEXED_PARTITIONS:
+        return
+    for _attempt in range(INDEX_UPDATE_ATTEMPTS):
+        index, etag = _read_index(day)
+        hours = set(index.get("hours") or [])
+        if hour in hours:
+            _INDEXED_PARTITIONS.add((day, hour))
+            return
+        hours.add(hour)
+        body = json.dumps({"day": day, "hours": sorted(hours)})
+        condition = {"IfMatch": etag} if etag else {"IfNoneMatch": "*"}
+        try:
+            s3_client.put_object(
+                Bucket=BUCKET_NAME,
+                Key=index_key(day),
+                Body=body.encode("utf-8"),
+                ContentType="application/json",
+                **condition,
+            )
+        except ClientError as exc:
+            code = exc.response.get("Error", {}).get("Code")
+            if code in ("PreconditionFailed", "ConditionalRequestConflict"):
+                continue
+            raise
+        _INDEXED_PARTITIONS.add((day, hour))
+        return
+    raise RuntimeError(f"gave up updating partition index for {day} hour {hour}")
 
 
 def lambda_handler(event: Dict[str, Any], _context: Any):
     records = event.get("Records") or [event]
     for record in records:
         detail = record.get("detail") or {}
-        timestamp = datetime.now(timezone.utc)
-        date_partition = timestamp.strftime("%Y-%m-%d")
+        moment = event_time(detail, record.get("time"))
+        if LAKE_ENCODING == "binary":
+            body, extension, content_type = encode(detail), "evt", "application/octet-stream"
+        else:
+            body, extension, content_type = encode_json(detail), "json", "application/json"
+        # Readers only list indexed hours, so the hour is indexed before the
+        # object is written. Failures propagate and EventBridge retries; the
+        # key is derived from the event id, so a retry overwrites the object.
+        if PARTITION_GRANULARITY == "hour":
+            record_partition(moment.strftime("%Y-%m-%d"), moment.hour)
+        object_id = (record.get("id") or uuid.uuid4().hex).replace("-", "")
         key = (
-            f"domain=appointments/dt={date_partition}/"
-            f"part=event-{timestamp.strftime('%H%M%S')}-{uuid.uuid4().hex}.json"
+            f"{partition_prefix(moment, PARTITION_GRANULARITY)}"
+            f"part=event-{moment.strftime('%H%M%S')}-{object_id}.{extension}"
         )
-        body = json.dumps(detail).encode("utf-8")
-        s3_client.put_object(Bucket=BUCKET_NAME, Key=key, Body=body)
+        s3_client.put_object(Bucket=BUCKET_NAME, Key=key, Body=body, ContentType=content_type)
 
     return {"written": len(records)}
@@ -0,0 +1,157 @@
+"""Incremental writers for health-history exports.
+
+Rows are serialised one page at a time and written through an export writer
+that holds at most one buffered part in memory, so the memory used does not
+depend on the size of the history. With ``EXPORT_BUCKET`` set the writer
+streams a multipart upload to S3 and the caller gets a pre-signed link.
+Otherwise (local runs, tests) it writes a file under ``EXPORT_DIR``.
+"""
+from __future__ import annotations
+
+import csv
+import io
+import json
+import os
+import tempfile
+from decimal import Decimal
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+import boto3
+
+# S3 requires every part but the last to be at least 5 MiB.
+PART_SIZE = 8 * 1024 * 1024
+URL_EXPIRY_SECONDS = 900
+EXPORT_FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+CSV_COLUMNS = ("recordId", "updatedAt", "reasonCode", "source", "city")
+
+_S3_CLIENT = None
+
+
+def _s3():
+    global _S3_CLIENT  # pylint: disable=global-statement
+    if _S3_CLIENT is None:
+        _S3_CLIENT = boto3.client("s3")
+    return _S3_CLIENT
+
+
+class S3ExportWriter:
+    """Multipart upload that flushes a part whenever ``part_size`` bytes are buffered."""
+
+    def __init__(self, bucket: str, key: str, content_type: str, part_size: int = PART_SIZE) -> None:
+        self.bucket = bucket
+        self.key = key
+        self.part_size = part_size
+        self.buffer = bytearray()
+        self.parts: List[Dict[str, Any]] = []
+        self.upload_id = _s3().create_multipart_upload(
+            Bucket=bucket, Key=key, ContentType=content_type, ServerSideEncryption="AES256"
+        )["UploadId"]
+
+    def write(self, data: bytes) -> None:
+        self.buffer += data
+        if len(self.buffer) >= self.part_size:
+            self._flush()
+
+    def _flush(self) -> None:
+        number = len(self.parts) + 1
+        response = _s3().upload_part(
+            Bucket=self.bucket, Key=self.key, UploadId=self.upload_id, PartNumber=number, Body=bytes(self.buffer)
+        )
+        self.parts.append({"ETag": response["ETag"], "PartNumber": number})
+        self.buffer.clear()
+
+    def close(self) -> str:
+        if self.buffer or not self.parts:
+            self._flush()
+        _s3().complete_multipart_upload(
+            Bucket=self.bucket, Key=self.key, UploadId=self.upload_id, MultipartUpload={"Parts": self.parts}
+        )
+        return _s3().generate_presigned_url(
+            "get_object", Params={"Bucket": self.bucket, "Key": self.key}, ExpiresIn=URL_EXPIRY_SECONDS
+        )
+
+    def abort(self) -> None:
+        _s3().abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id)
+
+
+class LocalExportWriter:
+    """Stand-in for S3 when no bucket is configured: a file on local disk."""
+
+    def __init__(self, directory: str, key: str) -> None:
+        self.path = os.path.join(directory, key)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.handle = open(self.path, "wb")  # pylint: disable=consider-using-with
+
+    def write(self, data: bytes) -> None:
+        self.handle.write(data)
+
+    def close(self) -> str:
+        self.handle.close()
+        return "file://" + os.path.abspath(self.path)
+
+    def abort(self) -> None:
+        self.handle.close()
+        os.remove(self.path)
+
+
+def open_export(key: str, export_format: str):
+    bucket = os.getenv("EXPORT_BUCKET")
+    if bucket:
+        return S3ExportWriter(bucket, key, EXPORT_FORMATS[export_format])
+    return LocalExportWriter(os.getenv("EXPORT_DIR") or tempfile.gettempdir(), key)
+
+
+def _plain(value: Any) -> Any:
+    if isinstance(value, Decimal):
+        return int(value) if value % 1 == 0 else float(value)
+    return value
+
+
+def serialise_pages(pages: Iterable[List[Dict[str, Any]]], export_format: str, metrics: List[str]) -> Iterator[bytes]:
+    """Yield one encoded chunk per page of records (NDJSON lines or CSV rows)."""
+    if export_format == "csv":
+        columns = list(CSV_COLUMNS) + metrics
+        text = io.StringIO()
+        writer = csv.writer(text)
+        writer.writerow(columns)
+        for page in pages:
+            for record in page:
+                values = record.get("metrics") or {}
+                writer.writerow(
+                    [_plain(record.get(column)) for column in CSV_COLUMNS]
+                    + [_plain(values.get(name)) for name in metrics]
+                )
+            yield text.getvalue().encode("utf-8")
+            text.seek(0)
+            text.truncate()
+        return
+    for page in pages:
+        yield "".join(
+            json.dumps({key: value for key, value in record.items() if key != "patientId"}, default=_plain) + "\n"
+            for record in page
+        ).encode("utf-8")
+
+
+def export_pages(
+    pages: Iterable[List[Dict[str, Any]]], key: str, export_format: str, metrics: List[str]
+) -> Dict[str, Optional[Any]]:
+    """Stream ``pages`` into a new export object; returns its link and size."""
+    writer = open_export(key, export_format)
+    size = 0
+    records = 0
+
+    def counted(source: Iterable[List[Dict[str, Any]]]) -> Iterator[List[Dict[str, Any]]]:
+        nonlocal records
+        for page in source:
+            records += len(page)
+            yield page
+
+    try:
+        for chunk in serialise_pages(counted(pages), export_format, metrics):
+            size += len(chunk)
+            writer.write(chunk)
+        url = writer.close()
+    except Exception:
+        writer.abort()
+        raise
+    return {"url": url, "bytes": size, "records": records}
@@ -0,0 +1,209 @@
+"""Hedged requests driven by a per-container latency histogram.
+
+The remote model's tail latency is far above its median. When a request has
+not answered within the latency the container has observed for 95% of
+requests, a second identical request is sent on another pooled connection.
+Whichever succeeds first is used, and the other connection is shut down. That
+is all it cancels: the model is stateless, so the extra request costs load
+and nothing else. Roughly one request in twenty is duplicated, and the tail
+drops to about p95 plus the median.
+
+:class:`LatencyHistogram` keeps log-spaced buckets, so a quantile costs one
+pass over ~50 counters. Counts are halved every ``decay_every`` samples, so
+the hedge delay follows the endpoint as it speeds up or slows down. Only
+first attempts are recorded, since they are the latency being hedged. When a
+hedge wins, the first attempt's elapsed time is recorded as a lower bound.
+"""
+from __future__ import annotations
+
+import math
+import socket
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Dict, List, Optional, Tuple
+
+from http_pool import STALE_ERRORS, ConnectionPool, PooledConnection, remaining
+
+HEDGE_QUANTILE = 0.95
+# No hedging until this many latencies have been seen.
+MIN_SAMPLES = 20
+MIN_HEDGE_DELAY_SECONDS = 0.005
+
+_EXECUTOR = ThreadPoolExecutor(max_workers=8, thread_name_prefix="hedge")
+
+
+class LatencyHistogram:
+    def __init__(self, smallest: float = 0.001, largest: float = 30.0, growth: float = 1.25, decay_every: int = 1000) -> None:
+        self.smallest = smallest
+        self.growth = growth
+        size = int(math.ceil(math.log(largest / smallest, growth))) + 1
+        self.edges = [smallest * growth**index for index in range(size)]
+        self.counts = [0.0] * size
+        self.total = 0.0
+        self.samples = 0
+        self.decay_every = decay_every
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        if seconds <= self.smallest:
+            index = 0
+        else:
+            index = min(int(math.ceil(math.log(seconds / self.smallest, self.growth))), len(self.counts) - 1)
+        with self._lock:
+            self.counts[index] += 1
+            self.total += 1
+            self.samples += 1
+            if self.samples % self.decay_every == 0:
+                self.counts = [count / 2 for count in self.counts]
+                self.total /= 2
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bucket edge below which a share ``q`` of latencies fall."""
+        with self._lock:
+            if not self.total:
+                return None
+            target = q * self.total
+            running = 0.0
+            for edge, count in zip(self.edges, self.counts):
+                running += count
+                if running >= target:
+                    return edge
+            return self.edges[-1]
+
+
+class _Attempt:
+    """One request on its own pooled connection, cancellable from another thread."""
+
+    def __init__(self, pool: ConnectionPool) -> None:
+        self.pool = pool
+        self.pooled: Optional[PooledConnection] = None
+        self.cancelled = False
+        self.started = time.monotonic()
+        self._lock = threading.Lock()
+
+    def run(self, method: str, body: Optional[bytes], headers: Dict[str, str], timeout: float) -> Tuple[int, bytes]:
+        # Same stale-connection retry as ConnectionPool.request: a reused
+        # connection the server closed gets one more try on a fresh one,
+        # within what is left of ``timeout``.
+        deadline = time.monotonic() + timeout
+        retried = False
+        while True:
+            pooled, reused = self.pool.acquire(remaining(deadline))
+            with self._lock:
+                if self.cancelled:
+                    self.pool.release(pooled, reusable=True)
+                    raise ConnectionAbortedError("hedge cancelled")
+                self.pooled = pooled
+            try:
+                status, payload, reusable = self.pool.exchange(pooled, method, body, headers, deadline=deadline)
+            except STALE_ERRORS:
+                self._finish(pooled, reusable=False)
+                if not reused or retried or self.cancelled:
+                    raise
+                self.pool.record_stale()
+                retried = True
+                continue
+            except BaseException:
+                self._finish(pooled, reusable=False)
+                raise
+            self._finish(pooled, reusable)
+            return status, payload
+
+    def _finish(self, pooled: PooledConnection, reusable: bool) -> None:
+        # Claim the connection back before releasing it: once it is in the
+        # pool another request may take it, and cancel() must not shut it down.
+        with self._lock:
+            self.pooled = None
+            # A cancel() that got in first may have shut the socket down.
+            reusable = reusable and not self.cancelled
+        self.pool.release(pooled, reusable=reusable)
+
+    def cancel(self) -> None:
+        with self._lock:
+            self.cancelled = True
+            sock = self.pooled.connection.sock if self.pooled is not None else None
+        if sock is not None:
+            try:
+                # Wakes the blocked read; run() then discards the connection.
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+
+class HedgedClient:
+    def __init__(self, pool: ConnectionPool, histogram: Optional[LatencyHistogram] = None) -> None:
+        self.pool = pool
+        self.histogram = histogram or LatencyHistogram()
+        self.stats = {"requests": 0, "hedged": 0, "hedgeWins": 0}
+
+    def hedge_delay(self) -> Optional[float]:
+        if self.histogram.samples < MIN_SAMPLES:
+            return None
+        delay = self.histogram.quantile(HEDGE_QUANTILE)
+        return None if delay is None else max(delay, MIN_HEDGE_DELAY_SECONDS)
+
+    def request(
+        self, method: str, body: Optional[bytes] = None, headers: Optional[Dict[str, str]] = None, timeout: float = 5.0
+    ) -> Tuple[int, bytes]:
+        """Like :meth:`ConnectionPool.request`, hedged after the observed p95.
+
+        ``timeout`` bounds the whole call, including the hedge. A response with
+        status 5xx counts as a failure when deciding which attempt wins.
+        """
+        headers = headers or {}
+        deadline = time.monotonic() + timeout
+        self.stats["requests"] += 1
+        attempts: List[_Attempt] = []
+        futures: Dict[Future, _Attempt] = {}
+
+        def launch() -> None:
+            attempt = _Attempt(self.pool)
+            attempts.append(attempt)
+            remaining = max(deadline - time.monotonic(), 0.001)
+            futures[_EXECUTOR.submit(attempt.run, method, body, headers, remaining)] = attempt
+
+        launch()
+        delay = self.hedge_delay()
+        if delay is not None and delay < timeout / 2:
+            done, _ = wait(futures, timeout=delay)
+            if not done:
+                self.stats["hedged"] += 1
+                launch()
+
+        error: Optional[BaseException] = None
+        fallback: Optional[Tuple[int, bytes]] = None
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, timeout=max(deadline - time.monotonic(), 0), return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                attempt = futures[future]
+                try:
+                    result = future.result()
+                except BaseException as exc:  # pylint: disable=broad-except
+                    if not attempt.cancelled:
+                        error = exc
+                    continue
+                if attempt is attempts[0]:
+                    self.histogram.record(time.monotonic() - attempt.started)
+                if result[0] >= 500 and pending:
+                    fallback = result
+                    continue
+                if attempt is not attempts[0]:
+                    # The first attempt took at least this long; recording the
+                    # lower bound keeps slow periods visible to the histogram.
+                    self.histogram.record(time.monotonic() - attempts[0].started)
+                    self.stats["hedgeWins"] += 1
+                for other in attempts:
+                    if other is not attempt:
+                        other.cancel()
+                return result
+        for attempt in attempts:
+            attempt.cancel()
+        if fallback is not None:
+            return fallback
+        if error is not None:
+            raise error
+        raise TimeoutError("model request timed out")
@@ -0,0 +1,217 @@
+"""Keep-alive HTTP(S) connection pool for calls from warm Lambda containers.
+
+``urllib.request.urlopen`` opens a new connection per call, paying DNS, TCP
+and TLS setup every time. A pool created at module level survives across
+invocations of a warm container, so after the first call requests reuse an
+established connection.
+
+Idle connections can be closed by the server (or a NAT) between invocations.
+Before reuse, a connection is health-checked: if it has been idle longer
+than ``max_idle`` or its socket is readable (which on an idle keep-alive
+connection means EOF or stray data), it is dropped and a new one is opened.
+A request that fails on a reused connection is retried once on a fresh one.
+``timeout`` is one budget per request: the retry gets only what the first
+try left over, not a fresh timeout.
+"""
+from __future__ import annotations
+
+import http.client
+import select
+import socket
+import ssl
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+# Errors that mean "the server closed this keep-alive connection".
+STALE_ERRORS = (
+    http.client.RemoteDisconnected,
+    http.client.CannotSendRequest,
+    http.client.BadStatusLine,
+    BrokenPipeError,
+    ConnectionResetError,
+    ConnectionAbortedError,
+)
+
+
+def remaining(deadline: float) -> float:
+    """Seconds left before ``deadline`` (monotonic); TimeoutError once it has passed."""
+    left = deadline - time.monotonic()
+    if left <= 0:
+        raise TimeoutError("request deadline exceeded")
+    return left
+
+
+class PooledConnection:
+    __slots__ = ("connection", "created", "last_used", "requests")
+
+    def __init__(self, connection: http.client.HTTPConnection) -> None:
+        self.connection = connection
+        self.created = time.monotonic()
+        self.last_used = self.created
+        self.requests = 0
+
+
+class ConnectionPool:
+    """Thread-safe LIFO pool of persistent connections to one origin."""
+
+    def __init__(self, url: str, size: int = 4, timeout: float = 5.0, max_idle: float = 50.0) -> None:
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https"):
+            raise ValueError(f"unsupported URL scheme: {parts.scheme}")
+        self.scheme = parts.scheme
+        self.host = parts.hostname or ""
+        self.port = parts.port or (443 if parts.scheme == "https" else 80)
+        self.path = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        self.size = size
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.ssl_context = ssl.create_default_context() if parts.scheme == "https" else None
+        self._idle: List[PooledConnection] = []
+        self._lock = threading.Lock()
+        self.stats = {"opened": 0, "reused": 0, "stale": 0}
+
+    def _open(self, timeout: Optional[float] = None) -> PooledConnection:
+        timeout = self.timeout if timeout is None else timeout
+        if self.scheme == "https":
+            connection: http.client.HTTPConnection = http.client.HTTPSConnection(
+                self.host, self.port, timeout=timeout, context=self.ssl_context
+            )
+        else:
+            connection = http.client.HTTPConnection(self.host, self.port, timeout=timeout)
+        connection.connect()
+        # Small request/response pairs on a long-lived socket must not wait
+        # on Nagle's algorithm.
+        connection.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        with self._lock:
+            self.stats["opened"] += 1
+        return PooledConnection(connection)
+
+    def _healthy(self, pooled: PooledConnection) -> bool:
+        if time.monotonic() - pooled.last_used > self.max_idle:
+            return False
+        sock = pooled.connection.sock
+        if sock is None:
+            return False
+        try:
+            readable, _, _ = select.select([sock], [], [], 0)
+        except (OSError, ValueError):
+            return False
+        return not readable
+
+    def acquire(self, timeout: Optional[float] = None) -> Tuple[PooledConnection, bool]:
+        """An idle healthy connection (reused=True) or a new one."""
+        while True:
+            with self._lock:
+                pooled = self._idle.pop() if self._idle else None
+            if pooled is None:
+                return self._open(timeout), False
+            if self._healthy(pooled):
+                with self._lock:
+                    self.stats["reused"] += 1
+                return pooled, True
+            with self._lock:
+                self.stats["stale"] += 1
+            pooled.connection.close()
+
+    def release(self, pooled: PooledConnection, reusable: bool = True) -> None:
+        pooled.last_used = time.monotonic()
+        with self._lock:
+            if reusable and len(self._idle) < self.size:
+                self._idle.append(pooled)
+                return
+        pooled.connection.close()
+
+    def health_check(self) -> int:
+        """Drop idle connections that went stale; returns how many remain."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        healthy = []
+        for pooled in idle:
+            if self._healthy(pooled):
+                healthy.append(pooled)
+            else:
+                pooled.connection.close()
+        with self._lock:
+            self._idle.extend(healthy)
+            return len(self._idle)
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for pooled in idle:
+            pooled.connection.close()
+
+    def record_stale(self) -> None:
+        """Count a request that failed on a reused connection the server had closed."""
+        with self._lock:
+            self.stats["stale"] += 1
+
+    def exchange(
+        self,
+        pooled: PooledConnection,
+        method: str,
+        body: Optional[bytes] = None,
+        headers: Optional[Dict[str, str]] = None,
+        timeout: Optional[float] = None,
+        deadline: Optional[float] = None,
+    ) -> Tuple[int, bytes, bool]:
+        """One exchange on an acquired connection, which the caller still owns.
+
+        With a ``deadline`` (monotonic), the time left until it replaces
+        ``timeout``. Returns ``(status, body, reusable)``; the caller must
+        :meth:`release` the connection, with ``reusable=False`` if this raised.
+        """
+        if deadline is not None:
+            timeout = remaining(deadline)
+        connection = pooled.connection
+        if connection.sock is not None:
+            connection.sock.settimeout(self.timeout if timeout is None else timeout)
+        connection.request(method, self.path, body=body, headers=headers or {})
+        response = connection.getresponse()
+        payload = response.read()
+        pooled.requests += 1
+        return response.status, payload, not response.will_close
+
+    def send(
+        self,
+        pooled: PooledConnection,
+        method: str,
+        body: Optional[bytes] = None,
+        headers: Optional[Dict[str, str]] = None,
+        timeout: Optional[float] = None,
+        deadline: Optional[float] = None,
+    ) -> Tuple[int, bytes]:
+        """One exchange on an acquired connection, which is then released."""
+        try:
+            status, payload, reusable = self.exchange(pooled, method, body, headers, timeout, deadline)
+        except BaseException:
+            self.release(pooled, reusable=False)
+            raise
+        self.release(pooled, reusable=reusable)
+        return status, payload
+
+    def request(
+        self,
+        method: str,
+        body: Optional[bytes] = None,
+        headers: Optional[Dict[str, str]] = None,
+        timeout: Optional[float] = None,
+    ) -> Tuple[int, bytes]:
+        """Send a request to the pool's URL; returns ``(status, body)``.
+
+        ``timeout`` bounds the whole call, including a stale-connection retry.
+        """
+        deadline = time.monotonic() + (self.timeout if timeout is None else timeout)
+        pooled, reused = self.acquire(remaining(deadline))
+        try:
+            return self.send(pooled, method, body, headers, deadline=deadline)
+        except STALE_ERRORS:
+            # Only a reused connection can be stale; a fresh one failing is
+            # a real error.
+            if not reused:
+                raise
+            self.record_stale()
+        pooled, _ = self.acquire(remaining(deadline))
+        return self.send(pooled, method, body, headers, deadline=deadline)
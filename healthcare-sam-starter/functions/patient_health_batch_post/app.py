@@ -0,0 +1,169 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PARENT_DIR = os.path.abspath(os.path.join(CURRENT_DIR, os.pardir))
+if PARENT_DIR not in sys.path:
+    sys.path.append(PARENT_DIR)
+
+from common import (  # noqa: E402
+    advance_latest_health_record,
+    batch_put_items,
+    extend_vitals_series,
+    generate_ulid,
+    get_claim,
+    health_index_table,
+    json_response,
+    require_role,
+    update_vitals_rollup,
+    vitals_series_enabled,
+)
+from vitals_schema import compile_vitals_schema  # noqa: E402
+
+
+LOGGER = logging.getLogger(__name__)
+
+MAX_BATCH_READINGS = 500
+MAX_CLOCK_SKEW = timedelta(minutes=5)
+# Record ids are ULIDs, whose time part is 48 bits of Unix epoch milliseconds.
+ULID_MILLIS_LIMIT = 1 << 48
+
+validate_vitals = compile_vitals_schema()
+
+
+def parse_measured_at(value: Any, now: datetime) -> datetime:
+    if not isinstance(value, str):
+        raise ValueError("measuredAt must be an ISO-8601 timestamp")
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError as exc:
+        raise ValueError("measuredAt must be an ISO-8601 timestamp") from exc
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    parsed = parsed.astimezone(timezone.utc)
+    if parsed > now + MAX_CLOCK_SKEW:
+        raise ValueError("measuredAt is in the future")
+    if not 0 <= int(parsed.timestamp() * 1000) < ULID_MILLIS_LIMIT:
+        raise ValueError("measuredAt must not be before 1970-01-01T00:00:00Z")
+    return parsed
+
+
+def reading_digest(patient_id: str, entry: Dict[str, Any]) -> bytes:
+    """Stable bytes identifying one reading of one patient."""
+    payload = json.dumps(
+        [patient_id, entry["measuredAt"].isoformat(), entry["plain"]], sort_keys=True, separators=(",", ":"), default=str
+    )
+    return hashlib.sha256(payload.encode("utf-8")).digest()
+
+
+def lambda_handler(event: Dict[str, Any], _context: Any):
+    forbidden = require_role(event, ["PATIENT"])
+    if forbidden:
+        return forbidden
+
+    patient_id = get_claim(event, "email")
+    if not patient_id:
+        # Demo mode: use default patient ID
+        patient_id = "patient.demo@example.com"
+
+    path_patient = (event.get("pathParameters") or {}).get("patientId")
+    if not path_patient or path_patient != patient_id:
+        return json_response({"message": "forbidden"}, 403)
+
+    try:
+        body = json.loads(event.get("body") or "{}")
+    except json.JSONDecodeError:
+        return json_response({"message": "body must be JSON"}, 400)
+    readings = body.get("readings") if isinstance(body, dict) else None
+    if not isinstance(readings, list) or not readings:
+        return json_response({"message": "readings must be a non-empty array"}, 400)
+    if len(readings) > MAX_BATCH_READINGS:
+        return json_response({"message": f"at most {MAX_BATCH_READINGS} readings per batch"}, 400)
+
+    # Validate everything before writing anything, so an invalid batch stores
+    # nothing. Writes are not atomic: a 500 can follow a partial write. Record
+    # ids are derived from the reading itself, the rollup skips record ids it
+    # has already folded in and series chunks drop duplicate timestamps, so
+    # resending the same batch overwrites instead of duplicating.
+    now = datetime.now(timezone.utc)
+    parsed: List[Dict[str, Any]] = []
+    errors: List[Dict[str, Any]] = []
+    for index, reading in enumerate(readings):
+        try:
+            if not isinstance(reading, dict):
+                raise ValueError("reading must be an object")
+            measured_at = parse_measured_at(reading.get("measuredAt"), now)
+            plain, stored = validate_vitals(reading.get("vitals"))
+        except ValueError as exc:
+            errors.append({"index": index, "message": str(exc)})
+            continue
+        parsed.append({"measuredAt": measured_at, "plain": plain, "stored": stored})
+    if errors:
+        return json_response({"message": "invalid readings", "errors": errors[:50]}, 400)
+
+    parsed.sort(key=lambda entry: entry["measuredAt"])
+    records = []
+    for entry in parsed:
+        measured_at = entry["measuredAt"]
+        records.append({
+            "patientId": patient_id,
+            # ULID at the measurement time keeps history in time order; its
+            # random part is a hash of the reading, so a resend maps to the same id.
+            "recordId": generate_ulid(int(measured_at.timestamp() * 1000), reading_digest(patient_id, entry)),
+            "updatedAt": measured_at.replace(tzinfo=None).isoformat(),
+            "reasonCode": "GENERAL",
+            "source": "BATCH",
+            "metrics": entry["stored"],
+        })
+
+    try:
+        batch_put_items(health_index_table, records)
+    except Exception:  # pylint: disable=broad-except
+        LOGGER.exception("failed to store vitals batch")
+        return json_response({"message": "unable to store vitals"}, 500)
+
+    try:
+        advance_latest_health_record(patient_id, records[-1])
+    except Exception:  # pylint: disable=broad-except
+        LOGGER.exception("failed to update latest health record")
+
+    anomalies: List[Dict[str, Any]] = []
+    try:
+        anomalies = update_vitals_rollup(
+            patient_id,
+            [(record["recordId"], record["updatedAt"], entry["plain"]) for record, entry in zip(records, parsed)],
+        )
+    except Exception:  # pylint: disable=broad-except
+        LOGGER.exception("failed to update vitals rollup")
+
+    if vitals_series_enabled():
+        try:
+            extend_vitals_series(patient_id, [(entry["measuredAt"], entry["plain"]) for entry in parsed])
+        except Exception:  # pylint: disable=broad-except
+            LOGGER.exception("failed to extend packed vitals series")
+
+    LOGGER.info(
+        "vitals batch stored",
+        extra={
+            "requestId": event.get("requestContext", {}).get("requestId"),
+            "patientId": patient_id,
+            "count": len(records),
+            "anomalies": len(anomalies),
+        },
+    )
+
+    return json_response(
+        {
+            "stored": len(records),
+            "recordIds": [record["recordId"] for record in records],
+            "anomalies": anomalies,
+        },
+        201,
+    )
@@ -1,10 +1,15 @@
 from __future__ import annotations
 
+import base64
+import json
 import logging
 import os
 import sys
-from typing import Any, Dict
+from datetime import datetime, timezone
+from decimal import Decimal
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 
+import numpy as np
 from boto3.dynamodb.conditions import Key
 
 CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -12,35 +17,390 @@ PARENT_DIR = os.path.abspath(os.path.join(CURRENT_DIR, os.pardir))
 if PARENT_DIR not in sys.path:
     sys.path.append(PARENT_DIR)
 
-from common import get_claim, health_index_table, json_response, require_role  # noqa: E402
+from common import (  # noqa: E402
+    HISTORY_RECORD_ID_LIMIT,
+    SERIES_FIELDS,
+    SERIES_RECORD_PREFIX,
+    appointments_table,
+    generate_ulid,
+    get_claim,
+    get_groups,
+    health_index_table,
+    is_demo_mode,
+    json_response,
+    require_role,
+    series_record_id,
+    ulid_bound,
+    unpack_vitals_series,
+)
+from health_export import EXPORT_FORMATS, URL_EXPIRY_SECONDS, export_pages  # noqa: E402
 
 
 LOGGER = logging.getLogger(__name__)
 
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+RESOLUTIONS = ("day", "week", "month")
+SOURCES = ("records", "series")
+EXPORT_PAGE_SIZE = 1000
+DOCTOR_EXPORT_STATUSES = {"PENDING", "CONFIRMED"}
+
+
+def parse_time(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+def encode_cursor(last_key: Optional[Dict[str, Any]]) -> Optional[str]:
+    if not last_key:
+        return None
+    return base64.urlsafe_b64encode(json.dumps(last_key).encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: Optional[str], patient_id: str) -> Optional[Dict[str, Any]]:
+    if not cursor:
+        return None
+    padding = "=" * (-len(cursor) % 4)
+    key = json.loads(base64.urlsafe_b64decode(cursor + padding))
+    if not isinstance(key, dict) or key.get("patientId") != patient_id or not isinstance(key.get("recordId"), str):
+        raise ValueError("invalid cursor")
+    return {"patientId": patient_id, "recordId": key["recordId"]}
+
+
+def range_condition(patient_id: str, start: Optional[datetime], end: Optional[datetime]):
+    """Key condition over history records, narrowed to ``[start, end]``.
+
+    Record IDs are ULIDs, so a time range is a sort-key range.
+    """
+    lower = ulid_bound(start) if start else "0"
+    upper = ulid_bound(end, upper=True) if end else HISTORY_RECORD_ID_LIMIT
+    return Key("patientId").eq(patient_id) & Key("recordId").between(lower, upper)
+
+
+def normalise_record(item: Dict[str, Any]) -> Dict[str, Any]:
+    if "summary" in item and "metrics" not in item:
+        item["metrics"] = item.pop("summary")
+    return item
+
+
+def page_matrix(items: List[Dict[str, Any]]) -> Tuple[np.ndarray, List[str], np.ndarray]:
+    """Stamps, metric names and a ``(readings, metrics)`` matrix for one page of records."""
+    stamps = np.array(
+        [(item.get("updatedAt") or "").replace("Z", "").split("+")[0] or "NaT" for item in items],
+        dtype="datetime64[ms]",
+    )
+    names = sorted({
+        name
+        for item in items
+        for name, value in (item.get("metrics") or {}).items()
+        if isinstance(value, (int, float, Decimal)) and not isinstance(value, bool)
+    })
+    values = np.full((len(items), len(names)), np.nan)
+    column = {name: index for index, name in enumerate(names)}
+    for row, item in enumerate(items):
+        for name, value in (item.get("metrics") or {}).items():
+            index = column.get(name)
+            if index is not None and not isinstance(value, (str, bool)):
+                values[row, index] = float(value)
+    return stamps, names, values
+
+
+class BucketStats:
+    """Count, sum, min and max per metric for each day, week or month bucket.
+
+    Fed one page of readings at a time, in time order, so memory holds the
+    buckets and never the whole range. Each page is folded with ``reduceat``
+    over its contiguous bucket runs; a bucket that spans two pages is merged.
+    """
+
+    def __init__(self, resolution: str) -> None:
+        self.resolution = resolution
+        # bucket label -> {"count": records, "metrics": {name: [count, sum, min, max]}}
+        self.buckets: Dict[str, Dict[str, Any]] = {}
+
+    def update(self, stamps: np.ndarray, names: List[str], values: np.ndarray) -> None:
+        """Fold a ``(readings, metrics)`` matrix (NaN = missing) into the buckets."""
+        if not len(stamps):
+            return
+        days = stamps.astype("datetime64[D]")
+        if self.resolution == "month":
+            buckets = days.astype("datetime64[M]").astype("datetime64[D]")
+        elif self.resolution == "week":
+            # 1970-01-01 was a Thursday; shift so weeks start on Monday.
+            buckets = days - ((days.astype(np.int64) + 3) % 7).astype("timedelta64[D]")
+        else:
+            buckets = days
+        valid = ~np.isnat(buckets)
+        if not valid.any():
+            return
+
+        buckets = buckets[valid]
+        values = values[valid]
+        starts = np.concatenate(([0], np.flatnonzero(buckets[1:] != buckets[:-1]) + 1))
+        present = ~np.isnan(values)
+        counts = np.add.reduceat(present, starts, axis=0)
+        sums = np.add.reduceat(np.where(present, values, 0.0), starts, axis=0)
+        minima = np.fmin.reduceat(values, starts, axis=0)
+        maxima = np.fmax.reduceat(values, starts, axis=0)
+        records = np.diff(np.append(starts, len(buckets)))
+
+        for position, start in enumerate(starts):
+            entry = self.buckets.setdefault(str(buckets[start]), {"count": 0, "metrics": {}})
+            entry["count"] += int(records[position])
+            for index, name in enumerate(names):
+                count = int(counts[position, index])
+                if not count:
+                    continue
+                low, high = float(minima[position, index]), float(maxima[position, index])
+                stats = entry["metrics"].get(name)
+                if stats is None:
+                    entry["metrics"][name] = [count, float(sums[position, index]), low, high]
+                else:
+                    stats[0] += count
+                    stats[1] += float(sums[position, index])
+                    stats[2] = min(stats[2], low)
+                    stats[3] = max(stats[3], high)
+
+    def rows(self) -> List[Dict[str, Any]]:
+        return [
+            {
+                "bucket": bucket,
+                "count": entry["count"],
+                "metrics": {
+                    name: {"mean": round(total / count, 2), "min": low, "max": high, "count": count}
+                    for name, (count, total, low, high) in entry["metrics"].items()
+                },
+            }
+            for bucket, entry in self.buckets.items()
+        ]
+
+
+def aggregate(stamps: np.ndarray, names: List[str], values: np.ndarray, resolution: str) -> List[Dict[str, Any]]:
+    """Bucket a ``(readings, metrics)`` matrix (NaN = missing) by time."""
+    stats = BucketStats(resolution)
+    stats.update(stamps, names, values)
+    return stats.rows()
+
+
+def downsample(pages: Iterable[List[Dict[str, Any]]], resolution: str) -> List[Dict[str, Any]]:
+    """Aggregate numeric metrics into mean/min/max per bucket, a page at a time.
+
+    Pages arrive in sort-key (time) order, so bucket labels are non-decreasing.
+    """
+    stats = BucketStats(resolution)
+    for items in pages:
+        if items:
+            stats.update(*page_matrix(items))
+    return stats.rows()
+
+
+def query_page(
+    patient_id: str,
+    start: Optional[datetime],
+    end: Optional[datetime],
+    limit: int,
+    start_key: Optional[Dict[str, Any]],
+) -> Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]:
+    kwargs: Dict[str, Any] = {
+        "KeyConditionExpression": range_condition(patient_id, start, end),
+        "Limit": limit,
+    }
+    if start_key:
+        kwargs["ExclusiveStartKey"] = start_key
+    response = health_index_table.query(**kwargs)
+    return response.get("Items", []), response.get("LastEvaluatedKey")
+
+
+def iter_metric_pages(
+    patient_id: str, start: Optional[datetime], end: Optional[datetime]
+) -> Iterator[List[Dict[str, Any]]]:
+    """Yield ``updatedAt`` and metrics of the history, one Query page at a time."""
+    kwargs: Dict[str, Any] = {
+        "KeyConditionExpression": range_condition(patient_id, start, end),
+        "ProjectionExpression": "#u, #m, #s",
+        "ExpressionAttributeNames": {"#u": "updatedAt", "#m": "metrics", "#s": "summary"},
+    }
+    while True:
+        response = health_index_table.query(**kwargs)
+        yield [normalise_record(item) for item in response.get("Items", [])]
+        last_key = response.get("LastEvaluatedKey")
+        if not last_key:
+            return
+        kwargs["ExclusiveStartKey"] = last_key
+
+
+def iter_pages(patient_id: str, start: Optional[datetime], end: Optional[datetime]) -> Iterator[List[Dict[str, Any]]]:
+    """Yield the history one Query page at a time, so only one page is held."""
+    start_key = None
+    while True:
+        items, start_key = query_page(patient_id, start, end, EXPORT_PAGE_SIZE, start_key)
+        yield [normalise_record(item) for item in items]
+        if not start_key:
+            return
+
+
+def query_series(
+    patient_id: str, start: Optional[datetime], end: Optional[datetime]
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Read the packed monthly chunks covering ``[start, end]``.
+
+    Returns epoch-millisecond stamps and a ``(readings, SERIES_FIELDS)``
+    float matrix in time order, built straight from the chunk buffers.
+    """
+    lower = series_record_id(start) if start else SERIES_RECORD_PREFIX
+    upper = series_record_id(end) if end else SERIES_RECORD_PREFIX + "~"
+    kwargs: Dict[str, Any] = {
+        "KeyConditionExpression": Key("patientId").eq(patient_id) & Key("recordId").between(lower, upper),
+        "ProjectionExpression": "#d",
+        "ExpressionAttributeNames": {"#d": "data"},
+    }
+    stamps: List[np.ndarray] = []
+    columns: List[np.ndarray] = []
+    while True:
+        response = health_index_table.query(**kwargs)
+        for item in response.get("Items", []):
+            chunk_stamps, chunk_columns = unpack_vitals_series(getattr(item["data"], "value", item["data"]))
+            stamps.append(np.frombuffer(chunk_stamps, dtype=np.int64))
+            matrix = np.full((len(chunk_stamps), len(SERIES_FIELDS)), np.nan, dtype=np.float32)
+            for index, field in enumerate(SERIES_FIELDS):
+                if field in chunk_columns:
+                    matrix[:, index] = np.frombuffer(chunk_columns[field], dtype=np.float32)
+            columns.append(matrix)
+        last_key = response.get("LastEvaluatedKey")
+        if not last_key:
+            break
+        kwargs["ExclusiveStartKey"] = last_key
+    if not stamps:
+        return np.empty(0, dtype=np.int64), np.empty((0, len(SERIES_FIELDS)))
+    millis = np.concatenate(stamps)
+    # float32 -> float64, rounded so 36.6 reads back as 36.6.
+    values = np.round(np.concatenate(columns).astype(np.float64), 4)
+    keep = np.ones(len(millis), dtype=bool)
+    if start:
+        keep &= millis >= int(start.timestamp() * 1000)
+    if end:
+        keep &= millis <= int(end.timestamp() * 1000)
+    return millis[keep], values[keep]
+
+
+def series_items(millis: np.ndarray, values: np.ndarray) -> List[Dict[str, Any]]:
+    stamps = millis.astype("datetime64[ms]").astype(str)
+    items = []
+    for row, stamp in enumerate(stamps):
+        metrics = {
+            field: float(values[row, index])
+            for index, field in enumerate(SERIES_FIELDS)
+            if not np.isnan(values[row, index])
+        }
+        items.append({"updatedAt": stamp, "metrics": metrics})
+    return items
+
 
 def lambda_handler(event: Dict[str, Any], _context: Any):
-    forbidden = require_role(event, ["PATIENT"])
+    forbidden = require_role(event, ["PATIENT", "DOCTOR"])
     if forbidden:
         return forbidden
 
-    patient_id = get_claim(event, "email")
-    if not patient_id:
+    requester = get_claim(event, "email")
+    if not requester:
         # Demo mode: use default patient ID
-        patient_id = "patient.demo@example.com"
-    
-    path_patient = (event.get("pathParameters") or {}).get("patientId")
+        requester = "patient.demo@example.com"
+    groups = get_groups(event)
+    if not groups and is_demo_mode():
+        groups = {"PATIENT"}
 
-    if not path_patient or path_patient != patient_id:
+    patient_id = (event.get("pathParameters") or {}).get("patientId")
+    params = event.get("queryStringParameters") or {}
+    export_format = (params.get("export") or "").lower()
+    if export_format and export_format not in EXPORT_FORMATS:
+        return json_response({"message": "export must be ndjson or csv"}, 400)
+
+    if not patient_id:
+        return json_response({"message": "forbidden"}, 403)
+    if "PATIENT" in groups:
+        if patient_id != requester:
+            return json_response({"message": "forbidden"}, 403)
+    elif "DOCTOR" in groups and export_format:
+        # Doctors may export the history of a patient they have an active
+        # appointment with (e.g. for a referral).
+        appointment_id = params.get("appointmentId")
+        if not appointment_id:
+            return json_response({"message": "appointmentId required"}, 400)
+        appointment = appointments_table.get_item(Key={"appointmentId": appointment_id}).get("Item")
+        if (
+            not appointment
+            or appointment.get("doctorId") != requester
+            or appointment.get("patientId") != patient_id
+            or appointment.get("status") not in DOCTOR_EXPORT_STATUSES
+        ):
+            return json_response({"message": "forbidden"}, 403)
+    else:
         return json_response({"message": "forbidden"}, 403)
 
-    response = health_index_table.query(
-        KeyConditionExpression=Key("patientId").eq(patient_id)
-    )
+    body: Dict[str, Any]
+    resolution = (params.get("resolution") or "").lower()
+    if resolution and resolution not in RESOLUTIONS:
+        return json_response({"message": "resolution must be day, week or month"}, 400)
+    try:
+        start = parse_time(params.get("from"))
+        end = parse_time(params.get("to"))
+    except ValueError:
+        return json_response({"message": "from/to must be ISO-8601 timestamps"}, 400)
+    if start and end and start > end:
+        return json_response({"message": "from must not be after to"}, 400)
+    try:
+        limit = int(params.get("limit") or DEFAULT_PAGE_SIZE)
+    except ValueError:
+        return json_response({"message": "limit must be an integer"}, 400)
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    source = (params.get("source") or "records").lower()
+    if source not in SOURCES:
+        return json_response({"message": "source must be records or series"}, 400)
+
+    if export_format:
+        key = f"exports/{generate_ulid()}.{export_format}"
+        try:
+            result = export_pages(iter_pages(patient_id, start, end), key, export_format, list(SERIES_FIELDS))
+        except Exception:  # pylint: disable=broad-except
+            LOGGER.exception("health history export failed")
+            return json_response({"message": "unable to export history"}, 500)
+        LOGGER.info(
+            "patient health index exported",
+            extra={
+                "requestId": event.get("requestContext", {}).get("requestId"),
+                "patientId": patient_id,
+                "requester": requester,
+                "records": result["records"],
+                "bytes": result["bytes"],
+                "format": export_format,
+            },
+        )
+        return json_response({**result, "format": export_format, "expiresIn": URL_EXPIRY_SECONDS})
 
-    items = response.get("Items", [])
-    for item in items:
-        if "summary" in item and "metrics" not in item:
-            item["metrics"] = item.pop("summary")
+    if source == "series":
+        # Packed chunks are small enough to return the whole range at once.
+        millis, values = query_series(patient_id, start, end)
+        if resolution:
+            items = aggregate(millis.astype("datetime64[ms]"), list(SERIES_FIELDS), values, resolution)
+            body = {"items": items, "resolution": resolution}
+        else:
+            items = series_items(millis, values)
+            body = {"items": items, "nextCursor": None}
+    elif resolution:
+        items = downsample(iter_metric_pages(patient_id, start, end), resolution)
+        body = {"items": items, "resolution": resolution}
+    else:
+        try:
+            start_key = decode_cursor(params.get("cursor"), patient_id)
+        except (ValueError, TypeError):
+            return json_response({"message": "invalid cursor"}, 400)
+        items, last_key = query_page(patient_id, start, end, limit, start_key)
+        items = [normalise_record(item) for item in items]
+        body = {"items": items, "nextCursor": encode_cursor(last_key)}
 
     LOGGER.info(
         "patient health index retrieved",
@@ -48,7 +408,9 @@ def lambda_handler(event: Dict[str, Any], _context: Any):
             "requestId": event.get("requestContext", {}).get("requestId"),
             "patientId": patient_id,
             "count": len(items),
+            "resolution": resolution or None,
+            "source": source,
         },
     )
 
-    return json_response({"items": items})
+    return json_response(body)
@@ -3,7 +3,8 @@ from __future__ import annotations
 import logging
 import os
 import sys
-from typing import Any, Dict, Optional
+import time
+from typing import Any, Dict, List, Optional, Tuple
 
 CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
 PARENT_DIR = os.path.abspath(os.path.join(CURRENT_DIR, os.pardir))
@@ -11,6 +12,8 @@ if PARENT_DIR not in sys.path:
     sys.path.append(PARENT_DIR)
 
 from common import (  # noqa: E402
+    LATEST_RECORD_ID,
+    ROLLUP_RECORD_ID,
     appointments_table,
     get_claim,
     get_groups,
@@ -19,11 +22,23 @@ from common import (  # noqa: E402
     require_role,
     is_demo_mode,
 )
+from diabetes_model import MAX_IMPUTED_FEATURES, RISK_RECORD_ID  # noqa: E402
+from population_stats import (  # noqa: E402
+    POPULATION_PATIENT_ID,
+    cohort_record_id,
+    percentile_rank,
+)
+from vitals_stats import summarise  # noqa: E402
 
 
 LOGGER = logging.getLogger(__name__)
 
 ALLOWED_STATUSES = {"PENDING", "CONFIRMED"}
+# Cohort histograms change only when the batch job runs, so warm containers
+# keep them in memory for a while instead of reading them per request.
+COHORT_CACHE_SECONDS = 600
+
+_COHORT_CACHE: Dict[str, Tuple[float, Optional[Dict[str, Any]]]] = {}
 
 
 def fetch_record(patient_id: str, record_id: str) -> Optional[Dict[str, Any]]:
@@ -33,6 +48,65 @@ def fetch_record(patient_id: str, record_id: str) -> Optional[Dict[str, Any]]:
     return response.get("Item")
 
 
+def fetch_trend(patient_id: str) -> Dict[str, Any]:
+    """Per-metric running statistics from the rollup item (one GetItem)."""
+    rollup = fetch_record(patient_id, ROLLUP_RECORD_ID) or {}
+    return {name: summarise(stats) for name, stats in (rollup.get("metrics") or {}).items()}
+
+
+def load_cohort(record_id: str) -> Optional[Dict[str, Any]]:
+    """Cohort histograms as plain lists, cached per container."""
+    now = time.monotonic()
+    cached = _COHORT_CACHE.get(record_id)
+    if cached and cached[0] > now:
+        return cached[1]
+    item = fetch_record(POPULATION_PATIENT_ID, record_id)
+    cohort = None
+    if item:
+        cohort = {
+            "generatedAt": item.get("generatedAt"),
+            "metrics": {
+                name: ([float(edge) for edge in spec["edges"]], [int(total) for total in spec["cumulative"]])
+                for name, spec in (item.get("metrics") or {}).items()
+            },
+        }
+    _COHORT_CACHE[record_id] = (now + COHORT_CACHE_SECONDS, cohort)
+    return cohort
+
+
+def fetch_risk(patient_id: str) -> Optional[Dict[str, Any]]:
+    """Nightly diabetes-risk score (scripts/score_patient_risk.py), if any."""
+    item = fetch_record(patient_id, RISK_RECORD_ID)
+    # Scores resting mostly on default answers are not served.
+    if not item or len(item.get("imputed") or []) > MAX_IMPUTED_FEATURES:
+        return None
+    return {key: item.get(key) for key in ("probability", "modelVersion", "scoredAt", "sourceRecordId", "imputed")}
+
+
+def cohort_percentiles(record: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Percentile rank of each latest metric within the patient's cohort.
+
+    Uses the patient's city cohort when there is one, else the population.
+    """
+    if not record:
+        return None
+    candidates: List[Tuple[str, str]] = []
+    if record.get("city"):
+        candidates.append((f"city={record['city']}", cohort_record_id("city", record["city"])))
+    candidates.append(("all", cohort_record_id()))
+    for label, record_id in candidates:
+        cohort = load_cohort(record_id)
+        if not cohort:
+            continue
+        ranks = {}
+        for name, value in (record.get("metrics") or {}).items():
+            histogram = cohort["metrics"].get(name)
+            if histogram and not isinstance(value, (str, bool)):
+                ranks[name] = percentile_rank(histogram[0], histogram[1], float(value))
+        return {"cohort": label, "generatedAt": cohort["generatedAt"], "metrics": ranks}
+    return None
+
+
 def lambda_handler(event: Dict[str, Any], _context: Any):
     forbidden = require_role(event, ["PATIENT", "DOCTOR"])
     if forbidden:
@@ -49,7 +123,9 @@ def lambda_handler(event: Dict[str, Any], _context: Any):
         groups = ["PATIENT"]
     
     path_patient = (event.get("pathParameters") or {}).get("patientId")
-    appointment_id = (event.get("queryStringParameters") or {}).get("appointmentId")
+    params = event.get("queryStringParameters") or {}
+    appointment_id = params.get("appointmentId")
+    include = {value.strip().lower() for value in (params.get("include") or "").split(",") if value.strip()}
 
     if not path_patient:
         return json_response({"message": "missing identifiers"}, 400)
@@ -59,7 +135,7 @@ def lambda_handler(event: Dict[str, Any], _context: Any):
     if "PATIENT" in groups:
         if path_patient != requester:
             return json_response({"message": "forbidden"}, 403)
-        record = fetch_record(path_patient, "latest")
+        record = fetch_record(path_patient, LATEST_RECORD_ID)
     elif "DOCTOR" in groups:
         if not appointment_id:
             return json_response({"message": "appointmentId required"}, 400)
@@ -71,7 +147,7 @@ def lambda_handler(event: Dict[str, Any], _context: Any):
             or appointment.get("status") not in ALLOWED_STATUSES
         ):
             return json_response({"message": "forbidden"}, 403)
-        record = fetch_record(path_patient, appointment_id) or fetch_record(path_patient, "latest")
+        record = fetch_record(path_patient, appointment_id) or fetch_record(path_patient, LATEST_RECORD_ID)
     else:
         return json_response({"message": "forbidden"}, 403)
 
@@ -87,7 +163,12 @@ def lambda_handler(event: Dict[str, Any], _context: Any):
         },
     )
 
-    if not record:
-        return json_response({"item": {"metrics": {}, "updatedAt": None}})
+    body: Dict[str, Any] = {"item": record or {"metrics": {}, "updatedAt": None}}
+    if "trend" in include:
+        body["trend"] = fetch_trend(path_patient)
+    if "percentiles" in include:
+        body["percentiles"] = cohort_percentiles(record)
+    if "risk" in include:
+        body["risk"] = fetch_risk(path_patient)
 
-    return json_response({"item": record})
+    return json_response(body)
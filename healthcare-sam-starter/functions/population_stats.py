@@ -0,0 +1,205 @@
+"""Population health statistics computed over NumPy arrays.
+
+The batch job (``scripts/compute_population_stats.py``) loads one reading per patient
+into flat arrays: metric values plus an integer cohort code per row. Every
+statistic here is computed for all cohorts at once: counts, means and
+variances with ``bincount``, histograms with one ``bincount`` over
+``cohort * bins + bin``, and percentiles by interpolating into one
+cohort-major ``lexsort``. The result is stored as a single item in
+PatientHealthIndex under a reserved partition, so the API serves it with one
+GetItem.
+
+Histogram edges are fixed per metric so that histograms from different runs
+and cohorts can be compared and summed.
+"""
+from __future__ import annotations
+
+from bisect import bisect_right
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+# Reserved partition in PatientHealthIndex. Patient IDs are e-mail addresses,
+# so this cannot collide with a real patient.
+POPULATION_PATIENT_ID = "_population"
+STATS_RECORD_ID = "stats"
+# Per-cohort cumulative histograms for percentile ranks, one item each:
+# "cohort#all" and "cohort#<dimension>=<label>". Only city cohorts exist: age
+# and sex cohorts need those attributes, which no patient record stores yet.
+COHORT_RECORD_PREFIX = "cohort#"
+ALL_COHORT = "all"
+COHORT_DIMENSIONS = ("city",)
+
+PERCENTILES = (5, 25, 50, 75, 95)
+# Cohorts smaller than this are left out of the published summary.
+MIN_COHORT_SIZE = 5
+HISTOGRAM_EDGES: Dict[str, np.ndarray] = {
+    "bmi": np.round(np.linspace(10.0, 60.0, 101), 2),
+    "temperatureC": np.round(np.linspace(34.0, 42.0, 81), 2),
+}
+
+
+def cohort_stats(values: np.ndarray, cohorts: np.ndarray, n_cohorts: int, edges: np.ndarray) -> Dict[str, np.ndarray]:
+    """Per-cohort count, mean, stddev, percentiles and histogram of ``values``.
+
+    ``cohorts`` holds a code in ``[0, n_cohorts)`` per value; NaN values are
+    ignored. Arrays in the result are indexed by cohort code.
+    """
+    valid = ~np.isnan(values)
+    values = values[valid].astype(np.float64)
+    cohorts = cohorts[valid].astype(np.int64)
+
+    counts = np.bincount(cohorts, minlength=n_cohorts)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = np.bincount(cohorts, weights=values, minlength=n_cohorts) / counts
+        deviations = values - means[cohorts]
+        variances = np.bincount(cohorts, weights=deviations * deviations, minlength=n_cohorts) / (counts - 1)
+    stddevs = np.sqrt(np.where(counts > 1, variances, 0.0))
+
+    n_bins = len(edges) - 1
+    bins = np.clip(np.searchsorted(edges, values, side="right") - 1, 0, n_bins - 1)
+    histograms = np.bincount(cohorts * n_bins + bins, minlength=n_cohorts * n_bins).reshape(n_cohorts, n_bins)
+
+    # Linear-interpolated percentiles (numpy's default method) for every
+    # cohort at once: sort by (cohort, value) and index into each run.
+    ordered = values[np.lexsort((values, cohorts))]
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    quantiles = np.asarray(PERCENTILES, dtype=np.float64) / 100.0
+    positions = starts[:, None] + quantiles[None, :] * np.maximum(counts - 1, 0)[:, None]
+    lower = np.floor(positions).astype(np.int64)
+    upper = np.ceil(positions).astype(np.int64)
+    percentiles = np.full((n_cohorts, len(PERCENTILES)), np.nan)
+    present = counts > 0
+    if ordered.size:
+        low_values = ordered[np.minimum(lower, ordered.size - 1)]
+        high_values = ordered[np.minimum(upper, ordered.size - 1)]
+        interpolated = low_values + (high_values - low_values) * (positions - lower)
+        percentiles[present] = interpolated[present]
+
+    return {
+        "count": counts,
+        "mean": means,
+        "stddev": stddevs,
+        "percentiles": percentiles,
+        "histogram": histograms,
+    }
+
+
+def _round(value: float, digits: int = 2) -> float | None:
+    return None if np.isnan(value) else round(float(value), digits)
+
+
+def summarise_metric(
+    name: str, values: np.ndarray, cohort_sets: Dict[str, tuple]
+) -> Dict[str, Any]:
+    """JSON-ready summary of one metric, overall and per cohort dimension.
+
+    ``cohort_sets`` maps a dimension name (``city``, ``specialty``) to
+    ``(labels, codes)`` as returned by ``np.unique(..., return_inverse=True)``.
+    Each cohort is compared with the whole population: ``deltaMean`` and a
+    z-score of the cohort mean under the population spread.
+    """
+    edges = HISTOGRAM_EDGES[name]
+    overall = cohort_stats(values, np.zeros(len(values), dtype=np.int64), 1, edges)
+    summary: Dict[str, Any] = {
+        "edges": [float(edge) for edge in edges],
+        "overall": _cohort_entry(overall, 0),
+    }
+    population_mean = overall["mean"][0]
+    population_std = overall["stddev"][0]
+    for dimension, (labels, codes) in cohort_sets.items():
+        stats = cohort_stats(values, codes, len(labels), edges)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            deltas = stats["mean"] - population_mean
+            z_scores = deltas / (population_std / np.sqrt(stats["count"]))
+        cohorts = {}
+        for code, label in enumerate(labels):
+            if stats["count"][code] < MIN_COHORT_SIZE:
+                continue
+            entry = _cohort_entry(stats, code)
+            entry["deltaMean"] = _round(deltas[code])
+            entry["z"] = _round(z_scores[code])
+            cohorts[str(label)] = entry
+        summary[dimension] = cohorts
+    return summary
+
+
+def _cohort_entry(stats: Dict[str, np.ndarray], code: int) -> Dict[str, Any]:
+    return {
+        "count": int(stats["count"][code]),
+        "mean": _round(stats["mean"][code]),
+        "stddev": _round(stats["stddev"][code]),
+        "percentiles": {
+            f"p{percentile}": _round(value)
+            for percentile, value in zip(PERCENTILES, stats["percentiles"][code])
+        },
+        "histogram": [int(count) for count in stats["histogram"][code]],
+    }
+
+
+def encode_labels(values: Sequence[Any], missing: str = "Unknown") -> tuple:
+    labels, codes = np.unique(np.asarray([value or missing for value in values], dtype=object).astype(str),
+                              return_inverse=True)
+    return list(labels), codes
+
+
+def build_summary(metrics: Dict[str, np.ndarray], cohorts: Dict[str, List[Any]]) -> Dict[str, Any]:
+    cohort_sets = {dimension: encode_labels(values) for dimension, values in cohorts.items()}
+    return {name: summarise_metric(name, values, cohort_sets) for name, values in metrics.items()}
+
+
+def cohort_record_id(dimension: Optional[str] = None, label: Optional[str] = None) -> str:
+    if dimension is None:
+        return COHORT_RECORD_PREFIX + ALL_COHORT
+    return f"{COHORT_RECORD_PREFIX}{dimension}={label}"
+
+
+def cohort_items(summary: Dict[str, Any], generated_at: str) -> List[Dict[str, Any]]:
+    """Histogram items for percentile lookups, derived from :func:`build_summary` output.
+
+    Histograms are stored cumulatively, so a lookup is one bisect over the
+    edges plus an interpolation inside the bin.
+    """
+    cohorts: Dict[str, Dict[str, Any]] = {}
+    for name, metric in summary.items():
+        entries = [(cohort_record_id(), metric["overall"])]
+        entries += [
+            (cohort_record_id(dimension, label), entry)
+            for dimension in COHORT_DIMENSIONS
+            for label, entry in (metric.get(dimension) or {}).items()
+        ]
+        for record_id, entry in entries:
+            cohorts.setdefault(record_id, {})[name] = {
+                "count": entry["count"],
+                "edges": metric["edges"],
+                "cumulative": [int(total) for total in np.cumsum(entry["histogram"])],
+            }
+    return [
+        {
+            "patientId": POPULATION_PATIENT_ID,
+            "recordId": record_id,
+            "generatedAt": generated_at,
+            "metrics": metrics,
+        }
+        for record_id, metrics in sorted(cohorts.items())
+    ]
+
+
+def percentile_rank(edges: Sequence[float], cumulative: Sequence[int], value: float) -> Optional[float]:
+    """Share of the cohort (0-100) at or below ``value``, in O(log bins).
+
+    Values outside the histogram range clamp to 0 or 100; within a bin the
+    rank is interpolated linearly.
+    """
+    total = cumulative[-1] if cumulative else 0
+    if not total:
+        return None
+    if value <= edges[0]:
+        return 0.0
+    if value >= edges[-1]:
+        return 100.0
+    index = bisect_right(edges, value) - 1
+    below = cumulative[index - 1] if index else 0
+    in_bin = cumulative[index] - below
+    fraction = (value - edges[index]) / (edges[index + 1] - edges[index])
+    return round(100.0 * (below + fraction * in_bin) / total, 1)
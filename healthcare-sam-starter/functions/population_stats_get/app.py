@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+import logging
+import os
+import sys
+from typing import Any, Dict
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PARENT_DIR = os.path.abspath(os.path.join(CURRENT_DIR, os.pardir))
+if PARENT_DIR not in sys.path:
+    sys.path.append(PARENT_DIR)
+
+from common import (  # noqa: E402
+    health_index_table,
+    json_response,
+    require_role,
+)
+from population_stats import POPULATION_PATIENT_ID, STATS_RECORD_ID  # noqa: E402
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+def strip_histograms(metrics: Dict[str, Any]) -> Dict[str, Any]:
+    """Drop edges and histogram arrays, which make up most of the item."""
+    result: Dict[str, Any] = {}
+    for name, summary in metrics.items():
+        result[name] = {}
+        for key, value in summary.items():
+            if key == "edges":
+                continue
+            if key == "overall":
+                result[name][key] = {k: v for k, v in value.items() if k != "histogram"}
+            else:
+                result[name][key] = {
+                    label: {k: v for k, v in entry.items() if k != "histogram"} for label, entry in value.items()
+                }
+    return result
+
+
+def lambda_handler(event: Dict[str, Any], _context: Any):
+    forbidden = require_role(event, ["DOCTOR"])
+    if forbidden:
+        return forbidden
+
+    params = event.get("queryStringParameters") or {}
+    item = health_index_table.get_item(
+        Key={"patientId": POPULATION_PATIENT_ID, "recordId": STATS_RECORD_ID}
+    ).get("Item")
+    if not item:
+        return json_response({"message": "population statistics have not been computed yet"}, 404)
+
+    metrics = item.get("metrics") or {}
+    if (params.get("include") or "").lower() != "histograms":
+        metrics = strip_histograms(metrics)
+
+    LOGGER.info(
+        "population stats served",
+        extra={"requestId": event.get("requestContext", {}).get("requestId"), "generatedAt": item.get("generatedAt")},
+    )
+    return json_response({"generatedAt": item.get("generatedAt"), "patients": item.get("patients"), "metrics": metrics})
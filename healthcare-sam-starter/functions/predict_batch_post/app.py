@@ -0,0 +1,178 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PARENT_DIR = os.path.abspath(os.path.join(CURRENT_DIR, os.pardir))
+if PARENT_DIR not in sys.path:
+    sys.path.append(PARENT_DIR)
+
+from circuit_breaker import CircuitBreaker, remaining_seconds  # noqa: E402
+from common import dynamodb, json_response, require_role  # noqa: E402
+from diabetes_model import load_model, remote_probability  # noqa: E402
+from http_pool import ConnectionPool  # noqa: E402
+from prediction_cache import PredictionCache, cache_key, canonical_body  # noqa: E402
+
+
+LOGGER = logging.getLogger(__name__)
+LOGGER.setLevel(os.environ.get("LOG_LEVEL", "INFO"))
+
+MAX_BATCH_SIZE = 200
+# Remote fan-out: at most this many requests in flight, one pooled
+# connection each.
+BATCH_CONCURRENCY = int(os.environ.get("BATCH_CONCURRENCY", "8"))
+MODEL_URL = os.environ.get("DIABETES_MODEL_URL", "https://kydqfodd48.execute-api.eu-west-3.amazonaws.com/default/test-model-endpoint")
+MODEL_TIMEOUT_SECONDS = 5
+MIN_REMOTE_BUDGET_SECONDS = 0.2
+MODEL_POOL = ConnectionPool(MODEL_URL, size=BATCH_CONCURRENCY, timeout=MODEL_TIMEOUT_SECONDS)
+MODEL_BREAKER = CircuitBreaker()
+PREDICTION_CACHE_TABLE_NAME = os.environ.get("PREDICTION_CACHE_TABLE_NAME")
+PREDICTION_CACHE = PredictionCache(dynamodb.Table(PREDICTION_CACHE_TABLE_NAME) if PREDICTION_CACHE_TABLE_NAME else None)
+# Same modes as predict_proxy: "primary" scores the whole batch with the
+# local model in one matrix operation; "fallback" asks the remote model and
+# scores the rows it failed on locally; "off" uses the remote model only.
+LOCAL_MODEL_MODE = os.environ.get("LOCAL_MODEL_MODE", "off").lower()
+LOCAL_MODEL = load_model() if LOCAL_MODEL_MODE in ("fallback", "primary") else None
+
+
+def score_locally(rows: Dict[int, Dict[str, Any]], results: List[Optional[Dict[str, Any]]]) -> None:
+    """Fill ``results`` for ``rows`` (index -> features) with one vectorized call."""
+    if not rows:
+        return
+    indices = list(rows)
+    probabilities = LOCAL_MODEL.predict(LOCAL_MODEL.matrix([rows[index] for index in indices]))
+    for index, probability in zip(indices, probabilities):
+        results[index] = {"probability": round(float(probability), 4), "source": "local"}
+
+
+def ask_remote(canonical: str, deadline: Optional[float]) -> Dict[str, Any]:
+    budget = MODEL_TIMEOUT_SECONDS
+    if deadline is not None:
+        budget = min(budget, deadline - time.monotonic())
+    if budget < MIN_REMOTE_BUDGET_SECONDS:
+        raise TimeoutError("invocation deadline reached")
+    if not MODEL_BREAKER.allow():
+        raise RuntimeError("model circuit open")
+    started = time.monotonic()
+    try:
+        status, raw = MODEL_POOL.request(
+            "POST", body=canonical.encode("utf-8"), headers={"Content-Type": "application/json"}, timeout=budget
+        )
+    except Exception:
+        MODEL_BREAKER.record(False, time.monotonic() - started)
+        raise
+    MODEL_BREAKER.record(status < 500, time.monotonic() - started)
+    if status >= 400:
+        raise RuntimeError(f"model returned {status}")
+    parsed = json.loads(raw)
+    probability = remote_probability(parsed)
+    if probability is None:
+        raise RuntimeError("model response has no probability")
+    try:
+        PREDICTION_CACHE.put(cache_key(canonical), status, parsed)
+    except Exception:
+        LOGGER.exception("Prediction cache write failed")
+    return {"probability": round(probability, 4), "source": "remote"}
+
+
+def score_remotely(
+    rows: Dict[int, Dict[str, Any]], results: List[Optional[Dict[str, Any]]], deadline: Optional[float]
+) -> Dict[int, str]:
+    """Cache lookups, then a bounded fan-out for the misses; returns index -> error.
+
+    Rows are refused without a call once the breaker opens or ``deadline``
+    (a ``time.monotonic()`` value) is too close.
+    """
+    pending: Dict[int, str] = {}
+    for index, features in rows.items():
+        canonical = canonical_body({"features": features})
+        try:
+            hit = PREDICTION_CACHE.get(cache_key(canonical))
+        except Exception:
+            LOGGER.exception("Prediction cache lookup failed")
+            hit = None
+        probability = remote_probability(hit[1]) if hit else None
+        if probability is not None:
+            results[index] = {"probability": round(probability, 4), "source": "cache"}
+        else:
+            pending[index] = canonical
+
+    errors: Dict[int, str] = {}
+    if not pending:
+        return errors
+    with ThreadPoolExecutor(max_workers=min(BATCH_CONCURRENCY, len(pending))) as executor:
+        futures = {index: executor.submit(ask_remote, canonical, deadline) for index, canonical in pending.items()}
+        for index, future in futures.items():
+            try:
+                results[index] = future.result()
+            except Exception as exc:  # one failed row must not fail the batch
+                errors[index] = str(exc) or type(exc).__name__
+    return errors
+
+
+def lambda_handler(event: Dict[str, Any], context: Any):
+    """Score many feature sets in one call; results come back in request order.
+
+    Body: ``{"features": [{...}, {...}]}`` with the same feature objects as
+    ``POST /predict``. Rows that cannot be scored get ``{"error": ...}``.
+    """
+    forbidden = require_role(event, ["DOCTOR"])
+    if forbidden:
+        return forbidden
+
+    try:
+        body = json.loads(event.get("body") or "{}")
+    except json.JSONDecodeError:
+        return json_response({"message": "body must be JSON"}, 400)
+    items = body.get("features") if isinstance(body, dict) else None
+    if not isinstance(items, list) or not items:
+        return json_response({"message": "features must be a non-empty array"}, 400)
+    if len(items) > MAX_BATCH_SIZE:
+        return json_response({"message": f"at most {MAX_BATCH_SIZE} feature sets per batch"}, 400)
+
+    results: List[Optional[Dict[str, Any]]] = [None] * len(items)
+    valid: Dict[int, Dict[str, Any]] = {}
+    for index, features in enumerate(items):
+        try:
+            if LOCAL_MODEL is not None:
+                LOCAL_MODEL.row(features)
+            elif not isinstance(features, dict):
+                raise ValueError("features must be an object")
+            canonical_body(features)
+        except ValueError as exc:
+            results[index] = {"error": str(exc)}
+            continue
+        valid[index] = features
+
+    if LOCAL_MODEL_MODE == "primary":
+        score_locally(valid, results)
+    else:
+        remaining = remaining_seconds(context)
+        deadline = time.monotonic() + remaining if remaining is not None else None
+        errors = score_remotely(valid, results, deadline)
+        if errors and LOCAL_MODEL is not None:
+            LOGGER.warning("Remote model failed for %d of %d rows; scoring them locally", len(errors), len(valid))
+            score_locally({index: valid[index] for index in errors}, results)
+        else:
+            for index, message in errors.items():
+                results[index] = {"error": message}
+
+    scored = sum(1 for result in results if result and "probability" in result)
+    LOGGER.info(
+        "batch prediction",
+        extra={"requestId": event.get("requestContext", {}).get("requestId"), "rows": len(items), "scored": scored},
+    )
+    return json_response(
+        {
+            "results": results,
+            "scored": scored,
+            "failed": len(items) - scored,
+            "modelVersion": LOCAL_MODEL.version if LOCAL_MODEL is not None else None,
+        }
+    )
@@ -4,27 +4,96 @@ import json
 import logging
 import os
 import sys
+import time
 from typing import Any, Dict
 
-import urllib.request
-
 CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
 PARENT_DIR = os.path.abspath(os.path.join(CURRENT_DIR, os.pardir))
 if PARENT_DIR not in sys.path:
     sys.path.append(PARENT_DIR)
 
-from common import json_response  # noqa: E402
+from circuit_breaker import CircuitBreaker, remaining_seconds  # noqa: E402
+from common import dynamodb, json_response  # noqa: E402
+from diabetes_model import load_model, local_response  # noqa: E402
+from hedging import HedgedClient  # noqa: E402
+from http_pool import ConnectionPool  # noqa: E402
+from prediction_cache import PredictionCache, cache_key, canonical_body  # noqa: E402
 
 LOGGER = logging.getLogger(__name__)
 LOGGER.setLevel(os.environ.get("LOG_LEVEL", "INFO"))
 
 # Default to the known model URL; override with environment variable if needed
 MODEL_URL = os.environ.get("DIABETES_MODEL_URL", "https://kydqfodd48.execute-api.eu-west-3.amazonaws.com/default/test-model-endpoint")
+# Must stay below the function timeout (10 s); the invocation deadline caps
+# it further.
+MODEL_TIMEOUT_SECONDS = 8
+# Not worth calling the remote model with less time than this left.
+MIN_REMOTE_BUDGET_SECONDS = 0.2
+# Created once per container so warm invocations reuse an open (TLS)
+# connection instead of reconnecting on every prediction.
+MODEL_POOL = ConnectionPool(MODEL_URL, timeout=MODEL_TIMEOUT_SECONDS)
+# Stops calling a failing or slow model endpoint for a while instead of
+# spending every invocation's budget on it.
+MODEL_BREAKER = CircuitBreaker()
+# Optional: re-send a request on a second connection when it has not
+# answered within this container's observed p95 (functions/hedging.py).
+HEDGE_REQUESTS = os.environ.get("HEDGE_REQUESTS", "false").lower() == "true"
+MODEL_CLIENT = HedgedClient(MODEL_POOL) if HEDGE_REQUESTS else MODEL_POOL
+# Identical feature vectors are answered from cache; the DynamoDB table is
+# optional and shares entries between containers.
+PREDICTION_CACHE_TABLE_NAME = os.environ.get("PREDICTION_CACHE_TABLE_NAME")
+PREDICTION_CACHE = PredictionCache(dynamodb.Table(PREDICTION_CACHE_TABLE_NAME) if PREDICTION_CACHE_TABLE_NAME else None)
+# In-process logistic model (functions/diabetes_model.py):
+#   off      - remote model only (default until a parity recording exists)
+#   fallback - remote model, answered locally when it errors or takes longer
+#              than LOCAL_FALLBACK_AFTER_SECONDS
+#   primary  - answered locally, the remote model is only used for requests
+#              the local model cannot score
+LOCAL_MODEL_MODE = os.environ.get("LOCAL_MODEL_MODE", "off").lower()
+LOCAL_FALLBACK_AFTER_SECONDS = float(os.environ.get("LOCAL_FALLBACK_AFTER_SECONDS", "3"))
+LOCAL_MODEL = load_model() if LOCAL_MODEL_MODE in ("fallback", "primary") else None
+
+
+def _parse(raw: bytes) -> Any:
+    try:
+        return json.loads(raw)
+    except Exception:
+        return {"raw": raw.decode("utf-8", errors="replace")}
 
 
-def lambda_handler(event: Dict[str, Any], _context: Any):
+def _cached(key: str):
+    try:
+        return PREDICTION_CACHE.get(key)
+    except Exception:  # a cache outage must not fail the prediction
+        LOGGER.exception("Prediction cache lookup failed")
+        return None
+
+
+def _store(key: str, status: int, parsed: Any) -> None:
+    try:
+        PREDICTION_CACHE.put(key, status, parsed)
+    except Exception:
+        LOGGER.exception("Prediction cache write failed")
+
+
+def _local_prediction(payload: Any):
+    if LOCAL_MODEL is None or not isinstance(payload, dict):
+        return None
+    try:
+        return local_response(LOCAL_MODEL, LOCAL_MODEL.predict_one(payload.get("features")))
+    except ValueError:
+        return None
+
+
+def lambda_handler(event: Dict[str, Any], context: Any):
     """Proxy POST requests to the external model endpoint and return the model response.
 
+    JSON bodies are canonicalised and successful answers cached (see
+    ``prediction_cache``), so repeated identical forms skip the model. See
+    ``LOCAL_MODEL_MODE`` for when the in-process model answers instead.
+    Remote calls are bounded by the invocation's remaining time and skipped
+    while ``MODEL_BREAKER`` is open.
+
     This Lambda adds proper CORS headers via `json_response` and helps avoid browser CORS issues
     by having the frontend call the same origin API Gateway URL which can be configured with CORS.
     """
@@ -36,24 +105,54 @@ def lambda_handler(event: Dict[str, Any], _context: Any):
 
             body = base64.b64decode(body)
         # Forward the body exactly to the model endpoint
-        req = urllib.request.Request(MODEL_URL, data=body.encode("utf-8") if isinstance(body, str) else body, method="POST")
-        req.add_header("Content-Type", "application/json")
-        with urllib.request.urlopen(req, timeout=15) as resp:
-            raw = resp.read()
-            try:
-                parsed = json.loads(raw)
-            except Exception:
-                parsed = {"raw": raw.decode("utf-8", errors="replace")}
-            status = getattr(resp, "status", 200)
-            return json_response(parsed, status)
-    except urllib.error.HTTPError as he:
+        data = body.encode("utf-8") if isinstance(body, str) else body
+        key = None
+        try:
+            payload = json.loads(data)
+            # Forward the canonical form so the cached answer matches its key.
+            canonical = canonical_body(payload)
+        except ValueError:
+            payload = canonical = None
+        local = _local_prediction(payload)
+        if local is not None and LOCAL_MODEL_MODE == "primary":
+            return json_response(local, 200)
+        if canonical is not None:
+            data = canonical.encode("utf-8")
+            key = cache_key(canonical)
+            hit = _cached(key)
+            if hit is not None:
+                return json_response(hit[1], hit[0])
+        budget = LOCAL_FALLBACK_AFTER_SECONDS if local is not None else MODEL_TIMEOUT_SECONDS
+        remaining = remaining_seconds(context)
+        if remaining is not None:
+            budget = min(budget, remaining)
+        if budget < MIN_REMOTE_BUDGET_SECONDS or not MODEL_BREAKER.allow():
+            if local is not None:
+                return json_response(local, 200)
+            LOGGER.warning("Remote model skipped (circuit %s, %.2fs left)", MODEL_BREAKER.state, budget)
+            return json_response({"message": "model temporarily unavailable"}, 503)
+        started = time.monotonic()
         try:
-            payload = he.read()
-            parsed = json.loads(payload)
+            status, raw = MODEL_CLIENT.request(
+                "POST", body=data, headers={"Content-Type": "application/json"}, timeout=budget
+            )
         except Exception:
-            parsed = {"error": str(he), "body": payload.decode("utf-8", errors="replace")}
-        LOGGER.exception("Model proxy HTTP error")
-        return json_response({"message": "model proxy error", "detail": parsed}, 502)
+            MODEL_BREAKER.record(False, time.monotonic() - started)
+            if local is None:
+                raise
+            LOGGER.warning("Remote model failed or was slow; answering locally", exc_info=True)
+            return json_response(local, 200)
+        MODEL_BREAKER.record(status < 500, time.monotonic() - started)
+        parsed = _parse(raw)
+        if status >= 500 and local is not None:
+            LOGGER.warning("Remote model error %s; answering locally", status)
+            return json_response(local, 200)
+        if status >= 400:
+            LOGGER.error("Model proxy HTTP error %s", status)
+            return json_response({"message": "model proxy error", "detail": parsed}, 502)
+        if key is not None and 200 <= status < 300:
+            _store(key, status, parsed)
+        return json_response(parsed, status)
     except Exception as exc:  # broad except for robustness
         LOGGER.exception("Model proxy failed")
         return json_response({"message": "model proxy failed", "detail": str(exc)}, 502)
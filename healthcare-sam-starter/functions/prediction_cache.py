@@ -0,0 +1,109 @@
+"""Cache of diabetes-risk predictions keyed by the canonical feature vector.
+
+Patients resubmit the same risk form and the frontend retries on errors, so
+the model sees many identical requests. A request body is canonicalised
+(keys sorted, numbers rounded to ``ROUND_DIGITS`` and integral floats
+written as integers) and hashed into the cache key, so ``{"BMI": 27.50}``
+and ``{"BMI": 27.5}`` hit the same entry. The proxy forwards the canonical
+body, which keeps every cached response consistent with its key.
+
+Lookups go to a per-container LRU first, then to an optional DynamoDB table
+(``PREDICTION_CACHE_TABLE_NAME``) shared by all containers. Both honour the
+same TTL. Table items expire through DynamoDB TTL on ``expiresAt``, which is
+also checked on read because TTL deletion is lazy.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+
+CACHE_TTL_SECONDS = 3600
+CACHE_MAX_ENTRIES = 1024
+ROUND_DIGITS = 2
+
+
+def _canonical_value(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {str(key): _canonical_value(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_canonical_value(item) for item in value]
+    if isinstance(value, bool) or value is None or isinstance(value, str):
+        return value
+    if isinstance(value, (int, float)):
+        if not math.isfinite(value):
+            raise ValueError("non-finite number")
+        number = round(float(value), ROUND_DIGITS)
+        return int(number) if number.is_integer() else number
+    raise ValueError(f"unsupported value: {type(value).__name__}")
+
+
+def canonical_body(payload: Any) -> str:
+    """Compact JSON with sorted keys and rounded numbers; raises ValueError."""
+    return json.dumps(_canonical_value(payload), sort_keys=True, separators=(",", ":"))
+
+
+def cache_key(body: str) -> str:
+    return hashlib.sha256(body.encode("utf-8")).hexdigest()
+
+
+class PredictionCache:
+    """LRU with TTL in front of an optional DynamoDB table.
+
+    Values are ``(status, parsed body)`` pairs; only successful responses
+    should be stored.
+    """
+
+    def __init__(self, table: Any = None, ttl: float = CACHE_TTL_SECONDS, max_entries: int = CACHE_MAX_ENTRIES) -> None:
+        self.table = table
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, Tuple[int, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "tableHits": 0, "misses": 0}
+
+    def _remember(self, key: str, expires: float, value: Tuple[int, Any]) -> None:
+        with self._lock:
+            self._entries[key] = (expires, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, key: str) -> Optional[Tuple[int, Any]]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self.stats["hits"] += 1
+                    return entry[1]
+                del self._entries[key]
+        if self.table is not None:
+            item = self.table.get_item(Key={"cacheKey": key}).get("Item")
+            if item and int(item.get("expiresAt", 0)) > now:
+                value = (int(item["status"]), json.loads(item["response"]))
+                self._remember(key, float(item["expiresAt"]), value)
+                with self._lock:
+                    self.stats["tableHits"] += 1
+                return value
+        with self._lock:
+            self.stats["misses"] += 1
+        return None
+
+    def put(self, key: str, status: int, response: Any) -> None:
+        expires = time.time() + self.ttl
+        self._remember(key, expires, (status, response))
+        if self.table is not None:
+            self.table.put_item(
+                Item={
+                    "cacheKey": key,
+                    "status": status,
+                    "response": json.dumps(response),
+                    "expiresAt": int(expires),
+                }
+            )
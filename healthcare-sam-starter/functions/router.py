@@ -0,0 +1,99 @@
+"""Single entry point that dispatches HTTP API routes to the existing handlers.
+
+Deployed when the template's ``ApiRouting`` parameter is ``router``: one
+function then serves every route in :data:`ROUTES` instead of one function
+per route. Traffic concentrates in fewer containers, so rarely used routes
+(decline, summary, ...) usually land on a warm one. Module-level state
+(boto3 clients, the doctor directory cache, compiled schemas, loaded models)
+is shared across routes.
+
+Handlers are imported on the first request for their route and kept, so a
+cold start costs the router plus the one handler it needs. The route comes
+from ``routeKey`` in the payload (format 2.0). For the ``$default`` route,
+method and path are matched against the route templates and the path
+parameters are filled in.
+"""
+from __future__ import annotations
+
+import importlib
+import logging
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from common import json_response
+
+LOGGER = logging.getLogger(__name__)
+
+# routeKey -> handler module; keep in step with the RouterFunction events in template.yaml.
+ROUTES: Dict[str, str] = {
+    "GET /doctors": "doctors_get.app",
+    "POST /appointments": "appointments_create.app",
+    "GET /appointments/patient": "appointments_get_patient.app",
+    "GET /appointments/doctor": "appointments_get_doctor.app",
+    "POST /appointments/{appointmentId}/confirm": "appointments_confirm.app",
+    "POST /appointments/{appointmentId}/decline": "appointments_decline.app",
+    "POST /appointments/{appointmentId}/cancel": "appointments_cancel.app",
+    "GET /patient/{patientId}/health/index": "patient_health_index_get.app",
+    "POST /patient/{patientId}/health/batch": "patient_health_batch_post.app",
+    "GET /population/health-stats": "population_stats_get.app",
+    "GET /patient-health/{patientId}/latest": "patient_health_summary_get.app",
+}
+
+_HANDLERS: Dict[str, Callable[[Dict[str, Any], Any], Any]] = {}
+
+
+def match_route(method: str, path: str) -> Optional[Tuple[str, Dict[str, str]]]:
+    """Route key and path parameters for a concrete request, or None."""
+    segments = path.strip("/").split("/")
+    for route_key in ROUTES:
+        route_method, template = route_key.split(" ", 1)
+        if route_method != method.upper():
+            continue
+        parts = template.strip("/").split("/")
+        if len(parts) != len(segments):
+            continue
+        params: Dict[str, str] = {}
+        for part, segment in zip(parts, segments):
+            if part.startswith("{") and part.endswith("}"):
+                params[part[1:-1]] = segment
+            elif part != segment:
+                break
+        else:
+            return route_key, params
+    return None
+
+
+def request_path(event: Dict[str, Any]) -> str:
+    """Request path without the stage prefix that ``rawPath`` carries on named stages."""
+    context = event.get("requestContext") or {}
+    path = event.get("rawPath") or (context.get("http") or {}).get("path") or ""
+    stage = context.get("stage") or ""
+    if stage and stage != "$default":
+        prefix = f"/{stage}"
+        if path == prefix or path.startswith(prefix + "/"):
+            path = path[len(prefix):] or "/"
+    return path
+
+
+def resolve(route_key: str) -> Optional[Callable[[Dict[str, Any], Any], Any]]:
+    module_name = ROUTES.get(route_key)
+    if module_name is None:
+        return None
+    handler = _HANDLERS.get(module_name)
+    if handler is None:
+        handler = importlib.import_module(module_name).lambda_handler
+        _HANDLERS[module_name] = handler
+    return handler
+
+
+def lambda_handler(event: Dict[str, Any], context: Any):
+    route_key = event.get("routeKey") or ""
+    if route_key not in ROUTES:
+        http = event.get("requestContext", {}).get("http", {})
+        path = request_path(event)
+        matched = match_route(http.get("method") or "", path)
+        if matched is None:
+            LOGGER.info("no route", extra={"routeKey": route_key, "path": path})
+            return json_response({"message": "route not found"}, 404)
+        route_key, params = matched
+        event = {**event, "routeKey": route_key, "pathParameters": {**params, **(event.get("pathParameters") or {})}}
+    return resolve(route_key)(event, context)
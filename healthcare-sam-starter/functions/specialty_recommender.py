@@ -0,0 +1,139 @@
+"""Recommend a doctor specialty for a free-text complaint.
+
+The vocabulary is in ``models/specialty_keywords.json`` next to this module:
+a list of keywords and short phrases for each specialty. Each specialty is
+treated as one document of terms (unigrams and bigrams of its keywords).
+The term weights are TF-IDF, so a word shared by many specialties ("pain",
+"chest") counts less than one that singles out a specialty ("wheezing").
+Rows are L2-normalised.
+
+The matrix is stored column-wise (CSC): for each term, the specialties that
+use it and their weights. Scoring a complaint gathers the columns for its
+terms and sums them per specialty with :func:`numpy.bincount`. This is a
+sparse matrix-vector product that touches only the terms present in the
+text, so a recommendation takes a few microseconds. The recommender is built
+once per container by :func:`load_recommender`.
+"""
+from __future__ import annotations
+
+import json
+import math
+import os
+import re
+import unicodedata
+from functools import lru_cache
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+KEYWORDS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "models", "specialty_keywords.json")
+# Complaints are truncated to this many characters before scoring.
+MAX_COMPLAINT_LENGTH = 1000
+# Below this cosine score the complaint is too vague to recommend anything.
+MIN_SCORE = 0.1
+
+_TOKEN = re.compile(r"[a-z]+")
+_STOP_WORDS = frozenset(
+    "a an and are at be been but by for from had has have i im in is it its me my of on or so "
+    "the to too very was when with since after before feel feels feeling got get".split()
+)
+# Kept in bigrams, where they carry meaning ("my son"), but not as unigrams.
+_PHRASE_ONLY = frozenset({"my"})
+
+
+def _stem(word: str) -> str:
+    """Fold simple English plurals so "rashes" and "rash" are one term."""
+    if len(word) <= 3 or word.endswith("ss"):
+        return word
+    if word.endswith("ies"):
+        return word[:-3] + "y"
+    if word.endswith(("ches", "shes", "xes", "sses")):
+        return word[:-2]
+    if word.endswith("s"):
+        return word[:-1]
+    return word
+
+
+def terms(text: str) -> List[str]:
+    """Unigrams and bigrams of ``text`` after lowercasing, accent folding and stemming."""
+    folded = unicodedata.normalize("NFKD", text.lower()).encode("ascii", "ignore").decode("ascii")
+    words = [_stem(word) for word in _TOKEN.findall(folded.replace("'s", ""))]
+    kept = [word for word in words if word not in _STOP_WORDS or word in _PHRASE_ONLY]
+    result = [word for word in kept if word not in _PHRASE_ONLY]
+    result.extend(f"{first} {second}" for first, second in zip(kept, kept[1:]))
+    return result
+
+
+class SpecialtyRecommender:
+    def __init__(self, spec: Mapping[str, Any]) -> None:
+        vocabulary = spec["specialties"]
+        self.version = str(spec.get("version", "unknown"))
+        self.specialties: Tuple[str, ...] = tuple(sorted(vocabulary))
+        documents = [self._document(vocabulary[name]) for name in self.specialties]
+
+        self.index: Dict[str, int] = {}
+        for document in documents:
+            for term in document:
+                self.index.setdefault(term, len(self.index))
+        document_frequency = np.zeros(len(self.index), dtype=np.float64)
+        for document in documents:
+            document_frequency[[self.index[term] for term in document]] += 1
+        idf = np.log(len(documents) / document_frequency) + 1.0
+
+        # Dense is tiny here (10 x a few hundred) and only used to build the CSC arrays.
+        dense = np.zeros((len(documents), len(self.index)), dtype=np.float64)
+        for row, document in enumerate(documents):
+            for term, count in document.items():
+                dense[row, self.index[term]] = (1.0 + math.log(count)) * idf[self.index[term]]
+        dense /= np.linalg.norm(dense, axis=1, keepdims=True)
+        self.idf = idf
+
+        rows, columns = np.nonzero(dense.T)
+        self.indptr = np.searchsorted(rows, np.arange(len(self.index) + 1))
+        self.rows = columns.astype(np.intp)
+        self.weights = dense.T[rows, columns]
+
+    @staticmethod
+    def _document(keywords: Sequence[str]) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for keyword in keywords:
+            for term in terms(keyword):
+                counts[term] = counts.get(term, 0) + 1
+        return counts
+
+    def scores(self, text: str) -> np.ndarray:
+        """Cosine similarity of ``text`` to every specialty, in ``specialties`` order."""
+        counts: Dict[int, int] = {}
+        for term in terms(text[:MAX_COMPLAINT_LENGTH]):
+            column = self.index.get(term)
+            if column is not None:
+                counts[column] = counts.get(column, 0) + 1
+        if not counts:
+            return np.zeros(len(self.specialties), dtype=np.float64)
+        columns = np.fromiter(counts, dtype=np.intp, count=len(counts))
+        query = (1.0 + np.log(np.fromiter(counts.values(), dtype=np.float64, count=len(counts)))) * self.idf[columns]
+        query /= np.linalg.norm(query)
+        starts, ends = self.indptr[columns], self.indptr[columns + 1]
+        lengths = ends - starts
+        positions = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        return np.bincount(
+            self.rows[positions], weights=self.weights[positions] * np.repeat(query, lengths), minlength=len(self.specialties)
+        )
+
+    def recommend(self, text: str, k: int = 3) -> List[Tuple[str, float]]:
+        """Up to ``k`` (specialty, score) pairs at or above ``MIN_SCORE``, best first."""
+        scores = self.scores(text)
+        best = np.argsort(-scores, kind="stable")[:k]
+        return [(self.specialties[index], round(float(scores[index]), 3)) for index in best if scores[index] >= MIN_SCORE]
+
+    def recommend_one(self, text: Optional[str]) -> Optional[str]:
+        if not text or not isinstance(text, str):
+            return None
+        ranked = self.recommend(text, k=1)
+        return ranked[0][0] if ranked else None
+
+
+@lru_cache(maxsize=4)
+def load_recommender(path: str = KEYWORDS_PATH) -> SpecialtyRecommender:
+    with open(path, encoding="utf-8") as handle:
+        return SpecialtyRecommender(json.load(handle))
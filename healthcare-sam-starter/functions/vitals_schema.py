@@ -0,0 +1,167 @@
+"""Declarative vitals schema compiled into a single-pass validator.
+
+``VITALS_SCHEMA`` describes each known measurement: its canonical unit, the
+plausible range, whether it is required and which alternative units it is
+accepted in. ``DERIVED_VITALS`` lists values computed from others (BMI) when
+the client does not send them. :func:`compile_vitals_schema` flattens all of
+this into one lookup table and returns a closure that walks a submitted
+vitals object once, converting, range-checking and producing both the plain
+floats (for statistics) and the DynamoDB form (``Decimal``) of the result.
+
+Compile once per container and reuse the validator for every request. The
+booking handler, the bulk ingestion endpoint and ``test_appointment_logic.py``
+all share it.
+"""
+from __future__ import annotations
+
+import math
+from decimal import Decimal
+from typing import Any, Callable, Dict, Mapping, Optional, Tuple
+
+MAX_TEXT_LENGTH = 120
+MAX_EXTRA_FIELDS = 20
+# Vitals take few distinct values (whole centimetres, tenths of a degree), so
+# the float -> Decimal conversions are memoised per validator, up to this many.
+DECIMAL_CACHE_SIZE = 4096
+
+# Ranges are deliberately wider than the booking form's (see
+# assets/constants.js): they reject typos and unit mix-ups, not unusual
+# patients. Aliases map another unit onto the canonical one as
+# ``canonical = value * scale + offset``.
+VITALS_SCHEMA: Dict[str, Dict[str, Any]] = {
+    "heightCm": {
+        "unit": "cm",
+        "required": True,
+        "min": 40.0,
+        "max": 250.0,
+        "aliases": {"heightIn": (2.54, 0.0)},
+    },
+    "weightKg": {
+        "unit": "kg",
+        "required": True,
+        "min": 2.0,
+        "max": 350.0,
+        "aliases": {"weightLb": (0.45359237, 0.0)},
+    },
+    "temperatureC": {
+        "unit": "°C",
+        "required": True,
+        "min": 30.0,
+        "max": 45.0,
+        "aliases": {"temperatureF": (5 / 9, -32 * 5 / 9)},
+    },
+    "bmi": {
+        "unit": "kg/m²",
+        "required": False,
+        "min": 8.0,
+        "max": 100.0,
+    },
+}
+
+
+def compute_bmi(height_cm: float, weight_kg: float) -> Optional[float]:
+    meters = height_cm / 100
+    if meters <= 0:
+        return None
+    return round(weight_kg / (meters * meters), 1)
+
+
+# name -> (function, input fields). Only filled in when the client did not
+# send the value itself. A derived value is range-checked like a submitted one,
+# so an implausible height/weight pair is rejected.
+DERIVED_VITALS: Dict[str, Tuple[Callable[..., Optional[float]], Tuple[str, ...]]] = {
+    "bmi": (compute_bmi, ("heightCm", "weightKg")),
+}
+
+Validator = Callable[[Any], Tuple[Dict[str, Any], Dict[str, Any]]]
+
+
+def _describe(value: float) -> str:
+    return f"{value:g}"
+
+
+def compile_vitals_schema(
+    schema: Mapping[str, Mapping[str, Any]] = VITALS_SCHEMA,
+    derived: Mapping[str, Tuple[Callable[..., Optional[float]], Tuple[str, ...]]] = DERIVED_VITALS,
+) -> Validator:
+    # One entry per accepted key: (canonical name, scale, offset, min, max, message).
+    fields: Dict[str, Tuple[str, float, float, float, float, str]] = {}
+    for name, spec in schema.items():
+        low = float(spec.get("min", -math.inf))
+        high = float(spec.get("max", math.inf))
+        message = f"{name} must be between {_describe(low)} and {_describe(high)} {spec.get('unit', '')}".rstrip()
+        fields[name] = (name, 1.0, 0.0, low, high, message)
+        for alias, (scale, offset) in (spec.get("aliases") or {}).items():
+            fields[alias] = (name, float(scale), float(offset), low, high, message)
+    required = tuple(name for name, spec in schema.items() if spec.get("required"))
+    derivations = tuple(
+        (name, function, inputs, fields.get(name)) for name, (function, inputs) in derived.items()
+    )
+    decimals: Dict[float, Decimal] = {}
+
+    def to_decimal(number: float) -> Decimal:
+        result = decimals.get(number)
+        if result is None:
+            result = Decimal(str(number))
+            if len(decimals) < DECIMAL_CACHE_SIZE:
+                decimals[number] = result
+        return result
+
+    def validate(vitals: Any) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        if not isinstance(vitals, dict):
+            raise ValueError("vitals must be an object")
+        plain: Dict[str, Any] = {}
+        stored: Dict[str, Any] = {}
+        extras = 0
+        for key, value in vitals.items():
+            field = fields.get(key)
+            if field is None:
+                # Unknown keys are kept as free-form extras, as before.
+                if isinstance(value, bool) or extras >= MAX_EXTRA_FIELDS:
+                    continue
+                if isinstance(value, (int, float)):
+                    if not math.isfinite(value):
+                        continue
+                    plain[key] = float(value)
+                    stored[key] = to_decimal(plain[key])
+                elif isinstance(value, str):
+                    plain[key] = stored[key] = value[:MAX_TEXT_LENGTH]
+                else:
+                    continue
+                extras += 1
+                continue
+            if value is None:
+                continue
+            name, scale, offset, low, high, message = field
+            if isinstance(value, bool):
+                raise ValueError(f"Invalid numeric value for {key}")
+            try:
+                number = float(value)
+            except (TypeError, ValueError) as exc:
+                raise ValueError(f"Invalid numeric value for {key}") from exc
+            if scale != 1.0 or offset:
+                number = round(number * scale + offset, 2)
+            if not low <= number <= high:
+                raise ValueError(message)
+            plain[name] = number
+            stored[name] = to_decimal(number)
+
+        for name in required:
+            if name not in plain:
+                raise ValueError(f"Missing vital: {name}")
+
+        for name, function, inputs, field in derivations:
+            if name in plain:
+                continue
+            try:
+                value = function(*(plain[field] for field in inputs))
+            except (KeyError, TypeError, ZeroDivisionError):
+                continue
+            if value is not None and field is not None and not field[3] <= value <= field[4]:
+                raise ValueError(f"{field[5]} (computed from {' and '.join(inputs)})")
+            if value is not None:
+                plain[name] = value
+                stored[name] = to_decimal(value)
+        return plain, stored
+
+    return validate
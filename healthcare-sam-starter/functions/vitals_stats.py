@@ -0,0 +1,163 @@
+"""Running per-metric statistics for a patient's vitals.
+
+Each metric keeps a count, mean and sum of squared deviations (Welford), the
+min/max, the most recent readings and an exponentially weighted mean and
+variance, so a rollup can be updated in O(1) per reading and summarised
+without touching the history. The EWMA state also drives anomaly detection:
+a new reading is scored against the baseline *before* it is folded in.
+Plain floats in, plain floats out; conversion to DynamoDB types happens in
+``common.py``.
+"""
+from __future__ import annotations
+
+import math
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+RECENT_READINGS = 10
+
+EWMA_ALPHA = 0.2
+ANOMALY_Z = 3.0
+ANOMALY_MIN_READINGS = 5
+# Metrics watched for sudden moves, with a floor on the baseline standard
+# deviation so a perfectly stable history does not flag measurement noise.
+ANOMALY_METRICS = {
+    "temperatureC": 0.3,
+    "bmi": 0.5,
+}
+
+
+def numeric_metrics(metrics: Dict[str, Any]) -> Dict[str, float]:
+    """Numeric entries of a metrics map (Decimal, int or float; bools excluded)."""
+    result: Dict[str, float] = {}
+    for name, value in (metrics or {}).items():
+        if isinstance(value, (bool, str)) or value is None:
+            continue
+        try:
+            number = float(value)
+        except (TypeError, ValueError):
+            continue
+        if math.isfinite(number):
+            result[name] = number
+    return result
+
+
+def welford_update(
+    stats: Optional[Dict[str, Any]], value: float, at: Optional[str] = None, latest: bool = True
+) -> Dict[str, Any]:
+    """Fold one reading into a metric's running statistics.
+
+    A reading older than ones already folded in (``latest=False``) only
+    enters the count, mean, variance and range; ``recent`` and the EWMA
+    follow the readings in time order.
+    """
+    stats = dict(stats or {})
+    count = int(stats.get("n", 0)) + 1
+    mean = float(stats.get("mean", 0.0))
+    delta = value - mean
+    mean += delta / count
+    stats["n"] = count
+    stats["mean"] = mean
+    stats["m2"] = float(stats.get("m2", 0.0)) + delta * (value - mean)
+    stats["min"] = value if count == 1 else min(float(stats["min"]), value)
+    stats["max"] = value if count == 1 else max(float(stats["max"]), value)
+    if not latest and count > 1:
+        return stats
+    recent = list(stats.get("recent") or [])
+    recent.append({"t": at, "v": value})
+    stats["recent"] = recent[-RECENT_READINGS:]
+
+    if count == 1:
+        stats["ewma"], stats["ewmv"] = value, 0.0
+    else:
+        ewma, ewmv = ewma_baseline(stats, count - 1)
+        diff = value - ewma
+        increment = EWMA_ALPHA * diff
+        stats["ewma"] = ewma + increment
+        stats["ewmv"] = (1 - EWMA_ALPHA) * (ewmv + diff * increment)
+    return stats
+
+
+def ewma_baseline(stats: Dict[str, Any], count: int) -> Tuple[float, float]:
+    """EWMA mean and variance; rollups written before EWMA existed seed from Welford."""
+    if "ewma" in stats:
+        return float(stats["ewma"]), float(stats.get("ewmv", 0.0))
+    return float(stats.get("mean", 0.0)), float(stats.get("m2", 0.0)) / max(count, 1)
+
+
+def score_reading(name: str, stats: Optional[Dict[str, Any]], value: float) -> Optional[Dict[str, Any]]:
+    """Anomaly for ``value`` against the metric's baseline, or None."""
+    floor = ANOMALY_METRICS.get(name)
+    count = int((stats or {}).get("n", 0))
+    if floor is None or count < ANOMALY_MIN_READINGS:
+        return None
+    ewma, ewmv = ewma_baseline(stats, count)
+    z_score = (value - ewma) / max(math.sqrt(max(ewmv, 0.0)), floor)
+    if abs(z_score) < ANOMALY_Z:
+        return None
+    return {"metric": name, "value": value, "baseline": round(ewma, 2), "z": round(z_score, 2)}
+
+
+def welford_remove(stats: Dict[str, Any], value: float) -> Optional[Dict[str, Any]]:
+    """Take one reading back out of a metric's count, mean and variance.
+
+    Returns None when no reading is left. The range, ``recent`` and the EWMA
+    are left as they are; they cannot be reversed, so callers refold the
+    history when the reading could have shaped them.
+    """
+    count = int(stats.get("n", 0)) - 1
+    if count <= 0:
+        return None
+    mean = float(stats.get("mean", 0.0))
+    remaining_mean = mean + (mean - value) / count
+    stats = dict(stats)
+    stats["n"] = count
+    stats["mean"] = remaining_mean
+    stats["m2"] = max(float(stats.get("m2", 0.0)) - (value - mean) * (value - remaining_mean), 0.0)
+    return stats
+
+
+def fold_readings(
+    rollup: Optional[Dict[str, Dict[str, Any]]],
+    readings: Iterable[Tuple[Optional[str], Dict[str, Any]]],
+    after: Optional[str] = None,
+) -> Tuple[Dict[str, Dict[str, Any]], List[Dict[str, Any]]]:
+    """Fold ``(timestamp, metrics)`` readings, oldest first, into a rollup map.
+
+    Readings timestamped at or before ``after`` (the newest reading already
+    in the rollup) are backfill: they are counted, but neither scored nor
+    added to ``recent`` and the EWMA. Returns the new map and the anomalies
+    found along the way.
+    """
+    metrics = {name: dict(stats) for name, stats in (rollup or {}).items()}
+    anomalies: List[Dict[str, Any]] = []
+    for at, reading in readings:
+        latest = not (after and at and at <= after)
+        for name, value in numeric_metrics(reading).items():
+            anomaly = score_reading(name, metrics.get(name), value) if latest else None
+            if anomaly:
+                anomaly["t"] = at
+                anomalies.append(anomaly)
+            metrics[name] = welford_update(metrics.get(name), value, at, latest)
+    return metrics, anomalies
+
+
+def update_rollup(
+    rollup: Optional[Dict[str, Dict[str, Any]]],
+    readings: Iterable[Tuple[Optional[str], Dict[str, Any]]],
+) -> Dict[str, Dict[str, Any]]:
+    return fold_readings(rollup, readings)[0]
+
+
+def summarise(stats: Dict[str, Any]) -> Dict[str, Any]:
+    """Response shape for one metric: count, mean, sample stddev, range, recent."""
+    count = int(stats.get("n", 0))
+    variance = float(stats.get("m2", 0.0)) / (count - 1) if count > 1 else 0.0
+    return {
+        "count": count,
+        "mean": round(float(stats.get("mean", 0.0)), 3),
+        "stddev": round(math.sqrt(variance), 3),
+        "min": float(stats["min"]) if count else None,
+        "max": float(stats["max"]) if count else None,
+        "ewma": round(ewma_baseline(stats, count)[0], 3) if count else None,
+        "recent": [{"t": entry.get("t"), "v": float(entry.get("v"))} for entry in stats.get("recent") or []],
+    }
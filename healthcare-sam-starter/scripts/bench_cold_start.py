@@ -0,0 +1,151 @@
+"""Compare cold starts of per-route functions with the single router function.
+
+First the init cost of each handler is measured: the time to import its
+module in a fresh interpreter (median of ``--samples`` runs). For the router,
+this is the router import plus the extra import of the route's handler.
+Importing a handler after the router usually costs less, because common.py,
+boto3 and numpy are already loaded. The estimate below is conservative: it
+charges every handler as if it were the first one imported.
+
+Then a day of traffic is simulated with those costs. Requests arrive as a
+Poisson process at ``--rate`` per minute, spread over the routes by
+``TRAFFIC_MIX``. A container serves one request at a time and is reclaimed
+after ``--idle-minutes`` without traffic. Both deployments see the same
+requests, and the script reports how many requests paid an init and how much
+init time was spent in total, overall and on the rarely used routes.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import statistics
+import subprocess
+import sys
+from typing import Dict, List
+
+FUNCTIONS_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "functions"))
+
+# Share of requests per route; the booking flow dominates.
+TRAFFIC_MIX = {
+    "GET /doctors": 0.25,
+    "POST /appointments": 0.12,
+    "GET /appointments/patient": 0.20,
+    "GET /appointments/doctor": 0.20,
+    "POST /appointments/{appointmentId}/confirm": 0.08,
+    "POST /appointments/{appointmentId}/decline": 0.01,
+    "POST /appointments/{appointmentId}/cancel": 0.03,
+    "GET /patient/{patientId}/health/index": 0.05,
+    "POST /patient/{patientId}/health/batch": 0.01,
+    "GET /population/health-stats": 0.02,
+    "GET /patient-health/{patientId}/latest": 0.03,
+}
+RARE_SHARE = 0.02
+ROUTER = "router"
+ENV = {
+    "AWS_DEFAULT_REGION": "eu-west-3",
+    "USERS_TABLE_NAME": "users",
+    "APPOINTMENTS_TABLE_NAME": "appointments",
+    "PATIENT_HEALTH_INDEX_TABLE_NAME": "health-index",
+}
+PROBE = """
+import importlib, sys, time
+sys.path.insert(0, {functions!r})
+for name in {untimed!r}:
+    importlib.import_module(name)
+started = time.perf_counter()
+importlib.import_module({timed!r})
+print(time.perf_counter() - started)
+"""
+
+
+def import_seconds(module: str, after: List[str], samples: int) -> float:
+    timings = []
+    for _ in range(samples):
+        code = PROBE.format(functions=FUNCTIONS_DIR, untimed=after, timed=module)
+        output = subprocess.run([sys.executable, "-c", code], env=os.environ, check=True, capture_output=True, text=True)
+        timings.append(float(output.stdout.strip().splitlines()[-1]))
+    return statistics.median(timings)
+
+
+class Container:
+    def __init__(self) -> None:
+        self.busy_until = 0.0
+        self.last_used = 0.0
+        self.loaded: set = set()
+
+
+def simulate(requests: List[tuple], init: Dict[str, float], router_init: float, router_mode: bool, args) -> Dict[str, Dict[str, float]]:
+    idle = args.idle_minutes * 60.0
+    duration = args.duration_ms / 1e3
+    pools: Dict[str, List[Container]] = {}
+    totals: Dict[str, Dict[str, float]] = {route: {"requests": 0, "inits": 0, "initSeconds": 0.0} for route in init}
+    for arrival, route in requests:
+        function = ROUTER if router_mode else route
+        pool = [c for c in pools.get(function, []) if arrival - c.last_used < idle or c.busy_until > arrival]
+        container = next((c for c in pool if c.busy_until <= arrival), None)
+        cost = 0.0
+        if container is None:
+            container = Container()
+            pool.append(container)
+            cost += router_init if router_mode else 0.0
+        if route not in container.loaded:
+            container.loaded.add(route)
+            cost += init[route]
+        pools[function] = pool
+        container.busy_until = arrival + cost + duration
+        container.last_used = container.busy_until
+        stats = totals[route]
+        stats["requests"] += 1
+        stats["inits"] += cost > 0
+        stats["initSeconds"] += cost
+    return totals
+
+
+def report(name: str, totals: Dict[str, Dict[str, float]]) -> None:
+    def line(label: str, routes: List[str]) -> str:
+        requests = sum(totals[route]["requests"] for route in routes)
+        inits = sum(totals[route]["inits"] for route in routes)
+        seconds = sum(totals[route]["initSeconds"] for route in routes)
+        return f"{label}: {inits:.0f}/{requests:.0f} requests paid an init ({inits / max(requests, 1):.1%}), {seconds:.1f} s init"
+
+    rare = [route for route, share in TRAFFIC_MIX.items() if share <= RARE_SHARE]
+    print(f"{name:>9}  {line('all', list(totals))}")
+    print(f"{'':>9}  {line('rare routes', rare)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rate", type=float, default=5.0, help="Requests per minute, all routes together")
+    parser.add_argument("--hours", type=float, default=24.0)
+    parser.add_argument("--idle-minutes", type=float, default=10.0, help="Idle time before a container is reclaimed")
+    parser.add_argument("--duration-ms", type=float, default=80.0, help="Handler time per request once warm")
+    parser.add_argument("--samples", type=int, default=3, help="Fresh interpreters per import measurement")
+    parser.add_argument("--seed", type=int, default=3)
+    args = parser.parse_args()
+
+    for key, value in ENV.items():
+        os.environ.setdefault(key, value)
+    sys.path.append(FUNCTIONS_DIR)
+    from router import ROUTES  # noqa: E402 - common.py needs the table names set above
+
+    per_route = {route: import_seconds(module, [], args.samples) for route, module in ROUTES.items()}
+    router_init = import_seconds("router", [], args.samples)
+    incremental = {route: import_seconds(module, ["router"], args.samples) for route, module in ROUTES.items()}
+    print("init per route (ms): separate function / inside a warm router")
+    for route in ROUTES:
+        print(f"  {route:<45} {per_route[route] * 1e3:7.1f} / {incremental[route] * 1e3:7.1f}")
+    print(f"  {'router itself':<45} {router_init * 1e3:7.1f}")
+
+    rng = random.Random(args.seed)
+    routes, weights = zip(*TRAFFIC_MIX.items())
+    now, end, traffic = 0.0, args.hours * 3600.0, []
+    while True:
+        now += rng.expovariate(args.rate / 60.0)
+        if now >= end:
+            break
+        traffic.append((now, rng.choices(routes, weights)[0]))
+
+    print(f"\n{len(traffic)} requests over {args.hours:g} h, containers reclaimed after {args.idle_minutes:g} min idle")
+    report("per-route", simulate(traffic, per_route, 0.0, False, args))
+    report("router", simulate(traffic, incremental, router_init, True, args))
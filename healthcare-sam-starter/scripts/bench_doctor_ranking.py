@@ -0,0 +1,89 @@
+"""Time doctor ranking over a synthetic directory.
+
+Builds ``--doctors`` doctors with ``--slots`` published hourly slots each, a
+share of them already booked, and compares :func:`rank_doctors` with a plain
+Python loop that scores every doctor and sorts the full list. Both must
+return the same top ``--k``.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+FUNCTIONS_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "functions"))
+if FUNCTIONS_DIR not in sys.path:
+    sys.path.append(FUNCTIONS_DIR)
+
+from doctor_ranking import SLOT_HORIZON_HOURS, WEIGHTS, rank_doctors  # noqa: E402
+
+CITIES = ["Paris", "Lyon", "Marseille", "Toulouse", "Nice"]
+
+
+def synthetic(doctors: int, slots: int, booked_share: float, seed: int) -> tuple:
+    rng = random.Random(seed)
+    start = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+    directory, bookings = [], {}
+    for index in range(doctors):
+        offset = rng.randrange(0, 96)
+        avail = [(start + timedelta(hours=offset + hour)).isoformat().replace("+00:00", "Z") for hour in range(slots)]
+        taken = {slot for slot in avail if rng.random() < booked_share}
+        directory.append(
+            {"userId": f"doctor{index}", "doctorProfile": {"city": rng.choice(CITIES), "availSlots": avail}}
+        )
+        bookings[f"doctor{index}"] = (taken, rng.randrange(0, 6))
+    return directory, bookings
+
+
+def rank_loop(directory, bookings, now_epoch: float, city: str, k: int) -> list:
+    scored = []
+    for doctor in directory:
+        taken, pending = bookings[doctor["userId"]]
+        free = [
+            datetime.fromisoformat(slot.replace("Z", "+00:00")).timestamp()
+            for slot in doctor["doctorProfile"]["availSlots"]
+            if slot not in taken
+        ]
+        free = [moment for moment in free if moment > now_epoch]
+        hours = (min(free) - now_epoch) / 3600.0 if free else SLOT_HORIZON_HOURS
+        score = (
+            WEIGHTS["slot"] * min(max(1.0 - hours / SLOT_HORIZON_HOURS, 0.0), 1.0)
+            + WEIGHTS["queue"] / (1.0 + pending)
+            + WEIGHTS["city"] * (doctor["doctorProfile"]["city"] == city)
+        )
+        # Fully booked doctors go after every bookable one.
+        scored.append((bool(free), score, doctor["userId"]))
+    scored.sort(key=lambda entry: (not entry[0], -entry[1]))
+    return [user_id for _, _, user_id in scored[:k]]
+
+
+def timed(call, rounds: int) -> tuple:
+    started = time.perf_counter()
+    for _ in range(rounds):
+        result = call()
+    return result, (time.perf_counter() - started) / rounds
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--doctors", type=int, default=500)
+    parser.add_argument("--slots", type=int, default=40)
+    parser.add_argument("--booked-share", type=float, default=0.3)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=5)
+    args = parser.parse_args()
+
+    directory, bookings = synthetic(args.doctors, args.slots, args.booked_share, args.seed)
+    now_epoch = time.time()
+    ranked, vectorized = timed(lambda: rank_doctors(directory, bookings, now_epoch, city="Paris", k=args.k), args.rounds)
+    looped, loop = timed(lambda: rank_loop(directory, bookings, now_epoch, "Paris", args.k), args.rounds)
+    matches = [doctor["userId"] for doctor in ranked] == looped
+    print(f"{args.doctors} doctors x {args.slots} slots, top {args.k}")
+    print(f"vectorized + heap: {vectorized * 1e3:7.2f} ms")
+    print(f"loop + full sort:  {loop * 1e3:7.2f} ms  ({loop / vectorized:.1f}x slower)")
+    print(f"same top {args.k}: {'yes' if matches else 'NO'}")
+    sys.exit(0 if matches else 1)
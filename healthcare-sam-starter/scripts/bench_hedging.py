@@ -0,0 +1,106 @@
+"""Measure request hedging against a local model stand-in with injected latency jitter.
+
+The server answers most requests after ``--base-ms`` but a ``--slow-share``
+of them only after ``--slow-ms``, like an endpoint with a long tail (GC
+pauses, cold workers). The same request sequence is sent through the plain
+pool and through the hedged client. The script reports p50/p95/p99 latency
+and how many extra requests hedging cost.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, List
+
+FUNCTIONS_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "functions"))
+if FUNCTIONS_DIR not in sys.path:
+    sys.path.append(FUNCTIONS_DIR)
+
+from hedging import HedgedClient  # noqa: E402
+from http_pool import ConnectionPool  # noqa: E402
+
+RESPONSE = json.dumps({"probability": 0.27}).encode("utf-8")
+FEATURES = json.dumps({"features": {"BMI": 27.5, "HighBP": 1, "Age": 7}}).encode("utf-8")
+
+
+def start_server(base: float, slow: float, slow_share: float, seed: int) -> tuple:
+    rng = random.Random(seed)
+    lock = threading.Lock()
+    served = [0]
+
+    class JitterHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def do_POST(self) -> None:  # noqa: N802 - http.server naming
+            self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            with lock:
+                served[0] += 1
+                delay = slow if rng.random() < slow_share else base
+            time.sleep(delay * rng.uniform(0.8, 1.2))
+            try:
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(RESPONSE)))
+                self.end_headers()
+                self.wfile.write(RESPONSE)
+            except OSError:
+                # The client cancelled this (hedged) request.
+                self.close_connection = True
+
+        def log_message(self, *_args) -> None:
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), JitterHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/predict", served
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+def measure(name: str, call: Callable[[], None], requests: int) -> List[float]:
+    timings = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        call()
+        timings.append(time.perf_counter() - started)
+    print(
+        f"{name:>7}: p50 {percentile(timings, 0.5) * 1e3:7.1f} ms  p95 {percentile(timings, 0.95) * 1e3:7.1f} ms"
+        f"  p99 {percentile(timings, 0.99) * 1e3:7.1f} ms"
+    )
+    return timings
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--base-ms", type=float, default=5.0)
+    parser.add_argument("--slow-ms", type=float, default=150.0)
+    parser.add_argument("--slow-share", type=float, default=0.03)
+    parser.add_argument("--seed", type=int, default=11)
+    args = parser.parse_args()
+
+    headers = {"Content-Type": "application/json"}
+    server, url, served = start_server(args.base_ms / 1e3, args.slow_ms / 1e3, args.slow_share, args.seed)
+    pool = ConnectionPool(url, timeout=5)
+    measure("plain", lambda: pool.request("POST", body=FEATURES, headers=headers), args.requests)
+    plain_served = served[0]
+
+    hedged = HedgedClient(ConnectionPool(url, timeout=5))
+    measure("hedged", lambda: hedged.request("POST", body=FEATURES, headers=headers, timeout=5), args.requests)
+    delay = hedged.hedge_delay()
+    print(
+        f"hedge delay {delay * 1e3 if delay else 0:.1f} ms; hedged {hedged.stats['hedged']} of {args.requests} requests"
+        f" ({hedged.stats['hedgeWins']} won), server load +{(served[0] - plain_served) / args.requests - 1:.1%}"
+    )
+    server.shutdown()
@@ -0,0 +1,120 @@
+"""Compare per-request latency of urlopen with the keep-alive pool used by predict_proxy.
+
+A local HTTP/1.1 server stands in for the model endpoint and answers every
+POST with a fixed prediction. ``urlopen`` (the proxy's previous client)
+opens a new connection per request; the pool reuses one. Pass
+``--certfile``/``--keyfile`` to serve TLS, where the handshake the pool
+saves is much larger than the TCP connect alone.
+
+The last phase checks reconnection: the server drops idle connections after
+``--server-idle`` seconds and the client pauses past that between requests,
+so every request after the first finds a stale pooled socket.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import ssl
+import statistics
+import sys
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, List
+
+FUNCTIONS_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "functions"))
+if FUNCTIONS_DIR not in sys.path:
+    sys.path.append(FUNCTIONS_DIR)
+
+from http_pool import ConnectionPool  # noqa: E402
+
+RESPONSE = json.dumps({"probability": 0.27}).encode("utf-8")
+FEATURES = json.dumps({"features": {"BMI": 27.5, "HighBP": 1, "HighChol": 0, "GenHlth": 3, "Age": 7}}).encode("utf-8")
+
+
+class ModelHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; with Nagle on, a
+    # keep-alive client waits for the delayed ACK on every response.
+    disable_nagle_algorithm = True
+
+    def do_POST(self) -> None:  # noqa: N802 - http.server naming
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(RESPONSE)))
+        self.end_headers()
+        self.wfile.write(RESPONSE)
+
+    def log_message(self, *_args) -> None:
+        pass
+
+
+def start_server(certfile: str | None, keyfile: str | None, idle_timeout: float | None) -> tuple:
+    handler = type("Handler", (ModelHandler,), {"timeout": idle_timeout})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    scheme = "http"
+    if certfile:
+        context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        context.load_cert_chain(certfile, keyfile)
+        server.socket = context.wrap_socket(server.socket, server_side=True)
+        scheme = "https"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"{scheme}://127.0.0.1:{server.server_address[1]}/predict"
+
+
+def measure(name: str, call: Callable[[], None], requests: int, pause: float = 0.0) -> List[float]:
+    timings = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        call()
+        timings.append(time.perf_counter() - started)
+        if pause:
+            time.sleep(pause)
+    ordered = sorted(timings)
+    p95 = ordered[int(0.95 * (len(ordered) - 1))]
+    print(f"{name:>8}: mean {statistics.fmean(timings) * 1e3:7.3f} ms  p95 {p95 * 1e3:7.3f} ms")
+    return timings
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--certfile", help="Serve TLS with this certificate (self-signed is fine)")
+    parser.add_argument("--keyfile")
+    parser.add_argument("--server-idle", type=float, default=0.2, help="Idle timeout for the reconnect phase")
+    args = parser.parse_args()
+
+    context = ssl._create_unverified_context() if args.certfile else None  # pylint: disable=protected-access
+    server, url = start_server(args.certfile, args.keyfile, None)
+
+    def with_urlopen() -> None:
+        request = urllib.request.Request(url, data=FEATURES, method="POST")
+        request.add_header("Content-Type", "application/json")
+        with urllib.request.urlopen(request, timeout=15, context=context) as response:
+            response.read()
+
+    pool = ConnectionPool(url, timeout=15)
+    if context is not None:
+        pool.ssl_context = context
+
+    def with_pool() -> None:
+        status, _ = pool.request("POST", body=FEATURES, headers={"Content-Type": "application/json"})
+        assert status == 200
+
+    before = measure("urlopen", with_urlopen, args.requests)
+    after = measure("pool", with_pool, args.requests)
+    print(f"speed-up: {statistics.fmean(before) / statistics.fmean(after):.2f}x  pool stats: {pool.stats}")
+    pool.close()
+    server.shutdown()
+
+    server, url = start_server(args.certfile, args.keyfile, args.server_idle)
+    pool = ConnectionPool(url, timeout=15)
+    if context is not None:
+        pool.ssl_context = context
+    measure("stale", with_pool, 10, pause=args.server_idle * 2)
+    print(f"reconnect phase: 10/10 requests succeeded, pool stats: {pool.stats}")
+    server.shutdown()
@@ -0,0 +1,69 @@
+"""Check specialty recommendations on labelled complaints and time them.
+
+Every complaint below should be routed to its labelled specialty (or to no
+recommendation when the label is None). The script prints any misses and
+the mean time per recommendation over ``--rounds`` passes.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+
+FUNCTIONS_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "functions"))
+if FUNCTIONS_DIR not in sys.path:
+    sys.path.append(FUNCTIONS_DIR)
+
+from specialty_recommender import load_recommender  # noqa: E402
+
+LABELLED = [
+    ("I have chest pain and my heart is racing", "Cardiology"),
+    ("Palpitations and my blood pressure is high", "Cardiology"),
+    ("itchy rashes on my arms", "Dermatology"),
+    ("acne that won't go away", "Dermatology"),
+    ("sore throat and an earache", "ENT"),
+    ("ringing in my ears and blocked nose", "ENT"),
+    ("stomach cramps and diarrhea", "Gastroenterology"),
+    ("heartburn and bloating after meals", "Gastroenterology"),
+    ("fever and chills for two days", "General Medicine"),
+    ("terrible migraines and dizziness", "Neurology"),
+    ("numbness and tingling in my hands", "Neurology"),
+    ("blurry vision in my left eye", "Ophthalmology"),
+    ("my eyes are red and watery", "Ophthalmology"),
+    ("knee pain after running", "Orthopedics"),
+    ("sprained my ankle playing football", "Orthopedics"),
+    ("my daughter has a rash and won't eat", "Pediatrics"),
+    ("baby is teething and irritable", "Pediatrics"),
+    ("persistent cough and wheezing at night", "Pulmonology"),
+    ("shortness of breath and asthma", "Pulmonology"),
+    ("hello", None),
+    ("", None),
+]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=2000)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    load_recommender()
+    print(f"index built in {(time.perf_counter() - started) * 1e3:.2f} ms")
+    recommender = load_recommender()
+
+    misses = 0
+    for complaint, expected in LABELLED:
+        got = recommender.recommend_one(complaint)
+        if got != expected:
+            misses += 1
+            print(f"miss: {complaint!r}: expected {expected}, got {recommender.recommend(complaint)}")
+    print(f"{len(LABELLED) - misses}/{len(LABELLED)} complaints routed as labelled")
+
+    started = time.perf_counter()
+    for _ in range(args.rounds):
+        for complaint, _ in LABELLED:
+            recommender.recommend(complaint)
+    elapsed = time.perf_counter() - started
+    print(f"{elapsed / (args.rounds * len(LABELLED)) * 1e6:.1f} us per recommendation")
+    sys.exit(1 if misses else 0)
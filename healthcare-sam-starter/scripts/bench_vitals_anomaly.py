@@ -0,0 +1,71 @@
+"""Benchmark the incremental vitals anomaly detector on synthetic readings.
+
+Readings for many patients are generated with a stable per-patient baseline
+plus noise, and a small fraction get an injected temperature or BMI jump.
+Every reading goes through ``vitals_stats.fold_readings`` exactly as a
+booking does (score against the rollup, then fold in), so the throughput is
+the per-reading cost of the write path, and precision/recall show how well
+the EWMA z-score separates the injected jumps from noise.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import sys
+import time
+
+FUNCTIONS_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "functions"))
+if FUNCTIONS_DIR not in sys.path:
+    sys.path.append(FUNCTIONS_DIR)
+
+from vitals_stats import fold_readings  # noqa: E402
+
+
+def run(readings: int, patients: int, spike_rate: float, seed: int) -> None:
+    rng = random.Random(seed)
+    baselines = [(rng.gauss(36.7, 0.2), rng.gauss(25.0, 4.0)) for _ in range(patients)]
+    rollups = [None] * patients
+    seen = [0] * patients
+    injected = flagged = true_positives = 0
+
+    started = time.perf_counter()
+    for index in range(readings):
+        patient = index % patients
+        temperature, bmi = baselines[patient]
+        metrics = {
+            "temperatureC": rng.gauss(temperature, 0.15),
+            "bmi": rng.gauss(bmi, 0.2),
+        }
+        # Only spike once the detector has a baseline to compare against.
+        spiked = seen[patient] >= 10 and rng.random() < spike_rate
+        if spiked:
+            if rng.random() < 0.5:
+                metrics["temperatureC"] += rng.choice((-1, 1)) * rng.uniform(2.0, 3.5)
+            else:
+                metrics["bmi"] += rng.choice((-1, 1)) * rng.uniform(3.0, 6.0)
+            injected += 1
+        rollups[patient], anomalies = fold_readings(rollups[patient], [(None, metrics)])
+        seen[patient] += 1
+        if anomalies:
+            flagged += 1
+            true_positives += spiked
+    elapsed = time.perf_counter() - started
+
+    precision = true_positives / flagged if flagged else 1.0
+    recall = true_positives / injected if injected else 1.0
+    print(
+        f"{readings:,} readings for {patients:,} patients in {elapsed:.2f}s "
+        f"({readings / elapsed:,.0f} readings/s, {elapsed / readings * 1e6:.2f} us/reading)"
+    )
+    print(f"injected {injected:,} jumps, flagged {flagged:,}: precision {precision:.3f}, recall {recall:.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--readings", type=int, default=2_000_000, help="Total synthetic readings")
+    parser.add_argument("--patients", type=int, default=10_000, help="Number of synthetic patients")
+    parser.add_argument("--spike-rate", type=float, default=0.002, help="Fraction of readings with a jump")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    run(args.readings, args.patients, args.spike_rate, args.seed)
@@ -0,0 +1,101 @@
+"""Compare the compiled vitals validator with the previous sanitize_vitals path.
+
+The legacy path is reproduced here as it was in ``appointments_create``: a
+loop over the mandatory fields, a second loop over every key, the BMI
+computation and then a separate ``Decimal(str(v))`` pass for DynamoDB. The
+compiled path does all of that (plus range checks and unit aliases) in one
+walk over the payload.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+from decimal import Decimal
+from typing import Any, Callable, Dict, List
+
+FUNCTIONS_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "functions"))
+if FUNCTIONS_DIR not in sys.path:
+    sys.path.append(FUNCTIONS_DIR)
+
+from vitals_schema import compile_vitals_schema  # noqa: E402
+
+LEGACY_MANDATORY_FIELDS = {"heightCm", "weightKg", "temperatureC"}
+
+
+def legacy_compute_bmi(height_cm: float, weight_kg: float) -> float | None:
+    try:
+        meters = float(height_cm) / 100
+        weight = float(weight_kg)
+        if meters <= 0:
+            return None
+        return round(weight / (meters * meters), 1)
+    except (TypeError, ValueError, ZeroDivisionError):
+        return None
+
+
+def legacy_sanitize(vitals: Dict[str, Any]):
+    if not isinstance(vitals, dict):
+        raise ValueError("vitals must be an object")
+    summary: Dict[str, Any] = {}
+    for field in LEGACY_MANDATORY_FIELDS:
+        value = vitals.get(field)
+        if value is None:
+            raise ValueError(f"Missing vital: {field}")
+        try:
+            summary[field] = float(value)
+        except (TypeError, ValueError) as exc:
+            raise ValueError(f"Invalid numeric value for {field}") from exc
+    for key, value in vitals.items():
+        if key in summary:
+            continue
+        if isinstance(value, (int, float)):
+            summary[key] = float(value)
+        elif isinstance(value, str):
+            summary[key] = value[:120]
+    if summary.get("bmi") is None:
+        computed = legacy_compute_bmi(summary["heightCm"], summary["weightKg"])
+        if computed is not None:
+            summary["bmi"] = computed
+    stored = {k: Decimal(str(v)) if isinstance(v, (int, float)) else v for k, v in summary.items()}
+    return summary, stored
+
+
+def payloads(count: int) -> List[Dict[str, Any]]:
+    result = []
+    for index in range(count):
+        vitals: Dict[str, Any] = {
+            "heightCm": 150 + index % 50,
+            "weightKg": 50 + (index % 70) * 0.5,
+            "temperatureC": 36.0 + (index % 20) * 0.1,
+        }
+        if index % 4 == 0:
+            vitals["notes"] = "follow-up visit"
+        result.append(vitals)
+    return result
+
+
+def measure(name: str, function: Callable[[Dict[str, Any]], Any], data: List[Dict[str, Any]], rounds: int) -> float:
+    best = float("inf")
+    for _ in range(rounds):
+        started = time.perf_counter()
+        for vitals in data:
+            function(vitals)
+        best = min(best, time.perf_counter() - started)
+    print(f"{name:>9}: {best / len(data) * 1e6:6.2f} us/payload ({len(data) / best:,.0f} payloads/s)")
+    return best
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--payloads", type=int, default=200_000)
+    parser.add_argument("--rounds", type=int, default=5, help="Best of this many runs is reported")
+    args = parser.parse_args()
+
+    data = payloads(args.payloads)
+    validate = compile_vitals_schema()
+    assert all(legacy_sanitize(v)[1] == validate(v)[1] for v in data[:1000]), "outputs differ"
+    legacy = measure("legacy", legacy_sanitize, data, args.rounds)
+    compiled = measure("compiled", validate, data, args.rounds)
+    print(f"speed-up: {legacy / compiled:.2f}x")
@@ -0,0 +1,211 @@
+"""Compact a day of appointment events into sorted Parquet files plus a manifest.
+
+Raw events land as one small JSON object per event. This job streams a day's
+partition, writes typed columnar files sorted by ``doctorId`` and ``ts`` (so
+row-group min/max statistics prune well on both), and then swaps in a new
+``_manifest.json`` that readers use instead of listing the raw objects.
+
+Requires ``pyarrow`` (``pip install pyarrow``).
+"""
+from __future__ import annotations
+
+import argparse
+import io
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from typing import Any, Dict, Iterator, List, Tuple
+
+from lake_store import (
+    MANIFEST_NAME,
+    compacted_prefix,
+    day_prefix,
+    decode_event,
+    is_event_object,
+    load_manifest,
+    open_store,
+    parse_ts_millis,
+)
+
+STRING_COLUMNS = (
+    "eventType",
+    "appointmentId",
+    "patientId",
+    "doctorId",
+    "status",
+    "reasonCode",
+    "recommendedSpecialty",
+    "specialty",
+    "city",
+)
+# Low-cardinality columns are dictionary encoded by Parquet.
+DICTIONARY_COLUMNS = [
+    "eventType", "doctorId", "status", "reasonCode", "recommendedSpecialty", "specialty", "city",
+]
+TIME_COLUMNS = ("slotISO", "ts")
+
+
+def _arrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as exc:  # pragma: no cover - depends on local tooling
+        raise SystemExit("pyarrow is required for compaction: pip install pyarrow") from exc
+    return pa, pq
+
+
+def event_schema(pa):
+    fields = [pa.field(name, pa.string()) for name in STRING_COLUMNS]
+    fields += [pa.field(name, pa.timestamp("ms", tz="UTC")) for name in TIME_COLUMNS]
+    return pa.schema(fields)
+
+
+def stream_events(store, keys: List[str], workers: int) -> Iterator[Dict[str, Any]]:
+    """Fetch and decode objects with bounded concurrency, preserving key order."""
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for start in range(0, len(keys), workers * 4):
+            window = keys[start:start + workers * 4]
+            for body in pool.map(store.get, window):
+                if body is None:
+                    continue
+                try:
+                    yield decode_event(body)
+                except ValueError:
+                    continue
+
+
+def collect_columns(events: Iterator[Dict[str, Any]]) -> Dict[str, List[Any]]:
+    columns: Dict[str, List[Any]] = {name: [] for name in STRING_COLUMNS + TIME_COLUMNS}
+    for detail in events:
+        for name in STRING_COLUMNS:
+            value = detail.get(name)
+            columns[name].append(None if value is None else str(value))
+        for name in TIME_COLUMNS:
+            columns[name].append(parse_ts_millis(detail.get(name)))
+    return columns
+
+
+def sort_columns(columns: Dict[str, List[Any]]) -> Dict[str, List[Any]]:
+    doctor_ids = columns["doctorId"]
+    ts_values = columns["ts"]
+    order = sorted(range(len(doctor_ids)), key=lambda i: (doctor_ids[i] or "", ts_values[i] or 0))
+    return {name: [values[i] for i in order] for name, values in columns.items()}
+
+
+def write_parquet(store, key: str, columns: Dict[str, List[Any]], row_group_size: int) -> Dict[str, Any]:
+    pa, pq = _arrow()
+    table = pa.Table.from_pydict(columns, schema=event_schema(pa))
+    sink = pa.BufferOutputStream()
+    pq.write_table(
+        table,
+        sink,
+        row_group_size=row_group_size,
+        compression="zstd",
+        use_dictionary=DICTIONARY_COLUMNS,
+        write_statistics=True,
+    )
+    store.put(key, sink.getvalue().to_pybytes())
+    ts_values = [value for value in columns["ts"] if value is not None]
+    doctor_ids = [value for value in columns["doctorId"] if value is not None]
+    return {
+        "key": key,
+        "rows": table.num_rows,
+        "rowGroups": -(-table.num_rows // row_group_size) if table.num_rows else 0,
+        "minTs": min(ts_values) if ts_values else None,
+        "maxTs": max(ts_values) if ts_values else None,
+        "minDoctorId": doctor_ids[0] if doctor_ids else None,
+        "maxDoctorId": doctor_ids[-1] if doctor_ids else None,
+    }
+
+
+def compact_day(
+    store,
+    day: str,
+    row_group_size: int = 50_000,
+    workers: int = 16,
+    delete_source: bool = False,
+) -> Tuple[int, int]:
+    """Compact one ``dt=`` partition. Returns ``(source_objects, rows_written)``."""
+    previous = load_manifest(store, day) or {}
+    already_compacted = set(previous.get("sources") or [])
+    raw_keys = [key for key in store.list(day_prefix(day)) if is_event_object(key)]
+    # Late arrivals are merged with the previous generation so the manifest
+    # always describes the whole day.
+    pending = [key for key in raw_keys if key not in already_compacted]
+    if not pending:
+        return 0, 0
+
+    columns = collect_columns(stream_events(store, pending, workers))
+    if previous:
+        # Carry the previous generation over instead of re-reading its sources,
+        # which may already have been deleted.
+        columns = _merge_previous(store, previous, columns)
+    columns = sort_columns(columns)
+
+    generation = time.strftime("%Y%m%dT%H%M%S", time.gmtime())
+    data_key = f"{compacted_prefix(day)}part-{generation}.parquet"
+    file_info = write_parquet(store, data_key, columns, row_group_size)
+    manifest = {
+        "version": 1,
+        "day": day,
+        "generation": generation,
+        "files": [file_info],
+        "rows": file_info["rows"],
+        "sources": sorted(already_compacted | set(pending)),
+    }
+    # The manifest PUT is the commit point: readers switch generations atomically.
+    store.put(compacted_prefix(day) + MANIFEST_NAME, json.dumps(manifest).encode("utf-8"))
+
+    stale = [info["key"] for info in previous.get("files") or [] if info.get("key") != data_key]
+    store.delete(stale)
+    if delete_source:
+        store.delete(pending)
+    return len(pending), file_info["rows"]
+
+
+def _merge_previous(store, previous: Dict[str, Any], columns: Dict[str, List[Any]]) -> Dict[str, List[Any]]:
+    _pa, pq = _arrow()
+    merged = {name: list(values) for name, values in columns.items()}
+    for info in previous.get("files") or []:
+        body = store.get(info["key"])
+        if body is None:
+            continue
+        table = pq.read_table(io.BytesIO(body))
+        for name in merged:
+            if name not in table.column_names:
+                # Files from before a column was added.
+                merged[name].extend([None] * table.num_rows)
+                continue
+            values = table.column(name).to_pylist()
+            if name in TIME_COLUMNS:
+                values = [None if v is None else int(v.timestamp() * 1000) for v in values]
+            merged[name].extend(values)
+    return merged
+
+
+def iter_days(start: str, end: str) -> Iterator[str]:
+    current = date.fromisoformat(start)
+    last = date.fromisoformat(end)
+    while current <= last:
+        yield current.isoformat()
+        current += timedelta(days=1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lake", required=True, help="s3://bucket[/prefix] or a local directory")
+    parser.add_argument("--from", dest="start", required=True, help="First day (YYYY-MM-DD)")
+    parser.add_argument("--to", dest="end", help="Last day (YYYY-MM-DD); defaults to --from")
+    parser.add_argument("--row-group-size", type=int, default=50_000)
+    parser.add_argument("--workers", type=int, default=16, help="Concurrent object reads")
+    parser.add_argument("--delete-source", action="store_true",
+                        help="Remove raw JSON objects once the manifest has been swapped in")
+    args = parser.parse_args()
+
+    lake = open_store(args.lake)
+    for day in iter_days(args.start, args.end or args.start):
+        started = time.perf_counter()
+        sources, rows = compact_day(lake, day, args.row_group_size, args.workers, args.delete_source)
+        elapsed = time.perf_counter() - started
+        print(f"{day}: {sources} objects -> {rows} rows in {elapsed:.2f}s")
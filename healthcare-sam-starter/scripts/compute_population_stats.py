@@ -0,0 +1,258 @@
+"""Compute population BMI and temperature distributions by city and specialty.
+
+Every vitals reading is a history record in PatientHealthIndex: bookings and
+batch uploads alike. The job reads them with a segmented parallel Scan (one
+worker per segment) and keeps each patient's most recent reading. A record
+whose appointment is CANCELLED is skipped. The patient is labelled from the
+most recent booking record: the city stored with it and the booked doctor's
+specialty from the Users table, found through Appointments. Metrics go into
+NumPy arrays and every cohort is summarised in one vectorized pass
+(``functions/population_stats``).
+
+The summary is written to PatientHealthIndex as a single item
+(``patientId="_population"``, ``recordId="stats"``), which
+``GET /population/health-stats`` returns as is. The job also writes one
+cumulative histogram item per cohort (``recordId="cohort#..."``) that
+``GET /patient-health/{patientId}/latest?include=percentiles`` ranks
+patients against. Cohort items left over from earlier runs, such as a city
+that fell below ``MIN_COHORT_SIZE``, are deleted.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+import boto3
+import numpy as np
+from boto3.dynamodb.conditions import Attr, Key
+
+FUNCTIONS_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "functions"))
+if FUNCTIONS_DIR not in sys.path:
+    sys.path.append(FUNCTIONS_DIR)
+
+from population_stats import (  # noqa: E402
+    COHORT_RECORD_PREFIX,
+    HISTOGRAM_EDGES,
+    POPULATION_PATIENT_ID,
+    STATS_RECORD_ID,
+    build_summary,
+    cohort_items,
+)
+
+# History records are ULIDs, which sort below this (see functions/common.py).
+HISTORY_RECORD_ID_LIMIT = "a"
+
+
+def iter_segment(table, segment: int, total_segments: int, **kwargs: Any) -> Iterator[Dict[str, Any]]:
+    kwargs.update(Segment=segment, TotalSegments=total_segments)
+    while True:
+        response = table.scan(**kwargs)
+        yield from response.get("Items", [])
+        last_key = response.get("LastEvaluatedKey")
+        if not last_key:
+            return
+        kwargs["ExclusiveStartKey"] = last_key
+
+
+def scan_segment(table, segment: int, total_segments: int, **kwargs: Any) -> List[Dict[str, Any]]:
+    return list(iter_segment(table, segment, total_segments, **kwargs))
+
+
+def parallel_scan(table, segments: int, **kwargs: Any) -> Iterator[Dict[str, Any]]:
+    """Scan ``table`` with ``segments`` concurrent workers."""
+    with ThreadPoolExecutor(max_workers=segments) as pool:
+        futures = [pool.submit(scan_segment, table, segment, segments, **kwargs) for segment in range(segments)]
+        for future in futures:
+            yield from future.result()
+
+
+def load_doctors(users_table, segments: int) -> Dict[str, Dict[str, Any]]:
+    doctors = {}
+    for item in parallel_scan(
+        users_table,
+        segments,
+        FilterExpression=Attr("role").eq("DOCTOR"),
+        ProjectionExpression="userId, doctorProfile",
+    ):
+        doctors[item["userId"]] = item.get("doctorProfile") or {}
+    return doctors
+
+
+def load_appointments(appointments_table, segments: int) -> Dict[str, Tuple[str, str]]:
+    """appointmentId -> (doctorId, status)."""
+    return {
+        item["appointmentId"]: (item.get("doctorId") or "", item.get("status") or "")
+        for item in parallel_scan(
+            appointments_table,
+            segments,
+            ProjectionExpression="appointmentId, doctorId, #status",
+            ExpressionAttributeNames={"#status": "status"},
+        )
+    }
+
+
+def _later(current: Optional[tuple], candidate: tuple) -> tuple:
+    # Ties on updatedAt fall back to the recordId (a ULID), so the result does
+    # not depend on scan order.
+    return candidate if current is None or candidate[:2] > current[:2] else current
+
+
+def latest_per_patient(
+    health_index_table, segment: int, total_segments: int, appointments: Dict[str, Tuple[str, str]], metrics: List[str]
+) -> Dict[str, Dict[str, tuple]]:
+    """Most recent reading and most recent booking label per patient in one segment.
+
+    Only the running latest is kept per patient, so memory grows with the
+    number of patients and not with the length of their histories.
+    """
+    patients: Dict[str, Dict[str, tuple]] = {}
+    for item in iter_segment(
+        health_index_table,
+        segment,
+        total_segments,
+        FilterExpression=Attr("recordId").lt(HISTORY_RECORD_ID_LIMIT),
+        ProjectionExpression="patientId, recordId, updatedAt, #metrics, city",
+        ExpressionAttributeNames={"#metrics": "metrics"},
+    ):
+        vitals = item.get("metrics")
+        if not isinstance(vitals, dict):
+            continue
+        record_id = item["recordId"]
+        doctor_id, status = appointments.get(record_id, ("", ""))
+        if status == "CANCELLED":
+            continue
+        stamp = (item.get("updatedAt") or "", record_id)
+        entry = patients.setdefault(item["patientId"], {})
+        values = tuple(
+            float(vitals[name]) if isinstance(vitals.get(name), (int, float, Decimal)) else np.nan
+            for name in metrics
+        )
+        entry["reading"] = _later(entry.get("reading"), stamp + (values,))
+        # Batch readings carry no doctor; the label comes from the latest booking.
+        if doctor_id or item.get("city"):
+            entry["label"] = _later(entry.get("label"), stamp + (doctor_id, item.get("city") or ""))
+    return patients
+
+
+def load_readings(
+    health_index_table, appointments: Dict[str, Tuple[str, str]], segments: int, metrics: List[str]
+) -> Dict[str, Any]:
+    """Column arrays of the latest reading per patient, with its booking label."""
+    merged: Dict[str, Dict[str, tuple]] = {}
+    with ThreadPoolExecutor(max_workers=segments) as pool:
+        futures = [
+            pool.submit(latest_per_patient, health_index_table, segment, segments, appointments, metrics)
+            for segment in range(segments)
+        ]
+        for future in futures:
+            for patient_id, entry in future.result().items():
+                target = merged.setdefault(patient_id, {})
+                for key, value in entry.items():
+                    target[key] = _later(target.get(key), value)
+
+    rows = [entry for entry in merged.values() if "reading" in entry]
+    if not rows:
+        return {"doctors": [], "cities": [], "values": np.empty((0, len(metrics))), "patients": 0}
+    labels = [entry.get("label") or ("", "", "", "") for entry in rows]
+    return {
+        "doctors": [label[2] for label in labels],
+        "cities": [label[3] for label in labels],
+        "values": np.asarray([entry["reading"][2] for entry in rows], dtype=np.float64),
+        "patients": len(rows),
+    }
+
+
+def stale_cohort_keys(health_index_table, current: Set[str]) -> List[Dict[str, str]]:
+    """Keys of stored cohort items that the current run did not produce."""
+    keys = []
+    kwargs: Dict[str, Any] = {
+        "KeyConditionExpression": Key("patientId").eq(POPULATION_PATIENT_ID)
+        & Key("recordId").begins_with(COHORT_RECORD_PREFIX),
+        "ProjectionExpression": "recordId",
+    }
+    while True:
+        response = health_index_table.query(**kwargs)
+        keys.extend(
+            {"patientId": POPULATION_PATIENT_ID, "recordId": item["recordId"]}
+            for item in response.get("Items", [])
+            if item["recordId"] not in current
+        )
+        last_key = response.get("LastEvaluatedKey")
+        if not last_key:
+            return keys
+        kwargs["ExclusiveStartKey"] = last_key
+
+
+def compute(appointments_table, users_table, health_index_table, segments: int) -> Dict[str, Any]:
+    metrics = list(HISTOGRAM_EDGES)
+    started = time.perf_counter()
+    profiles = load_doctors(users_table, segments)
+    appointments = load_appointments(appointments_table, segments)
+    readings = load_readings(health_index_table, appointments, segments, metrics)
+    loaded = time.perf_counter()
+
+    doctor_profiles = [profiles.get(doctor_id) or {} for doctor_id in readings["doctors"]]
+    summary = build_summary(
+        {name: readings["values"][:, index] for index, name in enumerate(metrics)},
+        {
+            "city": [
+                city or profile.get("city") or profile.get("location")
+                for city, profile in zip(readings["cities"], doctor_profiles)
+            ],
+            "specialty": [profile.get("specialty") for profile in doctor_profiles],
+        },
+    )
+    finished = time.perf_counter()
+    print(
+        f"read the health index ({readings['patients']} patients) in {loaded - started:.2f}s, "
+        f"computed in {(finished - loaded) * 1000:.1f} ms",
+        file=sys.stderr,
+    )
+    return {
+        "patientId": POPULATION_PATIENT_ID,
+        "recordId": STATS_RECORD_ID,
+        "generatedAt": datetime.utcnow().isoformat(),
+        "patients": readings["patients"],
+        "metrics": summary,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--appointments-table", required=True, help="Appointments table name")
+    parser.add_argument("--users-table", required=True, help="Users table name")
+    parser.add_argument("--health-index-table", required=True, help="PatientHealthIndex table name")
+    parser.add_argument("--segments", type=int, default=8, help="Parallel scan segments")
+    parser.add_argument("--dry-run", action="store_true", help="Print the summary instead of storing it")
+    args = parser.parse_args()
+
+    dynamodb = boto3.resource("dynamodb")
+    health_index = dynamodb.Table(args.health_index_table)
+    item = compute(
+        dynamodb.Table(args.appointments_table), dynamodb.Table(args.users_table), health_index, args.segments
+    )
+    cohorts = cohort_items(item["metrics"], item["generatedAt"])
+    if args.dry_run:
+        print(json.dumps(item, indent=2))
+    else:
+        # DynamoDB needs Decimals and has no NaN; the summary already uses None.
+        with health_index.batch_writer() as batch:
+            for record in [item] + cohorts:
+                batch.put_item(Item=json.loads(json.dumps(record), parse_float=Decimal))
+        # Deleted after the new items are in, so a lookup always finds a cohort
+        # or falls back to "cohort#all".
+        stale = stale_cohort_keys(health_index, {record["recordId"] for record in cohorts})
+        with health_index.batch_writer() as batch:
+            for key in stale:
+                batch.delete_item(Key=key)
+        print(
+            f"stored population stats for {item['patients']} patients and {len(cohorts)} cohort histograms, "
+            f"deleted {len(stale)} stale cohort histograms"
+        )
@@ -0,0 +1,176 @@
+"""Storage helpers shared by the appointments event lake tools."""
+from __future__ import annotations
+
+import json
+import os
+import sys
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+FUNCTIONS_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "functions"))
+if FUNCTIONS_DIR not in sys.path:
+    sys.path.append(FUNCTIONS_DIR)
+
+from event_codec import decode_any  # noqa: E402
+from event_lake import (  # noqa: E402
+    DOMAIN_PREFIX,
+    day_prefix,
+    hour_prefix,
+    index_key,
+    iter_days,
+    iter_hours,
+    parse_event_time,
+)
+
+EVENTS_PREFIX = DOMAIN_PREFIX
+COMPACTED_PREFIX = "domain=appointments_compacted/"
+MANIFEST_NAME = "_manifest.json"
+
+
+class LocalStore:
+    """Directory that mirrors the curated bucket layout (demos and benchmarks)."""
+
+    def __init__(self, root: str) -> None:
+        self.root = os.path.abspath(root)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, *key.split("/"))
+
+    def list(self, prefix: str) -> Iterator[str]:
+        base = self._path(prefix.rstrip("/")) if prefix.endswith("/") else os.path.dirname(self._path(prefix))
+        if not os.path.isdir(base):
+            return
+        keys: List[str] = []
+        for dirpath, _dirnames, filenames in os.walk(base):
+            for name in filenames:
+                rel = os.path.relpath(os.path.join(dirpath, name), self.root)
+                key = rel.replace(os.sep, "/")
+                if key.startswith(prefix):
+                    keys.append(key)
+        yield from sorted(keys)
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            with open(self._path(key), "rb") as handle:
+                return handle.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, key: str, body: bytes) -> None:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write-then-rename so readers never observe a half-written manifest.
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+        with open(tmp_path, "wb") as handle:
+            handle.write(body)
+        os.replace(tmp_path, path)
+
+    def delete(self, keys: Iterable[str]) -> None:
+        for key in keys:
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+
+
+class S3Store:
+    """Curated bucket accessed through boto3."""
+
+    def __init__(self, bucket: str, prefix: str = "", client: Any = None) -> None:
+        if client is None:
+            import boto3
+
+            client = boto3.client("s3")
+        self.bucket = bucket
+        self.prefix = prefix.strip("/") + "/" if prefix.strip("/") else ""
+        self.client = client
+
+    def list(self, prefix: str) -> Iterator[str]:
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.prefix + prefix):
+            for obj in page.get("Contents", []):
+                yield obj["Key"][len(self.prefix):]
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            response = self.client.get_object(Bucket=self.bucket, Key=self.prefix + key)
+        except self.client.exceptions.NoSuchKey:
+            return None
+        return response["Body"].read()
+
+    def put(self, key: str, body: bytes) -> None:
+        self.client.put_object(Bucket=self.bucket, Key=self.prefix + key, Body=body)
+
+    def delete(self, keys: Iterable[str]) -> None:
+        batch: List[Dict[str, str]] = []
+        for key in keys:
+            batch.append({"Key": self.prefix + key})
+            if len(batch) == 1000:
+                self.client.delete_objects(Bucket=self.bucket, Delete={"Objects": batch, "Quiet": True})
+                batch = []
+        if batch:
+            self.client.delete_objects(Bucket=self.bucket, Delete={"Objects": batch, "Quiet": True})
+
+
+def open_store(location: str):
+    """Return a store for ``s3://bucket[/prefix]`` or a local directory path."""
+    if location.startswith("s3://"):
+        bucket, _, prefix = location[len("s3://"):].partition("/")
+        return S3Store(bucket, prefix)
+    return LocalStore(location)
+
+
+def compacted_prefix(day: str) -> str:
+    return f"{COMPACTED_PREFIX}dt={day}/"
+
+
+def is_event_object(key: str) -> bool:
+    name = key.rsplit("/", 1)[-1]
+    return name.startswith("part=event-")
+
+
+def decode_event(body: bytes) -> Dict[str, Any]:
+    """Decode a raw lake object, JSON or binary (see ``functions/event_codec.py``)."""
+    return decode_any(body)
+
+
+def parse_ts_millis(value: Any) -> Optional[int]:
+    """Convert an event ``ts`` (naive ISO strings are UTC) to epoch milliseconds."""
+    parsed = parse_event_time(value)
+    if parsed is None:
+        return None
+    return int(parsed.timestamp() * 1000)
+
+
+def load_partition_index(store, day: str) -> Optional[List[int]]:
+    body = store.get(index_key(day))
+    if body is None:
+        return None
+    return [int(hour) for hour in json.loads(body).get("hours") or []]
+
+
+def partition_prefixes(store, start: datetime, end: datetime) -> Iterator[str]:
+    """Yield the smallest set of prefixes that covers events in ``[start, end]``.
+
+    Days with a partition index are narrowed to the indexed hours in range,
+    plus the day root for objects written before hourly partitioning. Days
+    without an index are listed whole.
+    """
+    wanted: Dict[str, set] = {}
+    for day, hour in iter_hours(start, end):
+        wanted.setdefault(day, set()).add(hour)
+    for day in iter_days(start, end):
+        hours = load_partition_index(store, day)
+        if hours is None:
+            yield day_prefix(day)
+            continue
+        for hour in sorted(set(hours) & wanted.get(day, set())):
+            yield hour_prefix(day, hour)
+        yield day_prefix(day) + "part="
+
+
+def load_manifest(store, day: str) -> Optional[Dict[str, Any]]:
+    body = store.get(compacted_prefix(day) + MANIFEST_NAME)
+    if body is None:
+        return None
+    return json.loads(body)
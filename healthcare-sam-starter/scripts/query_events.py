@@ -0,0 +1,362 @@
+"""Run grouped aggregations over the appointments event lake.
+
+Events are streamed in fixed-size column batches, so memory stays bounded by
+the batch size plus the aggregation state, and each batch is reduced with
+NumPy kernels. Compacted days (see ``compact_events.py``) are read from
+Parquet with column and row-group pruning when ``pyarrow`` is installed;
+everything else is read from the raw JSON objects, narrowed to the hours in
+range through the partition index.
+
+Examples::
+
+    python scripts/query_events.py bookings-per-specialty --lake s3://bucket \\
+        --from 2025-11-01T00:00:00Z --to 2025-11-02T00:00:00Z --doctors doctors.json
+    python scripts/query_events.py confirm-latency --lake ./lake --from 2025-11-01 --to 2025-11-30
+    python scripts/query_events.py bench --events 2000000
+
+Requires ``numpy``.
+"""
+from __future__ import annotations
+
+import argparse
+import io
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from lake_store import (
+    decode_event,
+    is_event_object,
+    iter_days,
+    load_manifest,
+    open_store,
+    parse_event_time,
+    parse_ts_millis,
+    partition_prefixes,
+)
+
+HOUR_MS = 3_600_000
+COLUMNS = ("eventType", "appointmentId", "doctorId", "specialty", "ts")
+# Log-spaced latency buckets from one second to 30 days, used for per-doctor
+# percentile estimates without keeping individual samples.
+LATENCY_EDGES_S = np.concatenate(([0.0], np.logspace(0, np.log10(30 * 86400), 120)))
+
+Batch = Dict[str, np.ndarray]
+
+
+def _to_batch(rows: Dict[str, List[Any]]) -> Batch:
+    batch = {name: np.array([value or "" for value in rows[name]], dtype=str) for name in COLUMNS if name != "ts"}
+    batch["ts"] = np.array([value if value is not None else -1 for value in rows["ts"]], dtype=np.int64)
+    return batch
+
+
+def _empty_rows() -> Dict[str, List[Any]]:
+    return {name: [] for name in COLUMNS}
+
+
+def _read_json_objects(store, keys: List[str], workers: int) -> Iterator[Dict[str, Any]]:
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for start in range(0, len(keys), workers * 4):
+            for body in pool.map(store.get, keys[start:start + workers * 4]):
+                if body is None:
+                    continue
+                try:
+                    yield decode_event(body)
+                except ValueError:
+                    continue
+
+
+def _read_parquet(store, keys: List[str], start_ms: int, end_ms: int, batch_size: int) -> Iterator[Batch]:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+
+    start = datetime.fromtimestamp(start_ms / 1000, tz=timezone.utc)
+    end = datetime.fromtimestamp(end_ms / 1000, tz=timezone.utc)
+    for key in keys:
+        body = store.get(key)
+        if body is None:
+            continue
+        parquet = pq.ParquetFile(io.BytesIO(body))
+        present = [name for name in COLUMNS if name in parquet.schema_arrow.names]
+        table = pq.read_table(
+            io.BytesIO(body),
+            columns=present,
+            filters=[("ts", ">=", start), ("ts", "<=", end)],
+        )
+        for record_batch in table.to_batches(max_chunksize=batch_size):
+            batch: Batch = {}
+            for name in COLUMNS:
+                if name not in present:
+                    batch[name] = np.full(record_batch.num_rows, "", dtype=str)
+                elif name == "ts":
+                    column = pc.cast(record_batch.column(name), pa.int64())
+                    batch[name] = column.fill_null(-1).to_numpy()
+                else:
+                    column = record_batch.column(name).cast(pa.string()).fill_null("")
+                    batch[name] = np.asarray(column.to_numpy(zero_copy_only=False), dtype=str)
+            yield batch
+
+
+def _has_pyarrow() -> bool:
+    try:
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def iter_batches(
+    store,
+    start: datetime,
+    end: datetime,
+    batch_size: int = 50_000,
+    workers: int = 16,
+) -> Iterator[Batch]:
+    """Yield column batches for events whose ``ts`` falls in ``[start, end]``."""
+    start_ms = int(start.timestamp() * 1000)
+    end_ms = int(end.timestamp() * 1000)
+    use_parquet = _has_pyarrow()
+    covered: set = set()
+    for day in iter_days(start, end):
+        manifest = load_manifest(store, day) if use_parquet else None
+        if manifest:
+            keys = [info["key"] for info in manifest.get("files") or [] if _overlaps(info, start_ms, end_ms)]
+            yield from _read_parquet(store, keys, start_ms, end_ms, batch_size)
+            covered.update(manifest.get("sources") or [])
+
+    raw_keys: List[str] = []
+    for prefix in partition_prefixes(store, start, end):
+        raw_keys.extend(key for key in store.list(prefix) if is_event_object(key) and key not in covered)
+
+    rows = _empty_rows()
+    for detail in _read_json_objects(store, raw_keys, workers):
+        ts_ms = parse_ts_millis(detail.get("ts"))
+        if ts_ms is None or ts_ms < start_ms or ts_ms > end_ms:
+            continue
+        for name in COLUMNS:
+            rows[name].append(ts_ms if name == "ts" else detail.get(name))
+        if len(rows["ts"]) >= batch_size:
+            yield _to_batch(rows)
+            rows = _empty_rows()
+    if rows["ts"]:
+        yield _to_batch(rows)
+
+
+def _overlaps(info: Dict[str, Any], start_ms: int, end_ms: int) -> bool:
+    if info.get("minTs") is None or info.get("maxTs") is None:
+        return True
+    return info["minTs"] <= end_ms and info["maxTs"] >= start_ms
+
+
+class BookingsPerSpecialty:
+    """Count BOOKED events per (specialty, hour)."""
+
+    def __init__(self, doctor_specialties: Optional[Dict[str, str]] = None) -> None:
+        self.doctor_specialties = doctor_specialties or {}
+        self.counts: Dict[Tuple[str, int], int] = {}
+
+    def update(self, batch: Batch) -> None:
+        mask = batch["eventType"] == "BOOKED"
+        if not mask.any():
+            return
+        specialties = batch["specialty"][mask]
+        if self.doctor_specialties:
+            missing = specialties == ""
+            if missing.any():
+                doctors = batch["doctorId"][mask][missing]
+                specialties = specialties.astype(object)
+                specialties[missing] = [self.doctor_specialties.get(doctor, "") for doctor in doctors]
+                specialties = specialties.astype(str)
+        specialties = np.where(specialties == "", "UNKNOWN", specialties)
+        hours = batch["ts"][mask] // HOUR_MS
+        labels, codes = np.unique(specialties, return_inverse=True)
+        hour_base = hours.min()
+        # One combined integer key per row so a single bincount does the grouping.
+        span = int(hours.max() - hour_base) + 1
+        combined = codes.astype(np.int64) * span + (hours - hour_base)
+        totals = np.bincount(combined)
+        for key in np.flatnonzero(totals):
+            code, offset = divmod(int(key), span)
+            group = (str(labels[code]), int(hour_base + offset))
+            self.counts[group] = self.counts.get(group, 0) + int(totals[key])
+
+    def rows(self) -> List[Dict[str, Any]]:
+        result = []
+        for (specialty, hour), count in sorted(self.counts.items(), key=lambda item: (item[0][1], item[0][0])):
+            stamp = datetime.fromtimestamp(hour * 3600, tz=timezone.utc).strftime("%Y-%m-%dT%H:00Z")
+            result.append({"specialty": specialty, "hour": stamp, "bookings": count})
+        return result
+
+
+class ConfirmLatency:
+    """Time from BOOKED to CONFIRMED per doctor.
+
+    Only open (booked, not yet confirmed) appointments are held in memory;
+    latencies are folded into per-doctor sums and a fixed histogram.
+    """
+
+    def __init__(self) -> None:
+        self.booked: Dict[str, int] = {}
+        self.doctor_index: Dict[str, int] = {}
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.sums = np.zeros(0, dtype=np.float64)
+        self.histogram = np.zeros((0, len(LATENCY_EDGES_S) - 1), dtype=np.int64)
+
+    def _grow(self, size: int) -> None:
+        if size <= len(self.counts):
+            return
+        extra = size - len(self.counts)
+        self.counts = np.concatenate((self.counts, np.zeros(extra, dtype=np.int64)))
+        self.sums = np.concatenate((self.sums, np.zeros(extra, dtype=np.float64)))
+        self.histogram = np.vstack((self.histogram, np.zeros((extra, self.histogram.shape[1]), dtype=np.int64)))
+
+    def update(self, batch: Batch) -> None:
+        # Process in ts order so a BOOKED and its CONFIRMED in the same batch join.
+        order = np.argsort(batch["ts"], kind="stable")
+        event_types = batch["eventType"][order]
+        ids = batch["appointmentId"][order]
+        ts = batch["ts"][order]
+        doctors = batch["doctorId"][order]
+
+        booked = event_types == "BOOKED"
+        self.booked.update(zip(ids[booked].tolist(), ts[booked].tolist()))
+
+        confirmed = np.flatnonzero(event_types == "CONFIRMED")
+        if not len(confirmed):
+            return
+        started = np.array([self.booked.pop(key, -1) for key in ids[confirmed].tolist()], dtype=np.int64)
+        matched = started >= 0
+        if not matched.any():
+            return
+        latency_s = (ts[confirmed][matched] - started[matched]) / 1000.0
+        doctor_ids = doctors[confirmed][matched]
+        labels, codes = np.unique(doctor_ids, return_inverse=True)
+        slots = np.array([self.doctor_index.setdefault(str(label), len(self.doctor_index)) for label in labels])
+        rows = slots[codes]
+        self._grow(len(self.doctor_index))
+        np.add.at(self.counts, rows, 1)
+        np.add.at(self.sums, rows, latency_s)
+        bins = np.clip(np.searchsorted(LATENCY_EDGES_S, latency_s, side="right") - 1, 0, self.histogram.shape[1] - 1)
+        np.add.at(self.histogram, (rows, bins), 1)
+
+    def _percentile(self, row: int, q: float) -> float:
+        cumulative = np.cumsum(self.histogram[row])
+        target = q * cumulative[-1]
+        bucket = int(np.searchsorted(cumulative, target))
+        return float(LATENCY_EDGES_S[min(bucket + 1, len(LATENCY_EDGES_S) - 1)])
+
+    def rows(self) -> List[Dict[str, Any]]:
+        result = []
+        for doctor_id, row in sorted(self.doctor_index.items()):
+            count = int(self.counts[row])
+            if not count:
+                continue
+            result.append({
+                "doctorId": doctor_id,
+                "confirmed": count,
+                "meanSeconds": round(float(self.sums[row]) / count, 1),
+                "p50Seconds": round(self._percentile(row, 0.5), 1),
+                "p95Seconds": round(self._percentile(row, 0.95), 1),
+            })
+        return result
+
+
+def run(aggregation, batches: Iterator[Batch]) -> Tuple[int, float]:
+    started = time.perf_counter()
+    events = 0
+    for batch in batches:
+        events += len(batch["ts"])
+        aggregation.update(batch)
+    return events, time.perf_counter() - started
+
+
+def synthetic_batches(total: int, batch_size: int, seed: int = 7) -> Iterator[Batch]:
+    """Generate BOOKED/CONFIRMED pairs spread over a week for benchmarking."""
+    rng = np.random.default_rng(seed)
+    specialties = np.array(["Cardiology", "Dermatology", "Neurology", "Pediatrics", "ENT"])
+    doctors = np.array([f"doctor{i}@example.com" for i in range(200)])
+    base_ms = int(datetime(2025, 11, 3, tzinfo=timezone.utc).timestamp() * 1000)
+    produced = 0
+    serial = 0
+    while produced < total:
+        pairs = min(batch_size, total - produced) // 2 or 1
+        ids = np.char.add("A", np.arange(serial, serial + pairs).astype(str))
+        serial += pairs
+        doctor = doctors[rng.integers(0, len(doctors), pairs)]
+        booked_ts = base_ms + rng.integers(0, 7 * 86_400_000, pairs)
+        confirmed_ts = booked_ts + rng.exponential(3_600_000, pairs).astype(np.int64)
+        yield {
+            "eventType": np.concatenate((np.full(pairs, "BOOKED"), np.full(pairs, "CONFIRMED"))),
+            "appointmentId": np.concatenate((ids, ids)),
+            "doctorId": np.concatenate((doctor, doctor)),
+            "specialty": np.concatenate((specialties[rng.integers(0, len(specialties), pairs)], np.full(pairs, ""))),
+            "ts": np.concatenate((booked_ts, confirmed_ts)),
+        }
+        produced += pairs * 2
+
+
+def _parse_bound(value: str, end: bool = False) -> datetime:
+    parsed = parse_event_time(value)
+    if parsed is None:
+        raise SystemExit(f"invalid timestamp: {value}")
+    if end and len(value) == 10:
+        # A bare date as the upper bound means the whole day.
+        parsed = parsed.replace(hour=23, minute=59, second=59, microsecond=999000)
+    return parsed
+
+
+def _load_doctor_specialties(path: Optional[str]) -> Dict[str, str]:
+    if not path:
+        return {}
+    with open(path, "r", encoding="utf-8") as handle:
+        doctors = json.load(handle)
+    mapping = {}
+    for doctor in doctors:
+        specialty = doctor.get("specialty") or (doctor.get("doctorProfile") or {}).get("specialty")
+        for key in (doctor.get("userId"), doctor.get("email")):
+            if key and specialty:
+                mapping[key] = specialty
+    return mapping
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("query", choices=("bookings-per-specialty", "confirm-latency", "bench"))
+    parser.add_argument("--lake", help="s3://bucket[/prefix] or a local directory")
+    parser.add_argument("--from", dest="start", help="Start of the time range (ISO-8601)")
+    parser.add_argument("--to", dest="end", help="End of the time range (ISO-8601)")
+    parser.add_argument("--doctors", help="JSON list of doctors used to fill in missing specialties")
+    parser.add_argument("--batch-size", type=int, default=50_000)
+    parser.add_argument("--workers", type=int, default=16, help="Concurrent object reads")
+    parser.add_argument("--events", type=int, default=1_000_000, help="Synthetic events for bench")
+    args = parser.parse_args()
+
+    if args.query == "bench":
+        for name, aggregation in (
+            ("bookings-per-specialty", BookingsPerSpecialty()),
+            ("confirm-latency", ConfirmLatency()),
+        ):
+            events, elapsed = run(aggregation, synthetic_batches(args.events, args.batch_size))
+            print(f"{name}: {events} events in {elapsed:.2f}s ({events / elapsed:,.0f} events/s)")
+        sys.exit(0)
+
+    if not (args.lake and args.start and args.end):
+        parser.error("--lake, --from and --to are required")
+    aggregation = (
+        BookingsPerSpecialty(_load_doctor_specialties(args.doctors))
+        if args.query == "bookings-per-specialty"
+        else ConfirmLatency()
+    )
+    lake = open_store(args.lake)
+    batches = iter_batches(lake, _parse_bound(args.start), _parse_bound(args.end, end=True), args.batch_size, args.workers)
+    events, elapsed = run(aggregation, batches)
+    for row in aggregation.rows():
+        print(json.dumps(row))
+    rate = events / elapsed if elapsed else 0.0
+    print(f"scanned {events} events in {elapsed:.2f}s ({rate:,.0f} events/s)", file=sys.stderr)
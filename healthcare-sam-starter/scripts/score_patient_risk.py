@@ -0,0 +1,250 @@
+"""Score every patient's diabetes risk from their latest vitals, in bulk.
+
+Each worker scans one segment of PatientHealthIndex for the ``latest``
+items, a page at a time. Each page becomes one feature matrix, scored with
+the in-process logistic model (``functions/diabetes_model.py``) in a single
+matrix-vector product. The scores are written back with BatchWriteItem as
+``recordId="risk"`` items, which ``GET /patient-health/{patientId}/latest?include=risk``
+returns.
+
+A model feature is present when the patient's ``latest`` metrics hold it (see
+``FEATURE_METRICS``). Vitals only provide BMI today; the questionnaire
+features (blood pressure, cholesterol, general health, age, ...) are not
+stored anywhere. Up to ``MAX_IMPUTED_FEATURES`` missing features are filled
+with the neutral answers in ``DEFAULT_FEATURES`` and listed in the item's
+``imputed`` field. A patient missing more is suppressed: no score is
+written, and an existing ``risk`` item is left alone (``include=risk``
+already refuses to serve items over the limit).
+
+Not ready to ship or schedule: until the predictor-form answers are stored
+in the health index the job would score nobody, so it refuses to write and
+only runs with ``--dry-run``.
+
+After each page is written, the segment's scan position is saved to the
+``--checkpoint`` file. Re-running the same command resumes every segment
+where it stopped, so a crash rescores at most one page per segment.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from decimal import Decimal
+from typing import Any, Dict, List, Optional
+
+import boto3
+import numpy as np
+from boto3.dynamodb.conditions import Attr
+
+FUNCTIONS_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "functions"))
+if FUNCTIONS_DIR not in sys.path:
+    sys.path.append(FUNCTIONS_DIR)
+
+from diabetes_model import MAX_IMPUTED_FEATURES, RISK_RECORD_ID, LogisticModel, load_model  # noqa: E402
+
+# Answers used for features that vitals do not provide.
+DEFAULT_FEATURES = {
+    "HighBP": 0,
+    "HighChol": 0,
+    "GenHlth": 3,
+    "PhysHlth": 0,
+    "Age": 7,
+    "DiffWalk": 0,
+    "Smoker": 0,
+}
+# Model feature -> key in the latest item's metrics, where the names differ.
+FEATURE_METRICS = {"BMI": "bmi"}
+DONE = "done"
+
+
+class Checkpoint:
+    """Scan position per segment, persisted as JSON (write-then-rename)."""
+
+    def __init__(self, path: Optional[str], segments: int) -> None:
+        self.path = path
+        self.positions: Dict[str, Any] = {}
+        self.lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as handle:
+                saved = json.load(handle)
+            if saved.get("segments") != segments:
+                raise SystemExit(f"checkpoint was written with --segments {saved.get('segments')}")
+            self.positions = saved.get("positions") or {}
+        self.segments = segments
+
+    def position(self, segment: int) -> Any:
+        return self.positions.get(str(segment))
+
+    def mark(self, segment: int, last_key: Optional[Dict[str, Any]]) -> None:
+        with self.lock:
+            self.positions[str(segment)] = last_key or DONE
+            if not self.path:
+                return
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as handle:
+                json.dump({"segments": self.segments, "positions": self.positions}, handle)
+            os.replace(tmp_path, self.path)
+
+
+class Progress:
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self.scanned = 0
+        self.scored = 0
+        self.suppressed = 0
+        self.score_seconds = 0.0
+        self.lock = threading.Lock()
+
+    def add(self, scanned: int, scored: int, suppressed: int, score_seconds: float) -> None:
+        with self.lock:
+            self.scanned += scanned
+            self.scored += scored
+            self.suppressed += suppressed
+            self.score_seconds += score_seconds
+
+    def report(self, final: bool = False) -> None:
+        elapsed = time.perf_counter() - self.started
+        print(
+            f"{'done: ' if final else ''}{self.scored} patients scored ({self.scored / max(elapsed, 1e-9):,.0f}/s), "
+            f"{self.suppressed} suppressed (too many imputed features), "
+            f"{self.scanned} latest items read, {elapsed:.1f}s elapsed, "
+            f"model time {self.score_seconds * 1000:.1f} ms",
+            file=sys.stderr,
+        )
+
+
+def metric_value(metrics: Any, name: str) -> Optional[float]:
+    if not isinstance(metrics, dict):
+        return None
+    value = metrics.get(FEATURE_METRICS.get(name, name))
+    if value is None or isinstance(value, (bool, str)):
+        return None
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return number if np.isfinite(number) else None
+
+
+def feature_matrix(model: LogisticModel, items: List[Dict[str, Any]], max_imputed: int) -> tuple:
+    """Rows in model feature order for patients with few enough imputed features.
+
+    Returns the matrix, the indexes of the kept items and a boolean
+    ``(kept, features)`` mask of the imputed entries.
+    """
+    matrix = np.empty((len(items), len(model.names)), dtype=np.float64)
+    present = np.zeros(matrix.shape, dtype=bool)
+    for row, item in enumerate(items):
+        metrics = item.get("metrics")
+        for column, name in enumerate(model.names):
+            value = metric_value(metrics, name)
+            if value is None:
+                matrix[row, column] = DEFAULT_FEATURES.get(name, np.nan)
+            else:
+                matrix[row, column] = value
+                present[row, column] = True
+    imputed = ~present
+    keep = np.flatnonzero((imputed.sum(axis=1) <= max_imputed) & np.isfinite(matrix).all(axis=1))
+    return matrix[keep], keep, imputed[keep]
+
+
+def score_page(
+    model: LogisticModel, table, items: List[Dict[str, Any]], scored_at: str, max_imputed: int, dry_run: bool
+) -> tuple:
+    matrix, keep, imputed = feature_matrix(model, items, max_imputed)
+    started = time.perf_counter()
+    probabilities = model.predict(matrix)
+    elapsed = time.perf_counter() - started
+    bmi = matrix[:, model.names.index("BMI")]
+    if not dry_run:
+        with table.batch_writer() as batch:
+            for position, row in enumerate(keep):
+                item = items[row]
+                batch.put_item(
+                    Item={
+                        "patientId": item["patientId"],
+                        "recordId": RISK_RECORD_ID,
+                        "probability": Decimal(str(round(float(probabilities[position]), 4))),
+                        "modelVersion": model.version,
+                        "scoredAt": scored_at,
+                        "sourceRecordId": item.get("sourceRecordId"),
+                        "bmi": Decimal(str(round(float(bmi[position]), 1))),
+                        "imputed": [name for name, missing in zip(model.names, imputed[position]) if missing],
+                    }
+                )
+    return len(keep), len(items) - len(keep), elapsed
+
+
+def run_segment(table, model, segment: int, args, checkpoint: Checkpoint, progress: Progress, scored_at: str) -> None:
+    position = checkpoint.position(segment)
+    if position == DONE:
+        return
+    kwargs: Dict[str, Any] = {
+        "Segment": segment,
+        "TotalSegments": args.segments,
+        "FilterExpression": Attr("recordId").eq("latest"),
+        "ProjectionExpression": "patientId, recordId, sourceRecordId, #metrics",
+        "ExpressionAttributeNames": {"#metrics": "metrics"},
+        "Limit": args.page_size,
+    }
+    if position:
+        kwargs["ExclusiveStartKey"] = position
+    while True:
+        response = table.scan(**kwargs)
+        items = response.get("Items", [])
+        scored, suppressed, elapsed = (
+            score_page(model, table, items, scored_at, args.max_imputed, args.dry_run) if items else (0, 0, 0.0)
+        )
+        progress.add(len(items), scored, suppressed, elapsed)
+        last_key = response.get("LastEvaluatedKey")
+        checkpoint.mark(segment, last_key)
+        if not last_key:
+            return
+        kwargs["ExclusiveStartKey"] = last_key
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--health-index-table", required=True, help="PatientHealthIndex table name")
+    parser.add_argument("--segments", type=int, default=8, help="Parallel scan segments")
+    parser.add_argument("--page-size", type=int, default=1000, help="Items evaluated per Scan page")
+    parser.add_argument("--checkpoint", help="File recording scan positions, for resuming")
+    parser.add_argument("--report-every", type=float, default=10.0, help="Seconds between progress lines")
+    parser.add_argument(
+        "--max-imputed", type=int, default=MAX_IMPUTED_FEATURES, help="Most features a stored score may impute"
+    )
+    parser.add_argument("--dry-run", action="store_true", help="Score without writing")
+    args = parser.parse_args()
+
+    model = load_model()
+    # Only FEATURE_METRICS are stored per patient today; the rest would all be imputed.
+    if len(model.names) - len(FEATURE_METRICS) > args.max_imputed and not args.dry_run:
+        parser.error(
+            f"only {', '.join(FEATURE_METRICS)} is stored per patient; "
+            "use --dry-run until the predictor-form answers are stored"
+        )
+    table = boto3.resource("dynamodb").Table(args.health_index_table)
+    checkpoint = Checkpoint(args.checkpoint, args.segments)
+    progress = Progress()
+    scored_at = datetime.now(timezone.utc).isoformat()
+    stop = threading.Event()
+
+    def reporter() -> None:
+        while not stop.wait(args.report_every):
+            progress.report()
+
+    threading.Thread(target=reporter, daemon=True).start()
+    with ThreadPoolExecutor(max_workers=args.segments) as pool:
+        futures = [
+            pool.submit(run_segment, table, model, segment, args, checkpoint, progress, scored_at)
+            for segment in range(args.segments)
+        ]
+        for future in futures:
+            future.result()
+    stop.set()
+    progress.report(final=True)
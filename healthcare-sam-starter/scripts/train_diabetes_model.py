@@ -0,0 +1,159 @@
+"""Record remote diabetes-model outputs and fit the in-process logistic model to them.
+
+``record`` sends a deterministic sample of feature vectors (drawn from the
+predictor form's ranges) to the remote model and stores the answers as the
+parity fixture used by ``test_diabetes_model.py``. ``fit`` fits the
+logistic regression in ``functions/models/diabetes_logreg.json`` to a
+recording by Newton's method on the cross-entropy against the recorded
+probabilities. If the remote model is itself a logistic regression over these
+features, the fit reproduces it exactly.
+
+``fit --heuristic N`` fits to the frontend's offline demo heuristic
+(``demoPredict`` in assets/patient.js) instead. The shipped coefficients were
+produced that way because the remote endpoint could not be reached when the
+model was added. Refit from a recording before setting ``LOCAL_MODEL_MODE`` to
+``fallback`` or ``primary``.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+FUNCTIONS_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "functions"))
+if FUNCTIONS_DIR not in sys.path:
+    sys.path.append(FUNCTIONS_DIR)
+
+from diabetes_model import MODEL_PATH, LogisticModel, remote_probability  # noqa: E402
+from http_pool import ConnectionPool  # noqa: E402
+
+PARITY_PATH = os.path.join(os.path.dirname(MODEL_PATH), "diabetes_parity.json")
+DEFAULT_MODEL_URL = "https://kydqfodd48.execute-api.eu-west-3.amazonaws.com/default/test-model-endpoint"
+# Feature order and ranges of the predictor form; all values are integers
+# except BMI.
+FEATURES: Tuple[Tuple[str, float, float], ...] = (
+    ("BMI", 10.0, 80.0),
+    ("HighBP", 0.0, 1.0),
+    ("HighChol", 0.0, 1.0),
+    ("GenHlth", 1.0, 5.0),
+    ("PhysHlth", 0.0, 30.0),
+    ("Age", 1.0, 14.0),
+    ("DiffWalk", 0.0, 1.0),
+    ("Smoker", 0.0, 1.0),
+)
+RIDGE = 1e-6
+
+
+def sample_features(count: int, seed: int) -> List[Dict[str, float]]:
+    rng = np.random.default_rng(seed)
+    rows = []
+    for _ in range(count):
+        row: Dict[str, float] = {}
+        for name, low, high in FEATURES:
+            if name == "BMI":
+                row[name] = round(float(np.clip(rng.normal(28.0, 6.5), 15.0, 60.0)), 1)
+            else:
+                row[name] = int(rng.integers(int(low), int(high) + 1))
+        rows.append(row)
+    return rows
+
+
+def demo_predict(features: Dict[str, float]) -> float:
+    """Port of demoPredict in assets/patient.js, as a probability."""
+    score = max(0.0, features["BMI"] - 22) * 1.8
+    score += 14 if features["HighBP"] else 0
+    score += 10 if features["HighChol"] else 0
+    score += 10 if features["DiffWalk"] else 0
+    score += 8 if features["Smoker"] else 0
+    score += (5 - features["GenHlth"]) * 3.5
+    score += max(0.0, features["PhysHlth"]) * 0.4
+    score += features["Age"] * 1.2
+    return min(95.0, max(1.0, score)) / 100.0
+
+
+def fit(matrix: np.ndarray, targets: np.ndarray, iterations: int = 50) -> Tuple[float, np.ndarray]:
+    """Logistic regression on soft targets (Newton-Raphson with a tiny ridge)."""
+    design = np.hstack([np.ones((len(matrix), 1)), matrix])
+    weights = np.zeros(design.shape[1])
+    for _ in range(iterations):
+        predicted = 1.0 / (1.0 + np.exp(-(design @ weights)))
+        gradient = design.T @ (predicted - targets)
+        hessian = (design * (predicted * (1 - predicted))[:, None]).T @ design + RIDGE * np.eye(design.shape[1])
+        step = np.linalg.solve(hessian, gradient)
+        weights -= step
+        if np.max(np.abs(step)) < 1e-10:
+            break
+    return float(weights[0]), weights[1:]
+
+
+def record(url: str, count: int, seed: int, out: str) -> None:
+    pool = ConnectionPool(url, timeout=15)
+    cases = []
+    for features in sample_features(count, seed):
+        status, raw = pool.request(
+            "POST", body=json.dumps({"features": features}).encode("utf-8"), headers={"Content-Type": "application/json"}
+        )
+        probability = remote_probability(json.loads(raw)) if status == 200 else None
+        if probability is None:
+            raise SystemExit(f"unexpected model response ({status}): {raw[:200]!r}")
+        cases.append({"features": features, "probability": probability})
+    with open(out, "w", encoding="utf-8") as handle:
+        json.dump(
+            {"modelUrl": url, "recordedAt": datetime.now(timezone.utc).isoformat(), "cases": cases}, handle, indent=1
+        )
+    print(f"recorded {len(cases)} cases to {out}")
+
+
+def load_cases(args: argparse.Namespace) -> Tuple[List[Dict[str, Any]], str]:
+    if args.heuristic:
+        rows = sample_features(args.heuristic, args.seed)
+        return [{"features": row, "probability": demo_predict(row)} for row in rows], "frontend demo heuristic"
+    with open(args.recording, encoding="utf-8") as handle:
+        recording = json.load(handle)
+    return recording["cases"], f"remote outputs recorded {recording.get('recordedAt')}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    record_parser = commands.add_parser("record", help="Record remote outputs for parity tests and fitting")
+    record_parser.add_argument("--url", default=os.environ.get("DIABETES_MODEL_URL", DEFAULT_MODEL_URL))
+    record_parser.add_argument("--samples", type=int, default=200)
+    record_parser.add_argument("--seed", type=int, default=7)
+    record_parser.add_argument("--out", default=PARITY_PATH)
+    fit_parser = commands.add_parser("fit", help="Fit the local model and write its coefficient file")
+    source = fit_parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--recording", help="Recording written by the record command")
+    source.add_argument("--heuristic", type=int, metavar="N", help="Fit to N samples of the frontend heuristic")
+    fit_parser.add_argument("--seed", type=int, default=7)
+    fit_parser.add_argument("--out", default=MODEL_PATH)
+    args = parser.parse_args()
+
+    if args.command == "record":
+        record(args.url, args.samples, args.seed, args.out)
+        sys.exit(0)
+
+    cases, description = load_cases(args)
+    names = [name for name, _, _ in FEATURES]
+    matrix = np.array([[case["features"][name] for name in names] for case in cases], dtype=np.float64)
+    targets = np.array([case["probability"] for case in cases], dtype=np.float64)
+    intercept, coefficients = fit(matrix, targets)
+    spec = {
+        "version": datetime.now(timezone.utc).strftime("%Y%m%d"),
+        "source": f"logistic fit to {len(cases)} samples of {description}",
+        "intercept": round(intercept, 6),
+        "features": [
+            {"name": name, "min": low, "max": high, "coefficient": round(float(weight), 6)}
+            for (name, low, high), weight in zip(FEATURES, coefficients)
+        ],
+    }
+    errors = np.abs(LogisticModel(spec).predict(matrix) - targets)
+    with open(args.out, "w", encoding="utf-8") as handle:
+        json.dump(spec, handle, indent=2)
+        handle.write("\n")
+    print(f"wrote {args.out}: mean abs error {errors.mean():.4f}, max {errors.max():.4f}")
@@ -20,61 +20,19 @@ print("=" * 80)
 print("APPOINTMENT CREATION LOGIC TEST (LOCAL)")
 print("=" * 80)
 
-# Test the critical functions without needing AWS/DynamoDB
+# Test the critical functions without needing AWS/DynamoDB.
+# The validator is the same compiled schema the Lambda handlers use.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "functions"))
+from vitals_schema import compile_vitals_schema  # noqa: E402
 
-def compute_bmi(height_cm: float, weight_kg: float) -> float | None:
-    try:
-        meters = float(height_cm) / 100
-        weight = float(weight_kg)
-        if meters <= 0:
-            return None
-        return round(weight / (meters * meters), 1)
-    except (TypeError, ValueError, ZeroDivisionError):
-        return None
+validate_vitals = compile_vitals_schema()
 
 
 def sanitize_vitals(vitals: Dict[str, Any]) -> Dict[str, Any]:
     """
-    Same logic as the Lambda handler.
+    Same logic as the Lambda handler (plain floats, without the Decimal copy).
     """
-    MANDATORY_VITAL_FIELDS = {
-        "heightCm",
-        "weightKg",
-        "temperatureC",
-    }
-    
-    if not isinstance(vitals, dict):
-        raise ValueError("vitals must be an object")
-    
-    summary: Dict[str, Any] = {}
-    
-    # Check mandatory fields
-    for field in MANDATORY_VITAL_FIELDS:
-        value = vitals.get(field)
-        if value is None:
-            raise ValueError(f"Missing vital: {field}")
-        try:
-            summary[field] = float(value)
-        except (TypeError, ValueError) as exc:
-            raise ValueError(f"Invalid numeric value for {field}") from exc
-    
-    # Add extra fields
-    for key, value in vitals.items():
-        if key in summary:
-            continue
-        if isinstance(value, (int, float)):
-            summary[key] = float(value)
-        elif isinstance(value, str):
-            summary[key] = value[:120]
-    
-    # Compute BMI if not present
-    bmi = summary.get("bmi")
-    if bmi is None:
-        computed = compute_bmi(summary["heightCm"], summary["weightKg"])
-        if computed is not None:
-            summary["bmi"] = computed
-    
-    return summary
+    return validate_vitals(vitals)[0]
 
 
 # Test 1: Vitals validation
@@ -108,6 +66,33 @@ test_vitals = [
         },
         "expect_pass": False,
     },
+    {
+        "name": "Implausible height (metres instead of cm)",
+        "data": {
+            "heightCm": 1.75,
+            "weightKg": 70,
+            "temperatureC": 36.5,
+        },
+        "expect_pass": False,
+    },
+    {
+        "name": "Implausible height/weight pair (BMI out of range)",
+        "data": {
+            "heightCm": 45,
+            "weightKg": 300,
+            "temperatureC": 36.5,
+        },
+        "expect_pass": False,
+    },
+    {
+        "name": "Temperature in Fahrenheit",
+        "data": {
+            "heightCm": 175,
+            "weightKg": 70,
+            "temperatureF": 98.6,
+        },
+        "expect_pass": True,
+    },
     {
         "name": "With extra fields",
         "data": {
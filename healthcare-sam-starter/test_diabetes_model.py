@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Test the in-process diabetes model used by predict_proxy.
+Checks parity against outputs recorded from the remote model
+(functions/models/diabetes_parity.json, written by
+`python scripts/train_diabetes_model.py record`). Until a recording is
+committed the parity check is skipped, and the shipped coefficients (fitted
+to the frontend demo heuristic) must not be enabled.
+"""
+
+import json
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "functions"))
+from diabetes_model import MODEL_PATH, load_model, remote_probability  # noqa: E402
+
+PARITY_PATH = os.path.join(os.path.dirname(MODEL_PATH), "diabetes_parity.json")
+# Largest accepted difference from the recorded remote probability.
+PARITY_TOLERANCE = 0.02
+FAILURES = []
+
+
+def fail(message: str) -> None:
+    FAILURES.append(message)
+    print(message)
+
+
+def main() -> int:
+    print("=" * 80)
+    print("LOCAL DIABETES MODEL TEST")
+    print("=" * 80)
+
+    model = load_model()
+    print(f"Model version {model.version}, features: {', '.join(model.names)}")
+
+    sample = {"BMI": 27.5, "HighBP": 1, "HighChol": 0, "GenHlth": 3, "PhysHlth": 2, "Age": 7, "DiffWalk": 0, "Smoker": 0}
+
+    # Test 1: Parity with recorded remote outputs
+    print("\n📝 TEST 1: Parity With Remote Model")
+    print("-" * 80)
+    if os.path.exists(PARITY_PATH):
+        with open(PARITY_PATH, encoding="utf-8") as handle:
+            recording = json.load(handle)
+        cases = recording["cases"]
+        predicted = model.predict(model.matrix([case["features"] for case in cases]))
+        expected = np.array([case["probability"] for case in cases])
+        errors = np.abs(predicted - expected)
+        worst = int(np.argmax(errors))
+        if errors[worst] <= PARITY_TOLERANCE:
+            print(f"✅ {len(cases)} recorded cases within {PARITY_TOLERANCE} (max {errors[worst]:.4f})")
+        else:
+            fail(f"❌ Case {worst} differs by {errors[worst]:.4f}: {cases[worst]['features']}")
+            print(f"   remote {expected[worst]:.4f}, local {predicted[worst]:.4f}")
+    else:
+        # Without a recording there is no evidence the local model matches the
+        # remote one, so the check is skipped and LOCAL_MODEL_MODE must stay "off".
+        print(f"⏭️  Parity not checked: no recording at {PARITY_PATH}")
+        print("   Run scripts/train_diabetes_model.py record, then fit, before enabling the local model")
+
+    # Test 2: Batch and single predictions agree
+    print("\n📝 TEST 2: Batch vs Single Prediction")
+    print("-" * 80)
+    rows = [dict(sample, BMI=bmi) for bmi in (18.5, 22.0, 27.5, 31.0, 40.0)]
+    batch = model.predict(model.matrix(rows))
+    single = np.array([model.predict_one(row) for row in rows])
+    if np.allclose(batch, single) and np.all((batch > 0) & (batch < 1)):
+        print(f"✅ Batch matches single predictions: {np.round(batch, 3).tolist()}")
+    else:
+        fail(f"❌ Batch {batch.tolist()} != single {single.tolist()}")
+    if np.all(np.diff(batch) > 0):
+        print("✅ Risk increases with BMI")
+    else:
+        fail("❌ Risk does not increase with BMI")
+
+    # Test 3: Invalid input
+    print("\n📝 TEST 3: Invalid Features")
+    print("-" * 80)
+    for name, features in (
+        ("Missing Age", {key: value for key, value in sample.items() if key != "Age"}),
+        ("Non-numeric BMI", dict(sample, BMI="heavy")),
+        ("Features not an object", [1, 2, 3]),
+    ):
+        try:
+            model.predict_one(features)
+            fail(f"❌ {name} - expected to fail but passed")
+        except ValueError as exc:
+            print(f"✅ {name} - failed as expected: {exc}")
+
+    # Test 4: Remote response formats
+    print("\n📝 TEST 4: Remote Response Formats")
+    print("-" * 80)
+    for response, expected_value in (
+        ({"probability": 0.27}, 0.27),
+        ({"probabilities": [0.73, 0.27]}, 0.27),
+        ({"score": 27}, 0.27),
+        ({"raw": "oops"}, None),
+    ):
+        value = remote_probability(response)
+        ok = value == expected_value if expected_value is None else abs(value - expected_value) < 1e-9
+        (print if ok else fail)(f"{'✅' if ok else '❌'} {json.dumps(response)} -> {value}")
+
+    print("\n" + "=" * 80)
+    return 1 if FAILURES else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())